@@ -0,0 +1,98 @@
+"""
+Benchmark of the per-update database queries, before and after the connection pool.
+
+"old" opens, commits and closes an aiosqlite connection per query, like
+`SQLiteDatabaseManager` did; "pooled" goes through the current manager, with
+long-lived WAL connections and a separate reader pool. Both run the language
+lookup done for every update (alone and 50 at a time, as concurrent updates
+do) and the insert of `db_add_chat`, each against its own copy of a
+database with CHATS chats.
+
+Run from the repository root:
+    python -m benchmarks.sqlite_pool_bench
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import aiosqlite
+
+from database.database_manager import SQLiteDatabaseManager, close_pools
+
+CHATS = 10000
+QUERIES = 2000
+CONCURRENCY = 50
+
+SELECT_LANG = "SELECT lang FROM chat_settings WHERE chat_id = ?"
+INSERT_CHAT = """
+    INSERT INTO chat_settings (chat_id, lang, anonime_statistic)
+    SELECT ?, ?, ?
+    WHERE NOT EXISTS (SELECT 1 FROM chat_settings WHERE chat_id = ?)
+"""
+
+
+async def old_query(path: str, sql: str, params: tuple) -> None:
+    conn = await aiosqlite.connect(path)
+    cursor = await conn.cursor()
+    await cursor.execute(sql, params)
+    await cursor.fetchone()
+    await cursor.close()
+    await conn.commit()
+    await conn.close()
+
+
+async def pooled_query(path: str, sql: str, params: tuple) -> None:
+    async with SQLiteDatabaseManager(path=path, readonly=sql == SELECT_LANG) as cursor:
+        await cursor.execute(sql, params)
+        await cursor.fetchone()
+
+
+async def create_database(path: str) -> None:
+    async with aiosqlite.connect(path) as conn:
+        await conn.execute(
+            "CREATE TABLE chat_settings (chat_id INTEGER PRIMARY KEY, lang TEXT DEFAULT en, anonime_statistic BOOLEAN DEFAULT 0)"
+        )
+        await conn.executemany(
+            "INSERT INTO chat_settings (chat_id, lang) VALUES (?, ?)",
+            [(chat_id, random.choice(("en", "ru", "uk", "pl"))) for chat_id in range(CHATS)],
+        )
+        await conn.commit()
+
+
+async def measure(query, path: str, sql: str, params, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(args):
+        async with semaphore:
+            await query(path, sql, args)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(args) for args in params))
+    return QUERIES / (time.perf_counter() - started)
+
+
+async def main() -> None:
+    directory = tempfile.mkdtemp()
+    lookups = [(random.randrange(CHATS),) for _ in range(QUERIES)]
+    inserts = [(CHATS + i, "en", 0, CHATS + i) for i in range(QUERIES)]
+
+    for name, query in (("old", old_query), ("pooled", pooled_query)):
+        path = os.path.join(directory, f"{name}.sql")
+        await create_database(path)
+        results = [
+            await measure(query, path, SELECT_LANG, lookups, 1),
+            await measure(query, path, SELECT_LANG, lookups, CONCURRENCY),
+            await measure(query, path, INSERT_CHAT, inserts, 1),
+        ]
+        print(
+            f"{name:<8} lang lookup {results[0]:8.0f} qps   "
+            f"lang lookup x{CONCURRENCY} {results[1]:8.0f} qps   "
+            f"add chat {results[2]:8.0f} qps"
+        )
+    await close_pools()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+Startup and per-message downloader cost.
+
+Each scenario runs in a fresh interpreter and measures the time from
+interpreter start until the bot would call `start_polling` (network calls such
+as `set_my_commands` excluded):
+
+    lazy   - the current tree: downloaders are imported on first use.
+    eager  - the previous behaviour: every downloader module is imported at startup.
+
+It then measures the per-message cost of getting downloaders: the previous
+handler built all downloaders for every message, the registry reuses them.
+
+Run from the repository root (config/.env or the environment must provide
+BOT_TOKEN and ADMIN_ID):
+    python -m benchmarks.startup_bench
+"""
+import subprocess
+import sys
+import time
+
+STARTUP_SCRIPT = """
+import time
+started = time.perf_counter()
+import main
+main.load_modules(["handlers.user", "handlers.admin"], ignore_files=["__init__.py", "help.py"])
+{extra}
+print(time.perf_counter() - started)
+"""
+
+EAGER_IMPORTS = """
+import downloaders
+for name in downloaders._LAZY_IMPORTS:
+    getattr(downloaders, name)
+"""
+
+RUNS = 5
+
+
+def measure_startup(extra: str) -> float:
+    timings = []
+    for _ in range(RUNS):
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT.format(extra=extra)],
+            capture_output=True, text=True, check=True,
+        )
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return min(timings)
+
+
+def measure_per_message(messages: int = 200) -> tuple[float, float]:
+    import downloaders
+    from downloaders import get_downloader
+    from downloaders.registry import PLATFORM_DOWNLOADERS
+
+    classes = [getattr(downloaders, class_name) for _, class_name in PLATFORM_DOWNLOADERS.values()]
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        [downloader_class() for downloader_class in classes]
+    old = (time.perf_counter() - start) / messages
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        get_downloader("tiktok")
+    new = (time.perf_counter() - start) / messages
+    return old, new
+
+
+if __name__ == "__main__":
+    lazy = measure_startup("")
+    eager = measure_startup(EAGER_IMPORTS)
+    print(f"time to start_polling   eager {eager * 1000:8.1f} ms   lazy {lazy * 1000:8.1f} ms")
+
+    old, new = measure_per_message()
+    print(f"downloaders per message  old {old * 1e6:8.1f} us   registry {new * 1e6:8.1f} us")
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark of per-message URL classification.
+
+Compares the old approach (every pattern run in the filter, then again in the
+handler) with `utils.url_router.classify_url` on 10k mixed messages.
+
+Run from the repository root:
+    python -m benchmarks.url_router_bench
+"""
+import random
+import re
+import time
+
+from utils.url_router import classify_url
+
+MESSAGES = 10_000
+
+SAMPLES = [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://youtu.be/dQw4w9WgXcQ",
+    "https://youtube.com/shorts/abcDEF12345",
+    "https://music.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://vm.tiktok.com/ZMabcdef/",
+    "https://www.tiktok.com/@user/video/7234567890123456789",
+    "https://soundcloud.com/artist/track-name",
+    "https://open.spotify.com/track/4uLU6hMCjMI75M1A2tKUQC",
+    "https://music.apple.com/us/album/song/1440818839?i=1440819012",
+    "https://ru.pinterest.com/pin/123456789012345678/",
+    "https://pin.it/AbCdEf1",
+    "https://www.bilibili.com/video/BV1xx411c7mD",
+    "https://x.com/user/status/1234567890123456789",
+    "https://www.instagram.com/reel/C1a2B3c4D5e/",
+    "hello there, how are you?",
+    "https://example.com/some/page",
+    "/start",
+]
+
+OLD_FILTER_PATTERNS = [
+    r'https?://(?:www\.)?(?:m\.)?(?:youtu\.be/|youtube\.com/(?:shorts/|watch\?v=))([\w-]+)',
+    r"https:\/\/music\.youtube\.com\/(?:watch\?v=|playlist\?list=)([a-zA-Z0-9\-_]+)",
+    r'https?://vm.tiktok.com/',
+    r'https?://(?:www\.)?tiktok\.com/.*',
+    r'https?://soundcloud\.com/([\w-]+)/([\w-]+)',
+    r"https?://open\.spotify\.com/(track|playlist)/([\w-]+)",
+    r'https?://music\.apple\.com/.*/album/.+/\d+(\?.*)?$',
+    r'https?://deezer\.page\.link/([\w-]+)',
+    r'https?://(?:\w{2,3}\.)?pinterest\.com/[\w/\-]+|https://pin\.it/[A-Za-z0-9]+',
+    r'https?://(?:www\.)?bilibili\.(?:com|tv)/[\w/?=&]+',
+    r'https://(?:twitter|x)\.com/\w+/status/\d+',
+    r'https://www\.instagram\.com/(?:p|reel|tv|stories)/([A-Za-z0-9_-]+)/',
+]
+
+OLD_HANDLER_PATTERNS = [
+    r'https?://(?:www\.)?(?:m\.)?(?:youtu\.be/|youtube\.com/(?:shorts/|watch\?v=))([\w-]+)',
+    r"https:\/\/music\.youtube\.com\/(?:watch\?v=|playlist\?list=)([a-zA-Z0-9\-_]+)",
+    r"https?://vm.tiktok.com/",
+    r"https?://vt.tiktok.com/",
+    r"https?://(?:www\.)?tiktok\.com/.*",
+    r'https?://soundcloud\.com/([\w-]+)/([\w-]+)',
+    r"https?://open\.spotify\.com/(track|playlist)/([\w-]+)",
+    r'https?://music\.apple\.com/.*/album/.+/\d+(\?.*)?$',
+    r'https?://(?:\w{2,3}\.)?pinterest\.com/[\w/\-]+|https://pin\.it/[A-Za-z0-9]+',
+    r"https?://(?:www\.)?bilibili\.(?:com|tv)/[\w/?=&]+",
+    r"https://(?:twitter|x)\.com/\w+/status/\d+",
+    r'https://www\.instagram\.com/(?:p|reel|tv|stories)/([A-Za-z0-9_-]+)/',
+]
+
+
+def old_classify(text: str):
+    if not any([re.match(pattern, text) for pattern in OLD_FILTER_PATTERNS]):
+        return None
+    for pattern in OLD_HANDLER_PATTERNS:
+        if re.match(pattern, text):
+            return pattern
+    return None
+
+
+def run(name: str, func, messages: list[str]) -> None:
+    start = time.perf_counter()
+    for text in messages:
+        func(text)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} total {elapsed * 1000:8.2f} ms   per message {elapsed / len(messages) * 1e6:6.2f} us")
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    messages = [random.choice(SAMPLES) for _ in range(MESSAGES)]
+
+    # Warm up the re module cache for the old approach, as in a long-running bot.
+    old_classify(messages[0])
+
+    run("old", old_classify, messages)
+    run("url_router", classify_url, messages)
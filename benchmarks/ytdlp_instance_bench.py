@@ -0,0 +1,98 @@
+"""
+Benchmark of per-job yt-dlp overhead in a worker process.
+
+Compares the old approach (a new YoutubeDL per job, URL matched against every
+extractor) with the worker of `utils.ytdlp_worker` (one warmed YoutubeDL per
+options profile, extraction pinned to a known extractor). Every mode runs in
+a fresh process, so the cost of the first job is included.
+
+A local HTTP server serves the media, so the numbers contain no network time.
+The generic extractor is the last one yt-dlp tries, which makes the unpinned
+case the worst case for matching.
+
+Run from the repository root:
+    python -m benchmarks.ytdlp_instance_bench
+"""
+import functools
+import http.server
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+JOBS = 20
+OPTIONS = {"quiet": True, "outtmpl": "%(title)s.%(ext)s"}
+
+
+def old_job(url: str) -> None:
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL(OPTIONS) as ydl:
+        ydl.extract_info(url, download=False)
+
+
+class NullConn:
+    """Drops the file and stage messages the worker sends to the bot process."""
+
+    def send(self, message) -> None:
+        pass
+
+
+def pooled_job(url: str) -> None:
+    from utils import ytdlp_worker
+
+    ytdlp_worker._extract_info(NullConn(), url, OPTIONS, download=False, ie_keys=("Generic",))
+
+
+def run(name: str, url: str, results) -> None:
+    job = old_job if name == "old" else pooled_job
+    if name == "pooled":
+        from utils import ytdlp_worker
+
+        started = time.perf_counter()
+        ytdlp_worker._warm(("Generic",))
+        results.put(("warm", time.perf_counter() - started))
+
+    timings = []
+    for _ in range(JOBS):
+        started = time.perf_counter()
+        job(url)
+        timings.append(time.perf_counter() - started)
+    results.put((name, timings))
+
+
+def serve(directory: str):
+    class QuietHandler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    directory = tempfile.mkdtemp()
+    with open(os.path.join(directory, "clip.mp4"), "wb") as file:
+        file.write(os.urandom(64 * 1024))
+    server = serve(directory)
+    url = f"http://127.0.0.1:{server.server_port}/clip.mp4"
+
+    context = multiprocessing.get_context("spawn")
+    for name in ("old", "pooled"):
+        results = context.Queue()
+        process = context.Process(target=run, args=(name, url, results))
+        process.start()
+        process.join()
+        while not results.empty():
+            label, value = results.get()
+            if label == "warm":
+                print(f"{'warm-up':<8} {value * 1000:8.2f} ms (at worker start, off the job path)")
+                continue
+            first, rest = value[0], value[1:]
+            print(
+                f"{label:<8} first job {first * 1000:8.2f} ms   "
+                f"next jobs avg {sum(rest) / len(rest) * 1000:7.2f} ms"
+            )
+    server.shutdown()
@@ -1,5 +1,6 @@
 from dotenv import load_dotenv
 import os
+import socket
 
 load_dotenv()
 
@@ -7,3 +8,136 @@ load_dotenv()
 LOG_DIR = os.getenv("LOG_DIR")
 SEND_INTERVAL_MIN = os.getenv("SEND_INTERVAL_MIN")
 USE_AD = os.getenv("USE_AD")
+
+# Self-hosted telegram-bot-api server, empty for api.telegram.org. Set TELEGRAM_API_LOCAL=1 when it runs
+# with --local on the same filesystem (TEMP_DIR included): files are then passed as file:// paths up to 2000 MB
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+TELEGRAM_API_LOCAL = bool(TELEGRAM_API_URL) and os.getenv("TELEGRAM_API_LOCAL", "0") == "1"
+# Largest file the bot downloads for upload, in MB
+UPLOAD_LIMIT_MB = int(os.getenv("UPLOAD_LIMIT_MB", 2000 if TELEGRAM_API_LOCAL else 50))
+
+# Webhook delivery: an empty WEBHOOK_URL (public base URL behind the reverse proxy) means long polling.
+# Every instance listens on its own WEBHOOK_PORT; Telegram sends WEBHOOK_SECRET in every request
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+# Drop updates queued while the bot was down, off by default so a deploy loses nothing
+DROP_PENDING_UPDATES = os.getenv("DROP_PENDING_UPDATES", "0") == "1"
+
+# SQLite connection pool: reader connections per database file, mmap size and prepared statement cache
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", 4))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_MB", 256)) * 1024 * 1024
+SQLITE_CACHED_STATEMENTS = int(os.getenv("SQLITE_CACHED_STATEMENTS", 256))
+
+# FSM storage (states and the locale kept by FSMI18nMiddleware), shared by the bot processes using the file.
+# Writes are batched for FSM_FLUSH_INTERVAL seconds, other processes' writes are seen within FSM_SYNC_INTERVAL
+FSM_STORAGE_PATH = os.getenv("FSM_STORAGE_PATH", "database/fsm.sql")
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", 0.2))
+FSM_SYNC_INTERVAL = float(os.getenv("FSM_SYNC_INTERVAL", 1.0))
+FSM_CACHE_MAX_ENTRIES = int(os.getenv("FSM_CACHE_MAX_ENTRIES", 10000))
+
+# Download scheduler
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", 4))
+DOWNLOAD_USER_LIMIT = int(os.getenv("DOWNLOAD_USER_LIMIT", 2))
+DOWNLOAD_CHAT_LIMIT = int(os.getenv("DOWNLOAD_CHAT_LIMIT", 3))
+# Comma separated platform:limit pairs, such as: twitter:3,instagram:2
+DOWNLOAD_PLATFORM_LIMITS = {
+    platform.strip(): int(limit)
+    for platform, limit in (
+        pair.split(":") for pair in os.getenv("DOWNLOAD_PLATFORM_LIMITS", "twitter:3").split(",") if pair.strip()
+    )
+}
+
+# "inline" runs downloads in the bot process; "queue" only enqueues them for `python worker.py` processes.
+# JOB_QUEUE_BACKEND is "sqlite" or "package.module:ClassName" of a utils.job_queue.JobQueue subclass
+DOWNLOAD_MODE = os.getenv("DOWNLOAD_MODE", "inline")
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "sqlite")
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "database/jobs.sql")
+JOB_QUEUE_POLL_INTERVAL = float(os.getenv("JOB_QUEUE_POLL_INTERVAL", 1.0))
+# Every job is journaled in the job queue. A process resumes the unfinished jobs recorded under its
+# JOB_WORKER_NAME after a restart, so each bot or worker process sharing a journal needs its own name;
+# worker.py requires one. A name is held with a heartbeat and freed JOB_WORKER_LEASE seconds after a crash
+JOB_WORKER_NAME = os.getenv("JOB_WORKER_NAME") or socket.gethostname()
+JOB_WORKER_NAME_SET = bool(os.getenv("JOB_WORKER_NAME"))
+JOB_WORKER_LEASE = int(os.getenv("JOB_WORKER_LEASE", 60))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+# Finished jobs (with the message they came from) are deleted from the journal after JOB_RETENTION_DAYS
+JOB_RETENTION = int(os.getenv("JOB_RETENTION_DAYS", 7)) * 24 * 60 * 60
+# Seconds running downloads get to finish on SIGTERM before they are interrupted and resumed on the next start
+DRAIN_TIMEOUT = int(os.getenv("DRAIN_TIMEOUT", 60))
+
+# Number of yt-dlp worker processes
+YTDLP_PROCESSES = int(os.getenv("YTDLP_PROCESSES", DOWNLOAD_WORKERS))
+
+# Flood control of everything the bot sends: messages per second to all chats, to one private chat and to one
+# group (Telegram allows about 30, 1 and 20 per minute), a chat may get OUTBOUND_CHAT_BURST messages at once.
+# After RetryAfter a request is sent again up to OUTBOUND_MAX_RETRIES times, unless the wait is over
+# OUTBOUND_MAX_RETRY_AFTER seconds
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", 30))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", 1))
+OUTBOUND_GROUP_RATE = float(os.getenv("OUTBOUND_GROUP_RATE", 20 / 60))
+OUTBOUND_CHAT_BURST = int(os.getenv("OUTBOUND_CHAT_BURST", 5))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 3))
+OUTBOUND_MAX_RETRY_AFTER = int(os.getenv("OUTBOUND_MAX_RETRY_AFTER", 60))
+# The same chat action is sent to a chat at most once every CHAT_ACTION_INTERVAL seconds (Telegram shows it for 5)
+CHAT_ACTION_INTERVAL = float(os.getenv("CHAT_ACTION_INTERVAL", 4))
+# Error notifications to ADMIN_ID are collected into one message every ADMIN_DIGEST_INTERVAL seconds
+ADMIN_DIGEST_INTERVAL = float(os.getenv("ADMIN_DIGEST_INTERVAL", 60))
+
+# Download event log behind /stats: events are written in batches of EVENT_LOG_FLUSH_EVENTS, or after
+# EVENT_LOG_FLUSH_INTERVAL_MS; at most EVENT_LOG_MAX_PENDING are kept while the database is unavailable
+EVENT_LOG_FLUSH_EVENTS = int(os.getenv("EVENT_LOG_FLUSH_EVENTS", 100))
+EVENT_LOG_FLUSH_INTERVAL = int(os.getenv("EVENT_LOG_FLUSH_INTERVAL_MS", 1000)) / 1000
+EVENT_LOG_MAX_PENDING = int(os.getenv("EVENT_LOG_MAX_PENDING", 10000))
+
+# Prometheus metrics on http://METRICS_HOST:METRICS_PORT/metrics, 0 disables them. Every bot and worker
+# process needs its own port; the event loop lag is measured every LOOP_LAG_INTERVAL seconds
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 1.0))
+
+# One JSON line per download job with the timings of its stages, in other/logs/traces.log (worker_traces.log)
+TRACE_JOBS = os.getenv("TRACE_JOBS", "1") == "1"
+
+# /news_spam broadcasts: messages per second to all chats together (Telegram allows about 30),
+# recipients read and checkpointed BROADCAST_BATCH_SIZE at a time, progress edited every BROADCAST_PROGRESS_INTERVAL seconds
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 25))
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", 100))
+BROADCAST_PROGRESS_INTERVAL = int(os.getenv("BROADCAST_PROGRESS_INTERVAL", 5))
+
+# Telegram file_id cache: resend previously delivered media without downloading
+FILE_ID_CACHE_TTL = int(os.getenv("FILE_ID_CACHE_TTL_DAYS", 30)) * 24 * 60 * 60
+FILE_ID_CACHE_MAX_ENTRIES = int(os.getenv("FILE_ID_CACHE_MAX_ENTRIES", 100000))
+
+# On-disk media cache of downloaded files, a budget of 0 MB disables it. Each process keeps its own cache
+# in MEDIA_CACHE_DIR/JOB_WORKER_NAME, with a budget of MEDIA_CACHE_MAX_MB
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "other/mediaCache")
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_MB", 0)) * 1024 * 1024
+
+# In-process cache of chat languages; bot processes sharing the database see changes after LOCALE_CACHE_TTL seconds
+LOCALE_CACHE_MAX_ENTRIES = int(os.getenv("LOCALE_CACHE_MAX_ENTRIES", 100000))
+LOCALE_CACHE_TTL = int(os.getenv("LOCALE_CACHE_TTL", 600))
+
+# In-process cache of yt-dlp metadata extraction without download (the TikTok streaming probe), 0 disables it
+METADATA_CACHE_TTL = int(os.getenv("METADATA_CACHE_TTL", 600))
+METADATA_CACHE_MAX_ENTRIES = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", 1000))
+
+# Temp directory of downloads: every process works in TEMP_DIR/JOB_WORKER_NAME, every job gets its own workspace
+# in it, and the process's janitor removes orphans older than TEMP_MAX_AGE seconds and keeps it under TEMP_MAX_MB
+# (0 for no budget)
+TEMP_DIR = os.getenv("TEMP_DIR", "other/downloadsTemp")
+TEMP_MAX_AGE = int(os.getenv("TEMP_MAX_AGE", 60 * 60))
+TEMP_MAX_BYTES = int(os.getenv("TEMP_MAX_MB", 0)) * 1024 * 1024
+TEMP_JANITOR_INTERVAL = int(os.getenv("TEMP_JANITOR_INTERVAL", 5 * 60))
+
+# Pipe direct-URL media (Instagram, Twitter images, Pinterest originals, TikTok) into the upload without disk
+STREAM_UPLOADS = os.getenv("STREAM_UPLOADS", "1") == "1"
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 64 * 1024))
+STREAM_READ_TIMEOUT = int(os.getenv("STREAM_READ_TIMEOUT", 60))
+
+# Media downloaded by the bot itself is kept in memory up to STAGING_THRESHOLD_MB per file,
+# and up to STAGING_MEMORY_CAP_MB for all jobs together; anything over goes to disk
+STAGING_MEMORY_THRESHOLD = int(os.getenv("STAGING_THRESHOLD_MB", 5)) * 1024 * 1024
+STAGING_MEMORY_CAP = int(os.getenv("STAGING_MEMORY_CAP_MB", 100)) * 1024 * 1024
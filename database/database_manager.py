@@ -1,36 +1,146 @@
 # From https://github.com/FlacSy/BotArchitecture
+import asyncio
 import aiosqlite
 import logging
 
+from config.settings import SQLITE_CACHED_STATEMENTS, SQLITE_MMAP_SIZE, SQLITE_READERS
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+)
+
+
+class SQLiteConnectionPool:
+    """
+    Long-lived connections to one SQLite database file.
+
+    Opening an aiosqlite connection starts a thread and reads the schema, so
+    connections are opened once and reused. Writes go through a single writer
+    connection, one transaction at a time, as SQLite only has one writer
+    anyway. Queries use a pool of reader connections, which WAL lets run
+    alongside the writer. Every connection keeps its prepared statements.
+
+    Attributes:
+        path (str): Path of the SQLite database file.
+        readers (int): Number of reader connections.
+
+    Methods:
+        open()
+            Opens the connections, if they are not open yet.
+        acquire(readonly) -> aiosqlite.Connection
+            Waits for a free reader, or for the writer.
+        release(conn, readonly)
+            Returns a connection to the pool.
+        close()
+            Closes all connections.
+    """
+
+    def __init__(self, path: str, readers: int = SQLITE_READERS):
+        self.path = path
+        self.readers = readers
+        self._writer = None
+        self._writer_lock = asyncio.Lock()
+        self._readers: asyncio.Queue = asyncio.Queue()
+        self._open_lock = asyncio.Lock()
+
+    async def open(self) -> None:
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            self._writer = await self._connect()
+            for _ in range(self.readers):
+                self._readers.put_nowait(await self._connect())
+            logging.info(f"Opened {self.readers + 1} connections to the database: {self.path}")
+
+    async def acquire(self, readonly: bool = False) -> aiosqlite.Connection:
+        await self.open()
+        if readonly:
+            return await self._readers.get()
+        await self._writer_lock.acquire()
+        return self._writer
+
+    def release(self, conn: aiosqlite.Connection, readonly: bool = False) -> None:
+        if readonly:
+            self._readers.put_nowait(conn)
+        else:
+            self._writer_lock.release()
+
+    async def close(self) -> None:
+        async with self._open_lock:
+            if self._writer is None:
+                return
+            async with self._writer_lock:
+                await self._writer.close()
+                self._writer = None
+            while not self._readers.empty():
+                await self._readers.get_nowait().close()
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path, cached_statements=SQLITE_CACHED_STATEMENTS)
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+
+# path -> pool of that database file
+_pools: dict[str, SQLiteConnectionPool] = {}
+
+
+def get_pool(path: str) -> SQLiteConnectionPool:
+    """Returns the connection pool of a database file, creating it on first use."""
+    pool = _pools.get(path)
+    if pool is None:
+        pool = _pools[path] = SQLiteConnectionPool(path)
+    return pool
+
+
+async def close_pools() -> None:
+    """Closes the connections of every database file, called on shutdown."""
+    for pool in _pools.values():
+        await pool.close()
+
 
 class SQLiteDatabaseManager:
     """
     A context manager for managing SQLite database connections and cursors using async/await.
 
+    Connections are borrowed from the long-lived pool of the database file:
+    the writer by default, one of the readers with `readonly=True`.
+
     Attributes:
         mode (str): The mode in which the database is operating (e.g., "production").
+        path (str): Path of the SQLite database file.
+        readonly (bool): Whether the block only queries, so it can use a reader connection.
         conn (aiosqlite.Connection): The SQLite database connection object.
         cursor (aiosqlite.Cursor): The SQLite database cursor object.
 
     Methods:
-        __aenter__: Asynchronously opens a connection to the database and returns a cursor.
-        __aexit__: Asynchronously closes the cursor and the connection, commits any pending transactions,
-                    and handles any exceptions that occurred.
+        __aenter__: Asynchronously borrows a connection from the pool and returns a cursor.
+        __aexit__: Asynchronously closes the cursor, commits any pending transactions, returns the connection
+                    to the pool and handles any exceptions that occurred.
     """
-    def __init__(self, mode: str = "production"):
+    def __init__(self, mode: str = "production", path: str = "./database/database.sql", readonly: bool = False):
         """
         Initializes the SQLiteDatabaseManager instance.
 
         Args:
             mode (str): The mode in which the database is operating (e.g., "production"). Defaults to "production".
+            path (str): Path of the SQLite database file. Defaults to the bot's main database.
+            readonly (bool): Use a reader connection; the block must not write. Defaults to False.
         """
         self.mode = mode
+        self.path = path
+        self.readonly = readonly
         self.conn = None
         self.cursor = None
 
     async def __aenter__(self):
         """
-        Asynchronously opens a connection to the SQLite database and returns a cursor.
+        Asynchronously borrows a connection from the pool and returns a cursor.
 
         Returns:
             aiosqlite.Cursor: The cursor for interacting with the database.
@@ -38,21 +148,25 @@ class SQLiteDatabaseManager:
         Raises:
             aiosqlite.Error: If an error occurs while connecting to the database.
         """
+        pool = get_pool(self.path)
         try:
-            self.conn = await aiosqlite.connect("./database/database.sql")
-
-            self.cursor = await self.conn.cursor()
-            logging.info(f"Connected to the database: {self.mode}")
-            return self.cursor
-
+            self.conn = await pool.acquire(self.readonly)
         except aiosqlite.Error as e:
             logging.error(f"Error connecting to the database: {e}")
             raise
 
+        try:
+            self.cursor = await self.conn.cursor()
+        except BaseException:
+            pool.release(self.conn, self.readonly)
+            self.conn = None
+            raise
+        return self.cursor
+
     async def __aexit__(self, exc_type, exc_value, traceback):
         """
-        Asynchronously closes the cursor and the database connection, commits any pending transactions,
-        and logs any exceptions that occurred.
+        Asynchronously closes the cursor, commits any pending transactions, returns the connection
+        to the pool and logs any exceptions that occurred.
 
         Args:
             exc_type (type): The type of the exception that was raised, if any.
@@ -62,13 +176,14 @@ class SQLiteDatabaseManager:
         Returns:
             bool: False, to propagate the exception if one occurred.
         """
-        if self.cursor:
-            await self.cursor.close()
-            logging.info("Cursor closed")
-        if self.conn:
-            await self.conn.commit()
-            await self.conn.close()
-            logging.info("Connection closed")
+        try:
+            if self.cursor:
+                await self.cursor.close()
+            if self.conn and not self.readonly:
+                await self.conn.commit()
+        finally:
+            if self.conn:
+                get_pool(self.path).release(self.conn, self.readonly)
 
         if exc_type is not None:
             logging.error(f"An error occurred: {exc_type}, {exc_value}")
@@ -84,13 +199,123 @@ async def create_table_settings():
         - chat_id (INTEGER PRIMARY KEY): Unique identifier for the chat.
         - lang (TEXT): Language setting for the chat, defaulting to 'en'.
         - anonime_statistic (BOOLEAN): Indicates if anonymous statistics are enabled, defaulting to 0 (False).
+        - blocked (BOOLEAN): Set when a broadcast found the bot blocked or removed, cleared by /start.
     """
     async with SQLiteDatabaseManager() as conn:
         await conn.execute(
             """CREATE TABLE IF NOT EXISTS chat_settings (
                 chat_id INTEGER PRIMARY KEY,
                 lang TEXT DEFAULT en,
-                anonime_statistic BOOLEAN DEFAULT 0
+                anonime_statistic BOOLEAN DEFAULT 0,
+                blocked BOOLEAN DEFAULT 0
             );
         """
         )
+        # Databases created before the column existed
+        await conn.execute("PRAGMA table_info(chat_settings)")
+        if "blocked" not in [row[1] for row in await conn.fetchall()]:
+            await conn.execute("ALTER TABLE chat_settings ADD COLUMN blocked BOOLEAN DEFAULT 0")
+
+
+async def create_table_broadcasts():
+    """
+    Creates the 'broadcasts' table in the SQLite database if it does not already exist.
+
+    Every /news_spam campaign is a row, checkpointed after each batch of recipients:
+        - text (TEXT): The MarkdownV2 message sent to the chats.
+        - status (TEXT): "running" until every recipient was tried, then "done".
+        - worker (TEXT): JOB_WORKER_NAME of the bot process sending it, which resumes it after a restart.
+        - admin_chat_id, progress_message_id (INTEGER): The live progress message.
+        - last_chat_id (INTEGER): Keyset cursor, recipients are sent to in chat_id order.
+        - total, sent, failed, blocked (INTEGER): Recipient counts.
+        - started_at, finished_at (INTEGER): Unix timestamps.
+    """
+    async with SQLiteDatabaseManager() as conn:
+        await conn.execute(
+            """CREATE TABLE IF NOT EXISTS broadcasts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'running',
+                worker TEXT NOT NULL,
+                admin_chat_id INTEGER NOT NULL,
+                progress_message_id INTEGER,
+                last_chat_id INTEGER,
+                total INTEGER DEFAULT 0,
+                sent INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                blocked INTEGER DEFAULT 0,
+                started_at INTEGER NOT NULL,
+                finished_at INTEGER
+            );
+        """
+        )
+
+
+async def create_table_media_cache():
+    """
+    Creates the 'media_cache' table in the SQLite database if it does not already exist.
+
+    The table maps downloaded media to the Telegram file_ids it was delivered with:
+        - bot_id (INTEGER): file_ids are only valid for the bot that uploaded them.
+        - media_key (TEXT): Platform-qualified media id, such as: youtube:dQw4w9WgXcQ.
+        - format (TEXT): "media" or "audio".
+        - payload (TEXT): JSON list of delivered messages and their file_ids.
+        - hits (INTEGER): Number of times the entry was resent.
+        - created_at, last_used_at (INTEGER): Unix timestamps for the TTL and LRU eviction.
+    """
+    async with SQLiteDatabaseManager() as conn:
+        await conn.execute(
+            """CREATE TABLE IF NOT EXISTS media_cache (
+                bot_id INTEGER NOT NULL,
+                media_key TEXT NOT NULL,
+                format TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                hits INTEGER DEFAULT 0,
+                created_at INTEGER NOT NULL,
+                last_used_at INTEGER NOT NULL,
+                PRIMARY KEY (bot_id, media_key, format)
+            );
+        """
+        )
+        await conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_media_cache_last_used ON media_cache (last_used_at)"
+        )
+
+
+async def create_table_download_events():
+    """
+    Creates the 'download_events' table in the SQLite database if it does not already exist.
+
+    One row per finished download, written in batches by `utils.download_events`:
+        - created_at (INTEGER): Unix timestamp.
+        - chat_id (INTEGER): Chat of the download, NULL for chats with anonymous statistics.
+        - platform (TEXT), format (TEXT): Such as: youtube, media.
+        - outcome (TEXT): "done", "cached" (resent by file_id), "failed" or "cancelled".
+        - bytes (INTEGER): Size of the delivered media as reported by Telegram.
+        - queue_ms, download_ms, upload_ms (INTEGER): Time spent waiting, downloading and sending.
+
+    The indexes cover the /stats queries, so they never read the table itself.
+    """
+    async with SQLiteDatabaseManager() as conn:
+        await conn.execute(
+            """CREATE TABLE IF NOT EXISTS download_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at INTEGER NOT NULL,
+                chat_id INTEGER,
+                platform TEXT NOT NULL,
+                format TEXT NOT NULL,
+                outcome TEXT NOT NULL,
+                bytes INTEGER DEFAULT 0,
+                queue_ms INTEGER DEFAULT 0,
+                download_ms INTEGER DEFAULT 0,
+                upload_ms INTEGER DEFAULT 0
+            );
+        """
+        )
+        await conn.execute(
+            """CREATE INDEX IF NOT EXISTS idx_download_events_window ON download_events
+                (created_at, platform, format, outcome, bytes, queue_ms, download_ms, upload_ms)"""
+        )
+        await conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_download_events_chat ON download_events (created_at, chat_id)"
+        )
@@ -0,0 +1,182 @@
+import asyncio
+import copy
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import aiosqlite
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage in a SQLite database file, shared by every bot process using the same file.
+
+    Reads are answered from an in-process cache. Other processes' commits are
+    detected through `PRAGMA data_version`, checked at most every
+    `sync_interval` seconds, so most updates never leave memory. Writes go to
+    the cache at once and are flushed in one transaction every
+    `flush_interval` seconds.
+
+    Attributes:
+        path (str): Path of the SQLite database file.
+        flush_interval (float): Seconds writes are batched for.
+        sync_interval (float): Seconds between checks for other processes' writes.
+        max_entries (int): Number of keys kept in the read cache.
+
+    Methods:
+        flush()
+            Writes the pending changes now.
+        close()
+            Flushes and closes the connection.
+    """
+
+    def __init__(
+        self,
+        path: str = "./database/fsm.sql",
+        flush_interval: float = 0.2,
+        sync_interval: float = 1.0,
+        max_entries: int = 10000,
+        key_builder: Optional[KeyBuilder] = None,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.sync_interval = sync_interval
+        self.max_entries = max_entries
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._conn_lock = asyncio.Lock()
+        # key -> (state, data)
+        self._cache: OrderedDict[str, tuple[Optional[str], Dict[str, Any]]] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._data_version: Optional[int] = None
+        self._synced_at = 0.0
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        key = self.key_builder.build(key)
+        _, data = await self._get(key)
+        self._put(key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._get(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        key = self.key_builder.build(key)
+        state, _ = await self._get(key)
+        self._put(key, state, copy.deepcopy(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._get(self.key_builder.build(key))
+        return copy.deepcopy(data)
+
+    async def flush(self) -> None:
+        """Writes the pending changes in one transaction."""
+        if not self._dirty:
+            return
+
+        keys, self._dirty = self._dirty, set()
+        rows = [(key, *self._cache[key]) for key in keys if key in self._cache]
+        now = int(time.time())
+        try:
+            conn = await self._connection()
+            await conn.executemany(
+                "DELETE FROM fsm_storage WHERE key = ?",
+                [(key,) for key, state, data in rows if state is None and not data],
+            )
+            await conn.executemany(
+                "INSERT OR REPLACE INTO fsm_storage (key, state, data, updated_at) VALUES (?, ?, ?, ?)",
+                [(key, state, json.dumps(data), now) for key, state, data in rows if state is not None or data],
+            )
+            await conn.commit()
+        except Exception as e:
+            logging.error(f"Error flushing FSM storage: {e}")
+            # Keep the changes for the next flush
+            self._dirty |= keys
+        except asyncio.CancelledError:
+            self._dirty |= keys
+            raise
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def _get(self, key: str) -> tuple[Optional[str], Dict[str, Any]]:
+        await self._sync()
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        conn = await self._connection()
+        async with conn.execute("SELECT state, data FROM fsm_storage WHERE key = ?", (key,)) as cursor:
+            row = await cursor.fetchone()
+        value = (row[0], json.loads(row[1])) if row else (None, {})
+        self._remember(key, value)
+        return value
+
+    def _put(self, key: str, state: Optional[str], data: Dict[str, Any]) -> None:
+        self._remember(key, (state, data))
+        self._dirty.add(key)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    def _remember(self, key: str, value: tuple[Optional[str], Dict[str, Any]]) -> None:
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            # Unflushed entries stay until they are written
+            oldest = next((cached for cached in self._cache if cached not in self._dirty), None)
+            if oldest is None:
+                break
+            del self._cache[oldest]
+
+    async def _flush_later(self) -> None:
+        # Also picks up keys written while a flush was running
+        while self._dirty:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def _sync(self) -> None:
+        """Drops the cache if another process committed to the database since the last check."""
+        now = time.monotonic()
+        if now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+
+        conn = await self._connection()
+        async with conn.execute("PRAGMA data_version") as cursor:
+            data_version = (await cursor.fetchone())[0]
+        if self._data_version is not None and data_version != self._data_version:
+            for key in [key for key in self._cache if key not in self._dirty]:
+                del self._cache[key]
+        self._data_version = data_version
+
+    async def _connection(self) -> aiosqlite.Connection:
+        async with self._conn_lock:
+            if self._conn is None:
+                conn = await aiosqlite.connect(self.path)
+                await conn.execute("PRAGMA journal_mode=WAL")
+                await conn.execute("PRAGMA synchronous=NORMAL")
+                await conn.execute("PRAGMA busy_timeout=5000")
+                await conn.execute(
+                    """CREATE TABLE IF NOT EXISTS fsm_storage (
+                        key TEXT PRIMARY KEY,
+                        state TEXT,
+                        data TEXT NOT NULL,
+                        updated_at INTEGER NOT NULL
+                    );
+                """
+                )
+                await conn.commit()
+                self._conn = conn
+            return self._conn
@@ -1,15 +1,34 @@
-from .apple_music import AppleMusicDownloader
-from .bilibili import BilibiliDownloader
-from .pinterest import PinterestDownloader
-from .soundcloud import SoundCloudDownloader
-from .spotify import SpotifyDownloader
-from .tiktok import TikTokDownloader
-from .youtube import YouTubeDownloader
-from .instagram import InstagramDownloader
-from .twitter import TwitterDownloader
+import importlib
+
+from .registry import get_downloader
+
+# Downloader modules import heavy dependencies (playwright, instagrapi, yt-dlp),
+# so they are only imported when a class is first accessed.
+_LAZY_IMPORTS = {
+    "AppleMusicDownloader": ".apple_music",
+    "BilibiliDownloader": ".bilibili",
+    "PinterestDownloader": ".pinterest",
+    "SoundCloudDownloader": ".soundcloud",
+    "SpotifyDownloader": ".spotify",
+    "TikTokDownloader": ".tiktok",
+    "YouTubeDownloader": ".youtube",
+    "InstagramDownloader": ".instagram",
+    "TwitterDownloader": ".twitter",
+}
 
 __all__ = [
     "AppleMusicDownloader", "BilibiliDownloader", "PinterestDownloader",
     "SoundCloudDownloader", "SpotifyDownloader", "TikTokDownloader",
     "YouTubeDownloader", "InstagramDownloader", "TwitterDownloader",
+    "get_downloader",
 ]
+
+
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
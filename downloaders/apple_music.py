@@ -1,13 +1,14 @@
-import asyncio
 import logging
 import os
 import re
 import urllib.request
 
-import yt_dlp
 from yt_dlp.utils import sanitize_filename
 
 from utils import get_applemusic_author, update_metadata, search_music
+from utils.ytdlp_runner import ytdlp_runner
+from utils.metrics import instrument_download
+from utils.tracing import span
 
 
 class AppleMusicDownloader:
@@ -24,7 +25,8 @@ class AppleMusicDownloader:
         os.makedirs(self.output_path, exist_ok=True)
         self.yt_dlp_options = {
             "format": "m4a/bestaudio/best",
-            "outtmpl": f"{output_path}/{sanitize_filename('%(title)s')}",
+            "outtmpl": sanitize_filename('%(title)s'),
+            "paths": {"home": output_path},
             "postprocessors": [
                 {
                     "key": "FFmpegExtractAudio",
@@ -33,6 +35,7 @@ class AppleMusicDownloader:
             ],
         }
 
+    @instrument_download
     async def download(self, url: str, format: str = "audio"):
         """
         Download an audio (track or playlist) based on the format.
@@ -127,17 +130,14 @@ class AppleMusicDownloader:
 
             video_link = await search_music(artist, title)
 
-            with yt_dlp.YoutubeDL(self.yt_dlp_options) as ydl:
-                info_dict = await asyncio.to_thread(ydl.extract_info, video_link, download=False)
-                ydl_title = info_dict.get("title", "unknown_title")
-                logging.info(f"Downloading: {ydl_title}")
+            logging.info(f"Downloading: {video_link}")
+            result = await ytdlp_runner.download(video_link, self.yt_dlp_options)
 
-                await asyncio.to_thread(ydl.download, [video_link])
+            audio_filename = result.filepath
+            cover_filename = f"{os.path.splitext(audio_filename)[0]}.jpg"
 
-            audio_filename = os.path.join(output_path, f"{sanitize_filename(ydl_title)}.mp3")
-            cover_filename = os.path.join(output_path, f"{sanitize_filename(ydl_title)}.jpg")
-
-            urllib.request.urlretrieve(cover_url, cover_filename)
+            with span("cover"):
+                urllib.request.urlretrieve(cover_url, cover_filename)
 
             update_metadata(audio_filename, artist=artist, title=title, cover_file=cover_filename)
 
@@ -1,12 +1,14 @@
 import logging
 import os
-import asyncio
 
 import yt_dlp
 
+from config.settings import UPLOAD_LIMIT_MB
 from utils import truncate_string
+from utils.local_file import upload_file
+from utils.ytdlp_runner import ytdlp_runner
+from utils.metrics import instrument_download
 from aiogram.enums import InputMediaType
-from aiogram.types import FSInputFile
 from aiogram.utils.media_group import MediaGroupBuilder
 
 
@@ -43,10 +45,12 @@ class BilibiliDownloader:
         self.output_path = output_path
         os.makedirs(self.output_path, exist_ok=True)
         self.yt_dlp_video_options = {
-                "format": "bv*[filesize < 50M][ext=mp4] + ba/w",
-                "outtmpl": f"{self.output_path}/%(title)s.%(ext)s",
+                "format": f"bv*[filesize < {UPLOAD_LIMIT_MB}M][ext=mp4] + ba/w",
+                "outtmpl": "%(title)s.%(ext)s",
+                "paths": {"home": self.output_path},
             }
 
+    @instrument_download
     async def download(self, url: str, format: str):
         """
         Download a media file (video or audio) based on the format.
@@ -97,18 +101,12 @@ class BilibiliDownloader:
             Returns None if an error occurs.
         """
         try:
-            with yt_dlp.YoutubeDL(self.yt_dlp_video_options) as ydl:
-                info_dict = await asyncio.to_thread(ydl.extract_info, url, download=False)
-                title = info_dict.get("title", "video")
-                filename = ydl.prepare_filename(info_dict)
+            result = await ytdlp_runner.download(url, self.yt_dlp_video_options)
 
-                await asyncio.to_thread(ydl.download, [url])
+            media_group = MediaGroupBuilder(caption=truncate_string(result.title or "video"))
+            media_group.add_video(media=upload_file(result.filepath), type=InputMediaType.VIDEO)
 
-                media_group = MediaGroupBuilder(caption=truncate_string(title))
-                media_group.add_video(media=FSInputFile(filename), type=InputMediaType.VIDEO)
-
-                if os.path.exists(filename):
-                    yield media_group, [filename]
+            yield media_group, result.files
         except yt_dlp.DownloadError as e:
             logging.error(f"Error downloading YouTube video: {str(e)}")
             yield None, None
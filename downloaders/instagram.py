@@ -2,17 +2,20 @@ import json
 import logging
 import os
 
-import aiofiles
 import aiohttp
 import yarl
 from aiogram.enums import InputMediaType
-from aiogram.types import FSInputFile
 from aiogram.utils.media_group import MediaGroupBuilder
 from instagrapi import Client
 
 from config.secrets import INSTA_PASSWORD, INSTA_USERNAME
 
+from config.settings import STREAM_UPLOADS
 from utils import truncate_string
+from utils.media_staging import media_staging
+from utils.streaming_input_file import StreamingInputFile
+from utils.job_workspace import workspace_dir
+from utils.metrics import instrument_download
 
 
 class InstagramDownloader:
@@ -47,6 +50,7 @@ class InstagramDownloader:
         self.output_path = output_path
         os.makedirs(self.output_path, exist_ok=True)
 
+    @instrument_download
     async def download(self, url: str, format: str):
         """
         Download a media file based on the format.
@@ -128,20 +132,34 @@ class InstagramDownloader:
 
             for i, (media_url, media_type) in enumerate(zip(media_urls, media_types)):
                 filename_ext = ".jpg" if media_type == "photo" else ".mp4"
-                media_filename = os.path.join(self.output_path, f"{media_pk}_{i}{filename_ext}")
-
-                async with aiohttp.ClientSession() as session:
-                    async with session.request("GET", url=yarl.URL(str(media_url), encoded=True)) as response:
-                        if response.status == 200:
-                            async with aiofiles.open(media_filename, "wb") as file:
-                                await file.write(await response.read())
-                                temp_medias.append(media_filename)
-                            if media_type == "photo":
-                                media_group.add_photo(media=FSInputFile(media_filename), type=InputMediaType.PHOTO)
-                            else:
-                                media_group.add_video(media=FSInputFile(media_filename), type=InputMediaType.VIDEO)
-                        else:
-                            print(f"Failed to download media: {media_url}")
+
+                if STREAM_UPLOADS:
+                    # Signed CDN links must not be re-encoded
+                    media = StreamingInputFile(
+                        yarl.URL(str(media_url), encoded=True), filename=f"{media_pk}_{i}{filename_ext}"
+                    )
+                    if media_type == "photo":
+                        media_group.add_photo(media=media, type=InputMediaType.PHOTO)
+                    else:
+                        media_group.add_video(media=media, type=InputMediaType.VIDEO)
+                    continue
+
+                try:
+                    staged = await media_staging.fetch(
+                        yarl.URL(str(media_url), encoded=True),
+                        f"{media_pk}_{i}{filename_ext}",
+                        workspace_dir(self.output_path),
+                    )
+                except aiohttp.ClientError:
+                    print(f"Failed to download media: {media_url}")
+                    continue
+
+                if staged.path:
+                    temp_medias.append(staged.path)
+                if media_type == "photo":
+                    media_group.add_photo(media=staged.file, type=InputMediaType.PHOTO)
+                else:
+                    media_group.add_video(media=staged.file, type=InputMediaType.VIDEO)
 
             yield media_group, temp_medias
 
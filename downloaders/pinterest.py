@@ -1,16 +1,20 @@
-import asyncio
 import logging
 import os
-import urllib.request
 import re
 
 import aiohttp
-import yt_dlp
 from aiogram.enums import InputMediaType
-from aiogram.types import FSInputFile
 from aiogram.utils.media_group import MediaGroupBuilder
 from bs4 import BeautifulSoup
 
+from config.settings import STREAM_UPLOADS
+from utils.job_workspace import workspace_dir
+from utils.media_staging import media_staging
+from utils.streaming_input_file import StreamingInputFile
+from utils.local_file import upload_file
+from utils.ytdlp_runner import ytdlp_runner
+from utils.metrics import instrument_download
+
 
 class PinterestDownloader:
     """
@@ -42,7 +46,12 @@ class PinterestDownloader:
         """
         self.output_path = output_path
         os.makedirs(self.output_path, exist_ok=True)
+        self.yt_dlp_options = {
+            "outtmpl": "%(id)s.%(ext)s",
+            "paths": {"home": self.output_path},
+        }
 
+    @instrument_download
     async def download(self, url: str, format: str):
         """
         Download a media file based on the format.
@@ -97,21 +106,13 @@ class PinterestDownloader:
                 url = str(link.url)
 
         try:
-            parts = url.split("/")
-            filename = parts[-3]
-            options = {
-                "outtmpl": f"{output_path}/{filename}.%(ext)s",
-            }
-
-            with yt_dlp.YoutubeDL(options) as ydl:
-                info_dict = await asyncio.to_thread(ydl.extract_info, url, download=False)
-                file_path = ydl.prepare_filename(info_dict)
-                await asyncio.to_thread(ydl.download, [url])
+            # One options profile for every pin, so yt-dlp workers reuse their YoutubeDL instance
+            result = await ytdlp_runner.download(url, self.yt_dlp_options)
 
-                media_group = MediaGroupBuilder()
-                media_group.add_video(media=FSInputFile(file_path), type=InputMediaType.VIDEO)
+            media_group = MediaGroupBuilder()
+            media_group.add_video(media=upload_file(result.filepath), type=InputMediaType.VIDEO)
 
-                yield media_group, file_path
+            yield media_group, result.files
 
         except Exception:
             async with aiohttp.ClientSession() as session:
@@ -128,19 +129,31 @@ class PinterestDownloader:
 
                         parts = content_url.split("/")
                         filename = parts[-1]
-                        file_path = os.path.join(output_path, filename)
                         content_url = re.sub(r'/\d+x', '/originals', content_url)
 
+                        if STREAM_UPLOADS:
+                            for candidate in (content_url, re.sub(r'\.jpg$', '.png', content_url)):
+                                if await StreamingInputFile.probe(candidate):
+                                    media_group = MediaGroupBuilder()
+                                    media_group.add_photo(
+                                        media=StreamingInputFile(candidate, filename=candidate.split("/")[-1]),
+                                        type=InputMediaType.PHOTO,
+                                    )
+                                    yield media_group, []
+                                    return
+
                         try:
-                            urllib.request.urlretrieve(content_url, file_path)
+                            staged = await media_staging.fetch(content_url, filename, workspace_dir(output_path))
                         except Exception:
                             content_url = re.sub(r'\.jpg$', '.png', content_url)
-                            urllib.request.urlretrieve(content_url, file_path)
+                            staged = await media_staging.fetch(
+                                content_url, content_url.split("/")[-1], workspace_dir(output_path)
+                            )
 
                         media_group = MediaGroupBuilder()
-                        media_group.add_photo(media=FSInputFile(file_path), type=InputMediaType.PHOTO)
+                        media_group.add_photo(media=staged.file, type=InputMediaType.PHOTO)
 
-                        yield media_group, file_path
+                        yield media_group, [staged.path] if staged.path else []
 
                     else:
                         logging.error('Class "img" not found')
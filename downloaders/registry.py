@@ -0,0 +1,44 @@
+import importlib
+import logging
+
+# Platform (as returned by utils.url_router) -> (module, class name)
+PLATFORM_DOWNLOADERS = {
+    "youtube": ("downloaders.youtube", "YouTubeDownloader"),
+    "youtube_music": ("downloaders.youtube", "YouTubeDownloader"),
+    "tiktok": ("downloaders.tiktok", "TikTokDownloader"),
+    "soundcloud": ("downloaders.soundcloud", "SoundCloudDownloader"),
+    "spotify": ("downloaders.spotify", "SpotifyDownloader"),
+    "apple_music": ("downloaders.apple_music", "AppleMusicDownloader"),
+    "pinterest": ("downloaders.pinterest", "PinterestDownloader"),
+    "bilibili": ("downloaders.bilibili", "BilibiliDownloader"),
+    "twitter": ("downloaders.twitter", "TwitterDownloader"),
+    "instagram": ("downloaders.instagram", "InstagramDownloader"),
+}
+
+_instances = {}
+
+
+def get_downloader(platform: str):
+    """
+    Returns the downloader for a platform.
+
+    The downloader module is imported and the downloader is built the first time
+    the platform is requested; afterwards the same instance is reused, so state
+    such as the Instagram login survives between messages.
+
+    Args:
+        platform (str): Platform name, such as: youtube, tiktok, spotify, etc.
+
+    Returns:
+        Downloader instance with an async `download(url, format)` generator.
+
+    Raises:
+        KeyError: If there is no downloader for the platform.
+    """
+    module_name, class_name = PLATFORM_DOWNLOADERS[platform]
+    instance = _instances.get((module_name, class_name))
+    if instance is None:
+        logging.info(f"Loading downloader {module_name}.{class_name}")
+        downloader_class = getattr(importlib.import_module(module_name), class_name)
+        instance = _instances[(module_name, class_name)] = downloader_class()
+    return instance
@@ -1,11 +1,12 @@
 import logging
 import os
-import asyncio
 import re
 import urllib.request
-import yt_dlp
 from yt_dlp.utils import sanitize_filename
 from utils import update_metadata, get_all_tracks_from_playlist_soundcloud
+from utils.ytdlp_runner import ytdlp_runner
+from utils.metrics import instrument_download
+from utils.tracing import span
 
 
 class SoundCloudDownloader:
@@ -23,7 +24,8 @@ class SoundCloudDownloader:
         self.yt_dlp_options = {
             "format": "bestaudio",
             "writethumbnail": True,
-            "outtmpl": f"{output_path}/{sanitize_filename('%(title)s')}",
+            "outtmpl": sanitize_filename('%(title)s'),
+            "paths": {"home": output_path},
             "postprocessors": [
                 {
                     "key": "FFmpegExtractAudio",
@@ -32,6 +34,7 @@ class SoundCloudDownloader:
             ],
         }
 
+    @instrument_download
     async def download(self, url: str, format: str = "audio"):
         """
         Download a media file (video or audio) based on the format.
@@ -113,23 +116,20 @@ class SoundCloudDownloader:
             Returns a tuple containing the audio filename and cover filename, or (None, None) if an error occurs.
         """
         try:
-            # Download track info
-            ydl = yt_dlp.YoutubeDL(self.yt_dlp_options)
-            info_dict = await asyncio.to_thread(ydl.extract_info, url, download=False)
-            title = info_dict.get("title")
-            artist = info_dict.get("uploader")
-            cover_url = self._get_cover_url(info_dict)
-
-            # Download the track
-            await asyncio.to_thread(ydl.download, [url])
+            # Download the track and its info
+            result = await ytdlp_runner.download(url, self.yt_dlp_options)
+            title = result.info.get("title")
+            artist = result.info.get("uploader")
+            cover_url = self._get_cover_url(result.info)
 
             # Filenames for audio and cover
-            audio_filename = os.path.join(self.output_path, f"{sanitize_filename(title)}.mp3")
-            cover_filename = os.path.join(self.output_path, f"{sanitize_filename(title)}.jpg")
+            audio_filename = result.filepath
+            cover_filename = f"{os.path.splitext(audio_filename)[0]}.jpg"
 
             # Download the cover image
             if cover_url:
-                urllib.request.urlretrieve(cover_url, cover_filename)
+                with span("cover"):
+                    urllib.request.urlretrieve(cover_url, cover_filename)
 
             # Update metadata
             update_metadata(audio_file=audio_filename, title=title, artist=artist, cover_file=cover_filename)
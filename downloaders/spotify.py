@@ -1,13 +1,14 @@
 import logging
 import os
-import asyncio
 import re
 
-import yt_dlp
 from yt_dlp.utils import sanitize_filename
 import urllib.request
 
 from utils import update_metadata, get_spotify_author, search_music, get_all_tracks_from_playlist_spotify
+from utils.ytdlp_runner import ytdlp_runner
+from utils.metrics import instrument_download
+from utils.tracing import span
 
 
 class SpotifyDownloader:
@@ -26,7 +27,8 @@ class SpotifyDownloader:
             # 'sponsorblock-mark': "music_offtopic, sponsor, selfpromo, interaction, intro, outro, preview",
             # 'sponsorblock-remove': "music_offtopic, sponsor, selfpromo, interaction, intro, outro, preview",
             "format": "m4a/bestaudio/best",
-            "outtmpl": f"{output_path}/{sanitize_filename('%(title)s')}",
+            "outtmpl": sanitize_filename('%(title)s'),
+            "paths": {"home": output_path},
             "postprocessors": [
                 {
                     "key": "FFmpegExtractAudio",
@@ -35,6 +37,7 @@ class SpotifyDownloader:
             ],
         }
 
+    @instrument_download
     async def download(self, url: str, format: str = "audio"):
         """
         Download a media file (video or audio) based on the format.
@@ -131,17 +134,13 @@ class SpotifyDownloader:
         video_link = await search_music(artist, title)
 
         try:
-            ydl = yt_dlp.YoutubeDL(self.yt_dlp_options)
+            result = await ytdlp_runner.download(video_link, self.yt_dlp_options)
 
-            info_dict = await asyncio.to_thread(ydl.extract_info, video_link, download=False)
-            ydl_title = info_dict.get("title")
+            audio_filename = result.filepath
+            cover_filename = f"{os.path.splitext(audio_filename)[0]}.jpg"
 
-            await asyncio.to_thread(ydl.download, [video_link])
-
-            audio_filename = os.path.join(output_path, f"{sanitize_filename(ydl_title)}.mp3")
-            cover_filename = os.path.join(output_path, f"{sanitize_filename(ydl_title)}.jpg")
-
-            urllib.request.urlretrieve(cover_url, cover_filename)
+            with span("cover"):
+                urllib.request.urlretrieve(cover_url, cover_filename)
 
             update_metadata(audio_filename, artist=artist, title=title, cover_file=cover_filename)
 
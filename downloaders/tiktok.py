@@ -1,12 +1,16 @@
-import asyncio
 import logging
 import os
 
-import yt_dlp
 from aiogram.enums import InputMediaType
-from aiogram.types import FSInputFile
 from aiogram.utils.media_group import MediaGroupBuilder
 
+from config.settings import STREAM_UPLOADS
+from utils.streaming_input_file import StreamingInputFile, stream_headers
+from utils.local_file import upload_file
+from utils.ytdlp_pool import ytdlp_pool
+from utils.ytdlp_runner import ytdlp_runner
+from utils.metrics import instrument_download
+
 
 class TikTokDownloader:
     """
@@ -42,7 +46,8 @@ class TikTokDownloader:
         os.makedirs(self.output_path, exist_ok=True)
         self.yt_dlp_video_options = {
             "format": "mp4",
-            "outtmpl": f"{output_path}/%(title)s.%(ext)s",
+            "outtmpl": "%(title)s.%(ext)s",
+            "paths": {"home": output_path},
         }
         # self.yt_dlp_audio_options = {
         #         "format": "m4a/bestaudio/best",
@@ -56,6 +61,7 @@ class TikTokDownloader:
         #         ],
         #     }
 
+    @instrument_download
     async def download(self, url: str, format: str):
         """
         Download a media file (video or audio) based on the format.
@@ -88,16 +94,57 @@ class TikTokDownloader:
 
     async def _download_video(self, url):
         try:
-            with yt_dlp.YoutubeDL(self.yt_dlp_video_options) as ydl:
-                info_dict = await asyncio.to_thread(ydl.extract_info, url, download=False)
-                filename = ydl.prepare_filename(info_dict)
-                await asyncio.to_thread(ydl.download, [url])
+            if STREAM_UPLOADS:
+                try:
+                    media_group = await self._stream_video(url)
+                except Exception as e:
+                    # Streaming is only a shortcut, the download below still works
+                    logging.warning(f"Could not stream Tiktok video, downloading it: {e}")
+                    media_group = None
+                if media_group is not None:
+                    yield media_group, []
+                    return
+
+            result = await ytdlp_runner.download(url, self.yt_dlp_video_options)
 
-                media_group = MediaGroupBuilder()
-                media_group.add_video(media=FSInputFile(filename), type=InputMediaType.VIDEO)
+            media_group = MediaGroupBuilder()
+            media_group.add_video(media=upload_file(result.filepath), type=InputMediaType.VIDEO)
 
-                if os.path.exists(filename):
-                    yield media_group, filename
+            yield media_group, result.files
         except Exception as e:
             logging.error(f"Error downloading Tiktok video: {str(e)}")
-            yield None, None
\ No newline at end of file
+            yield None, None
+
+    async def _stream_video(self, url: str):
+        """
+        Prepares the TikTok mp4 to be piped from the CDN straight into the upload.
+
+        Parameters:
+        ----------
+        url : str
+            The TikTok video URL.
+
+        Returns:
+        -------
+        MediaGroupBuilder or None
+            The media group with a streaming video, or None if the CDN link does not answer
+            and the video has to be downloaded.
+
+        Raises:
+        ------
+        Exception
+            If the extraction fails; the caller downloads the video instead.
+        """
+        info = await ytdlp_pool.extract_info(url, self.yt_dlp_video_options, download=False)
+        # A single-format result has no requested_formats, the info dict is the format itself
+        video = (info.get("requested_formats") or [info])[0]
+        headers = stream_headers(video)
+        if not video.get("url") or not await StreamingInputFile.probe(video["url"], headers):
+            return None
+
+        media_group = MediaGroupBuilder()
+        media_group.add_video(
+            media=StreamingInputFile(video["url"], headers=headers, filename=f"{info.get('id', 'video')}.mp4"),
+            type=InputMediaType.VIDEO,
+        )
+        return media_group
\ No newline at end of file
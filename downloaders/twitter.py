@@ -1,18 +1,20 @@
 import re
-import asyncio
 import logging
 import os
-import urllib.request
 
 import yt_dlp
 from aiogram.enums import InputMediaType
-from aiogram.types import FSInputFile
 from aiogram.utils.media_group import MediaGroupBuilder
 from playwright.async_api import async_playwright
 
+from config.settings import STREAM_UPLOADS
 from utils import truncate_string
-
-semaphore = asyncio.Semaphore(3)
+from utils.media_staging import media_staging
+from utils.streaming_input_file import StreamingInputFile
+from utils.job_workspace import workspace_dir
+from utils.local_file import upload_file
+from utils.ytdlp_runner import ytdlp_runner
+from utils.metrics import instrument_download
 
 browser_instance = None
 
@@ -49,9 +51,11 @@ class TwitterDownloader:
         self.output_path = output_path
         os.makedirs(self.output_path, exist_ok=True)
         self.yt_dlp_video_options = {
-            "outtmpl": f"{output_path}/%(title)s.%(ext)s",
+            "outtmpl": "%(title)s.%(ext)s",
+            "paths": {"home": output_path},
         }
 
+    @instrument_download
     async def download(self, url: str, format: str):
         """
         Download a media file  based on the format.
@@ -82,71 +86,68 @@ class TwitterDownloader:
 
     async def _download_media(self, url: str, output_path: str = "other/downloadsTemp", format: str = "media"):
         try:
-            temp_medias = []
-            with yt_dlp.YoutubeDL(self.yt_dlp_video_options) as ydl:
-                info_dict = await asyncio.to_thread(ydl.extract_info, url, download=False)
-                title = info_dict.get("title", "video")
-                filename = ydl.prepare_filename(info_dict)
+            result = await ytdlp_runner.download(url, self.yt_dlp_video_options)
 
-                await asyncio.to_thread(ydl.download, [url])
+            media_group = MediaGroupBuilder(caption=truncate_string(result.title or "video"))
+            media_group.add_video(media=upload_file(result.filepath), type=InputMediaType.VIDEO)
 
-                media_group = MediaGroupBuilder(caption=truncate_string(title))
-                media_group.add_video(media=FSInputFile(filename), type=InputMediaType.VIDEO)
+            yield media_group, result.files
 
-                temp_medias.append(filename)
+        except yt_dlp.DownloadError:
+            try:
+                async with async_playwright() as p:
+                    browser = await self._get_browser_instance(p)
+
+                    page = await browser.new_page()
+
+                    await page.route(
+                        "**/*",
+                        lambda route: route.abort() if route.request.resource_type in ["font", "stylesheet",
+                                                                                       "media"] else route.continue_()
+                    )
+
+                    await page.goto(url)
+
+                    await page.wait_for_selector('img[src*="/media/"]', timeout=5000)
+
+                    images = await page.eval_on_selector_all("img[src*='/media/']",
+                                                             "imgs => imgs.map(img => img.src.split('&name')[0])")
+                    tweet_texts = await page.eval_on_selector_all(
+                        "div[data-testid='tweetText'] span",
+                        "spans => spans.map(span => span.innerText)"
+                    )
+                    full_text = " ".join(tweet_texts) if tweet_texts else ""
+                    title = f"{url.split('/')[3]} - {full_text}"
+
+                    media_group = MediaGroupBuilder(caption=truncate_string(title))
+
+                    temp_medias = []
+
+                    for image in images:
+                        image = image.split("&name")[0]
+                        name = self._sanitize_filename(f"{image.split('/')[-1]}.jpg")
+                        if STREAM_UPLOADS:
+                            media_group.add_photo(
+                                media=StreamingInputFile(image, filename=name), type=InputMediaType.PHOTO
+                            )
+                            continue
+
+                        try:
+                            staged = await media_staging.fetch(image, name, workspace_dir(output_path))
+                            media_group.add_photo(media=staged.file, type=InputMediaType.PHOTO)
+                            if staged.path:
+                                temp_medias.append(staged.path)
+                        except Exception as e:
+                            print(f"Failed to download image {image}: {e}")
+                            continue
 
-                if os.path.exists(filename):
                     yield media_group, temp_medias
 
-        except yt_dlp.DownloadError:
-            async with semaphore:
-                try:
-                    async with async_playwright() as p:
-                        browser = await self._get_browser_instance(p)
-
-                        page = await browser.new_page()
-
-                        await page.route(
-                            "**/*",
-                            lambda route: route.abort() if route.request.resource_type in ["font", "stylesheet",
-                                                                                           "media"] else route.continue_()
-                        )
-
-                        await page.goto(url)
-
-                        await page.wait_for_selector('img[src*="/media/"]', timeout=5000)
-
-                        images = await page.eval_on_selector_all("img[src*='/media/']",
-                                                                 "imgs => imgs.map(img => img.src.split('&name')[0])")
-                        tweet_texts = await page.eval_on_selector_all(
-                            "div[data-testid='tweetText'] span",
-                            "spans => spans.map(span => span.innerText)"
-                        )
-                        full_text = " ".join(tweet_texts) if tweet_texts else ""
-                        title = f"{url.split('/')[3]} - {full_text}"
-
-                        media_group = MediaGroupBuilder(caption=truncate_string(title))
-
-                        temp_medias = []
-
-                        for image in images:
-                            image = image.split("&name")[0]
-                            filename = os.path.join(output_path, self._sanitize_filename(f"{image.split('/')[-1]}.jpg"))
-                            try:
-                                urllib.request.urlretrieve(image, filename)
-                                media_group.add_photo(media=FSInputFile(filename), type=InputMediaType.PHOTO)
-                                temp_medias.append(filename)
-                            except Exception as e:
-                                print(f"Failed to download image {image}: {e}")
-                                continue
-
-                        yield media_group, temp_medias
-
-                except Exception as e:
-                    print(f"Error downloading Twitter post: {str(e)}")
-
-                finally:
-                    await self._close_browser()
+            except Exception as e:
+                print(f"Error downloading Twitter post: {str(e)}")
+
+            finally:
+                await self._close_browser()
 
         except Exception as e:
             logging.error(f"Error downloading Twitter video: {str(e)}")
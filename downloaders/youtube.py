@@ -1,14 +1,15 @@
 import logging
 import os
-import asyncio
 import re
 
-import yt_dlp
 from yt_dlp.utils import sanitize_filename
 
+from config.settings import UPLOAD_LIMIT_MB
 from utils import update_metadata, get_all_tracks_from_playlist_soundcloud, truncate_string
+from utils.local_file import upload_file
+from utils.ytdlp_runner import ytdlp_runner
+from utils.metrics import instrument_download
 from aiogram.enums import InputMediaType
-from aiogram.types import FSInputFile
 from aiogram.utils.media_group import MediaGroupBuilder
 
 
@@ -45,14 +46,16 @@ class YouTubeDownloader:
         self.output_path = output_path
         os.makedirs(self.output_path, exist_ok=True)
         self.yt_dlp_video_options = {
-                "format": "bv*[filesize < 50M][ext=mp4][vcodec^=avc1] + ba[ext=m4a]",
-                "outtmpl": f"{self.output_path}/%(title)s.%(ext)s",
+                "format": f"bv*[filesize < {UPLOAD_LIMIT_MB}M][ext=mp4][vcodec^=avc1] + ba[ext=m4a]",
+                "outtmpl": "%(title)s.%(ext)s",
+                "paths": {"home": self.output_path},
                 'noplaylist': True,
             }
         self.yt_dlp_audio_options = {
                 "format": "m4a/bestaudio/best",
                 "writethumbnail": True,
-                "outtmpl": f"{self.output_path}/{sanitize_filename('%(title)s')}",
+                "outtmpl": sanitize_filename('%(title)s'),
+                "paths": {"home": self.output_path},
                 "postprocessors": [
                     {
                         "key": "FFmpegExtractAudio",
@@ -61,6 +64,7 @@ class YouTubeDownloader:
                 ],
             }
 
+    @instrument_download
     async def download(self, url: str, format: str):
         """
         Download a media file (video or audio) based on the format.
@@ -112,18 +116,12 @@ class YouTubeDownloader:
             Yields a tuple containing the MediaGroup object, video title, and list of filenames
         """
         try:
-            with yt_dlp.YoutubeDL(self.yt_dlp_video_options) as ydl:
-                info_dict = await asyncio.to_thread(ydl.extract_info, url, download=False)
-                title = info_dict.get("title", "video")
-                filename = ydl.prepare_filename(info_dict)
+            result = await ytdlp_runner.download(url, self.yt_dlp_video_options)
 
-                await asyncio.to_thread(ydl.download, [url])
+            media_group = MediaGroupBuilder(caption=truncate_string(result.title or "video"))
+            media_group.add_video(media=upload_file(result.filepath), type=InputMediaType.VIDEO)
 
-                media_group = MediaGroupBuilder(caption=truncate_string(title))
-                media_group.add_video(media=FSInputFile(filename), type=InputMediaType.VIDEO)
-
-                if os.path.exists(filename):
-                    yield media_group, [filename]
+            yield media_group, result.files
         except Exception as e:
             logging.error(f"Error downloading YouTube video: {str(e)}")
             yield None, None
@@ -174,23 +172,17 @@ class YouTubeDownloader:
         Yields:
         -------
         tuple
-            Yields a tuple containing the audio filename and thumbnail filename
+            Yields a tuple containing the audio filename and thumbnail filename. The thumbnail
+            filename is None if yt-dlp wrote no thumbnail.
         """
         try:
-            with yt_dlp.YoutubeDL(self.yt_dlp_audio_options) as ydl:
-                info_dict = await asyncio.to_thread(ydl.extract_info, url, download=False)
-                title = info_dict.get("title", "audio")
-                author = info_dict.get("uploader", "unknown")
-
-                audio_filename = os.path.join(self.output_path, f"{sanitize_filename(title)}.mp3")
-                thumbnail_filename = os.path.join(self.output_path, f"{sanitize_filename(title)}.webp")
-
-                await asyncio.to_thread(ydl.download, [url])
+            result = await ytdlp_runner.download(url, self.yt_dlp_audio_options)
+            title = result.info.get("title", "audio")
+            author = result.info.get("uploader", "unknown")
 
-                update_metadata(audio_filename, title=title, artist=author)
+            update_metadata(result.filepath, title=title, artist=author)
 
-                if os.path.exists(audio_filename):
-                    return audio_filename, thumbnail_filename
+            return result.filepath, result.thumbnail
         except Exception as e:
             logging.error(f"Error downloading YouTube Audio: {str(e)}")
             return None, None
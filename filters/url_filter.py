@@ -1,42 +1,35 @@
-import re
+from typing import Union
+
 from aiogram import types
 from aiogram.filters import BaseFilter
 
+from utils.url_router import classify_url
+
+
 class UrlFilter(BaseFilter):
     """
     A filter for detecting URLs in a message from various popular platforms.
 
-    This filter checks if the message contains a URL that matches any of the following patterns:
-        - YouTube (shorts, standard watch URL)
+    This filter checks if the message starts with a URL of one of the following platforms:
+        - YouTube (shorts, standard watch URL) and YouTube Music
         - TikTok (short URLs and regular URLs)
         - SoundCloud (track URLs)
         - Spotify (track URLs)
         - Apple Music (album URLs)
-        - Deezer (page URLs)
         - Pinterest (pins and board URLs)
         - Bilibili (video URLs)
         - Twitter/X (status URLs)
         - Instagram (posts, reels, and stories)
 
+    The URL is classified once by `utils.url_router.classify_url` and the resulting
+    `UrlMatch` is passed to the handler as the `url_match` argument.
+
     Methods:
-        __call__(message: types.Message) -> bool:
-            Asynchronously checks if the message contains a URL matching any of the patterns.
+        __call__(message: types.Message) -> Union[bool, dict]:
+            Asynchronously classifies the URL in the message.
     """
-    async def __call__(self, message: types.Message) -> bool:
-        if message.text:
-            return any([
-                re.match(r'https?://(?:www\.)?(?:m\.)?(?:youtu\.be/|youtube\.com/(?:shorts/|watch\?v=))([\w-]+)', message.text),
-                re.match(r"https:\/\/music\.youtube\.com\/(?:watch\?v=|playlist\?list=)([a-zA-Z0-9\-_]+)", message.text),
-                re.match(r'https?://vm.tiktok.com/', message.text),
-                re.match(r'https?://(?:www\.)?tiktok\.com/.*', message.text),
-                re.match(r'https?://soundcloud\.com/([\w-]+)/([\w-]+)', message.text),
-                re.match(r"https?://open\.spotify\.com/(track|playlist)/([\w-]+)", message.text),
-                re.match(r'https?://music\.apple\.com/.*/album/.+/\d+(\?.*)?$', message.text),
-                re.match(r'https?://deezer\.page\.link/([\w-]+)', message.text),
-                re.match(r'https?://(?:\w{2,3}\.)?pinterest\.com/[\w/\-]+|https://pin\.it/[A-Za-z0-9]+', message.text),
-                re.match(r'https?://(?:www\.)?bilibili\.(?:com|tv)/[\w/?=&]+', message.text),
-                re.match(r'https://(?:twitter|x)\.com/\w+/status/\d+', message.text),
-                re.match(r'https://www\.instagram\.com/(?:p|reel|tv|stories)/([A-Za-z0-9_-]+)/', message.text),
-            ])
-        else:
-            return False
\ No newline at end of file
+    async def __call__(self, message: types.Message) -> Union[bool, dict]:
+        url_match = classify_url(message.text)
+        if url_match is None:
+            return False
+        return {"url_match": url_match}
@@ -1,4 +1,10 @@
+import json
+import time
+from typing import Optional
+
+from config.settings import FILE_ID_CACHE_MAX_ENTRIES, FILE_ID_CACHE_TTL
 from database.database_manager import SQLiteDatabaseManager
+from utils.locale_cache import locale_cache
 
 async def db_add_chat(chat_id: int, locale: str, anonime_statistic: int) -> None:
     """Add chat info into database
@@ -19,6 +25,8 @@ async def db_add_chat(chat_id: int, locale: str, anonime_statistic: int) -> None
             """,
             (chat_id, locale, anonime_statistic, chat_id),
         )
+        # /start again after blocking the bot: the chat gets broadcasts again
+        await cursor.execute("UPDATE chat_settings SET blocked = 0 WHERE chat_id = ? AND blocked = 1", (chat_id,))
 
 async def db_change_lang(chat_id: int, lang: str) -> None:
     """Change localisation in database
@@ -43,6 +51,9 @@ async def db_change_lang(chat_id: int, lang: str) -> None:
                 (chat_id, lang, 0),
             )
 
+    # Written through after the change is stored, so no lookup sees the old language
+    locale_cache.put(chat_id, lang)
+
 async def db_get_lang(chat_id: int) -> str:
     """Get localisation from database
 
@@ -52,11 +63,271 @@ async def db_get_lang(chat_id: int) -> str:
     Returns:
         str: Localisation
     """
-    async with SQLiteDatabaseManager() as cursor:
+    lang = locale_cache.get(chat_id)
+    if lang is not None:
+        return lang
+
+    async with SQLiteDatabaseManager(readonly=True) as cursor:
         await cursor.execute("SELECT lang FROM chat_settings WHERE chat_id = ?", [chat_id])
         row = await cursor.fetchone()
 
+    lang = row[0] if row else "en"
+    locale_cache.put(chat_id, lang)
+    return lang
+
+
+async def db_get_cached_media(bot_id: int, media_key: str, format: str) -> Optional[list]:
+    """Get file_ids a media was previously delivered with
+
+    Args:
+        bot_id (int): Bot ID, file_ids are only valid for the bot that uploaded them
+        media_key (str): Platform-qualified media id, such as: youtube:dQw4w9WgXcQ
+        format (str): "media" or "audio"
+
+    Returns:
+        Optional[list]: Delivered messages and their file_ids, None if not cached or expired
+    """
+    now = int(time.time())
+
+    async with SQLiteDatabaseManager() as cursor:
+        await cursor.execute(
+            "SELECT payload FROM media_cache WHERE bot_id = ? AND media_key = ? AND format = ? AND created_at >= ?",
+            (bot_id, media_key, format, now - FILE_ID_CACHE_TTL),
+        )
+        row = await cursor.fetchone()
+
         if row:
-            return row[0]
+            await cursor.execute(
+                "UPDATE media_cache SET hits = hits + 1, last_used_at = ? WHERE bot_id = ? AND media_key = ? AND format = ?",
+                (now, bot_id, media_key, format),
+            )
+            return json.loads(row[0])
         else:
-            return "en"
+            return None
+
+async def db_store_cached_media(bot_id: int, media_key: str, format: str, payload: list) -> None:
+    """Remember the file_ids a media was delivered with and evict expired or least recently used entries
+
+    Args:
+        bot_id (int): Bot ID
+        media_key (str): Platform-qualified media id, such as: youtube:dQw4w9WgXcQ
+        format (str): "media" or "audio"
+        payload (list): Delivered messages and their file_ids
+    """
+    now = int(time.time())
+
+    async with SQLiteDatabaseManager() as cursor:
+        await cursor.execute(
+            """
+            INSERT OR REPLACE INTO media_cache (bot_id, media_key, format, payload, hits, created_at, last_used_at)
+            VALUES (?, ?, ?, ?, 0, ?, ?)
+            """,
+            (bot_id, media_key, format, json.dumps(payload), now, now),
+        )
+        await cursor.execute("DELETE FROM media_cache WHERE created_at < ?", (now - FILE_ID_CACHE_TTL,))
+        await cursor.execute(
+            """
+            DELETE FROM media_cache WHERE rowid IN (
+                SELECT rowid FROM media_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (FILE_ID_CACHE_MAX_ENTRIES,),
+        )
+
+async def db_delete_cached_media(bot_id: int, media_key: str, format: str) -> None:
+    """Forget cached file_ids of a media, e.g. when Telegram no longer accepts them
+
+    Args:
+        bot_id (int): Bot ID
+        media_key (str): Platform-qualified media id
+        format (str): "media" or "audio"
+    """
+    async with SQLiteDatabaseManager() as cursor:
+        await cursor.execute(
+            "DELETE FROM media_cache WHERE bot_id = ? AND media_key = ? AND format = ?",
+            (bot_id, media_key, format),
+        )
+
+
+async def db_count_broadcast_recipients() -> int:
+    """Count the chats a broadcast is sent to
+
+    Returns:
+        int: Number of chats that did not block the bot
+    """
+    async with SQLiteDatabaseManager(readonly=True) as cursor:
+        await cursor.execute("SELECT COUNT(*) FROM chat_settings WHERE blocked = 0")
+        return (await cursor.fetchone())[0]
+
+async def db_get_broadcast_recipients(after_chat_id: Optional[int], limit: int) -> list[int]:
+    """Get the next page of broadcast recipients, in chat_id order
+
+    Args:
+        after_chat_id (Optional[int]): Last chat_id of the previous page, None for the first page
+        limit (int): Page size
+
+    Returns:
+        list[int]: Chat IDs that did not block the bot, empty after the last page
+    """
+    async with SQLiteDatabaseManager(readonly=True) as cursor:
+        await cursor.execute(
+            "SELECT chat_id FROM chat_settings WHERE chat_id > ? AND blocked = 0 ORDER BY chat_id LIMIT ?",
+            (after_chat_id if after_chat_id is not None else -(2 ** 63), limit),
+        )
+        return [row[0] for row in await cursor.fetchall()]
+
+async def db_mark_chats_blocked(chat_ids: list[int]) -> None:
+    """Skip chats in the next broadcasts, because they blocked or removed the bot
+
+    Args:
+        chat_ids (list[int]): Chat IDs
+    """
+    async with SQLiteDatabaseManager() as cursor:
+        await cursor.executemany("UPDATE chat_settings SET blocked = 1 WHERE chat_id = ?", [(chat_id,) for chat_id in chat_ids])
+
+async def db_create_broadcast(text: str, worker: str, admin_chat_id: int, progress_message_id: int, total: int) -> int:
+    """Record a new broadcast campaign
+
+    Args:
+        text (str): MarkdownV2 message to send
+        worker (str): JOB_WORKER_NAME of the bot process sending it
+        admin_chat_id (int): Chat of the admin who started it
+        progress_message_id (int): Message edited with the progress
+        total (int): Number of recipients
+
+    Returns:
+        int: Broadcast ID
+    """
+    async with SQLiteDatabaseManager() as cursor:
+        await cursor.execute(
+            """
+            INSERT INTO broadcasts (text, worker, admin_chat_id, progress_message_id, total, started_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (text, worker, admin_chat_id, progress_message_id, total, int(time.time())),
+        )
+        return cursor.lastrowid
+
+async def db_get_running_broadcasts(worker: str) -> list[tuple]:
+    """Get the broadcasts a bot process did not finish, oldest first
+
+    Args:
+        worker (str): JOB_WORKER_NAME of the bot process
+
+    Returns:
+        list[tuple]: Rows of (id, text, admin_chat_id, progress_message_id, last_chat_id, total, sent, failed, blocked, started_at)
+    """
+    async with SQLiteDatabaseManager(readonly=True) as cursor:
+        await cursor.execute(
+            """
+            SELECT id, text, admin_chat_id, progress_message_id, last_chat_id, total, sent, failed, blocked, started_at
+            FROM broadcasts WHERE status = 'running' AND worker = ? ORDER BY id
+            """,
+            (worker,),
+        )
+        return await cursor.fetchall()
+
+async def db_checkpoint_broadcast(
+    broadcast_id: int, last_chat_id: Optional[int], sent: int, failed: int, blocked: int, done: bool = False
+) -> None:
+    """Store the progress of a broadcast
+
+    Args:
+        broadcast_id (int): Broadcast ID
+        last_chat_id (Optional[int]): Last recipient tried, the campaign resumes after it
+        sent (int): Messages delivered
+        failed (int): Messages that could not be delivered
+        blocked (int): Chats that blocked or removed the bot
+        done (bool): Every recipient was tried
+    """
+    async with SQLiteDatabaseManager() as cursor:
+        await cursor.execute(
+            """
+            UPDATE broadcasts SET last_chat_id = ?, sent = ?, failed = ?, blocked = ?, status = ?, finished_at = ?
+            WHERE id = ?
+            """,
+            (
+                last_chat_id, sent, failed, blocked,
+                "done" if done else "running", int(time.time()) if done else None,
+                broadcast_id,
+            ),
+        )
+
+async def db_insert_download_events(events: list[tuple]) -> None:
+    """Store a batch of download events, without the chat of chats with anonymous statistics
+
+    Args:
+        events (list[tuple]): Rows of (created_at, chat_id, platform, format, outcome, bytes, queue_ms, download_ms, upload_ms)
+    """
+    async with SQLiteDatabaseManager() as cursor:
+        await cursor.executemany(
+            """
+            INSERT INTO download_events
+                (created_at, chat_id, platform, format, outcome, bytes, queue_ms, download_ms, upload_ms)
+            SELECT ?, CASE WHEN anonymous THEN NULL ELSE ?2 END, ?, ?, ?, ?, ?, ?, ?
+            FROM (SELECT COALESCE((SELECT anonime_statistic FROM chat_settings WHERE chat_id = ?2), 0) AS anonymous)
+            """,
+            events,
+        )
+
+async def db_get_download_stats(windows: list[int], since: int, top_chats: int = 5) -> dict:
+    """Aggregate download events
+
+    Args:
+        windows (list[int]): Unix timestamps to count downloads since
+        since (int): Unix timestamp the breakdowns start at
+        top_chats (int): Number of busiest chats to return
+
+    Returns:
+        dict: {"totals": [int per window], "platforms": [(platform, downloads, failed, bytes, avg queue_ms,
+            avg download_ms, avg upload_ms)], "formats": [(format, downloads, cached, failed)],
+            "chats": [(chat_id, downloads)], "anonymous": int}
+    """
+    async with SQLiteDatabaseManager(readonly=True) as cursor:
+        await cursor.execute(
+            f"""
+            SELECT {", ".join("COALESCE(SUM(created_at >= ?), 0)" for _ in windows)}
+            FROM download_events WHERE created_at >= ?
+            """,
+            (*windows, min(windows)),
+        )
+        totals = list(await cursor.fetchone())
+
+        await cursor.execute(
+            """
+            SELECT platform, COUNT(*), SUM(outcome = 'failed'), SUM(bytes),
+                   AVG(queue_ms), AVG(download_ms), AVG(upload_ms)
+            FROM download_events WHERE created_at >= ?
+            GROUP BY platform ORDER BY COUNT(*) DESC
+            """,
+            (since,),
+        )
+        platforms = await cursor.fetchall()
+
+        await cursor.execute(
+            """
+            SELECT format, COUNT(*), SUM(outcome = 'cached'), SUM(outcome = 'failed')
+            FROM download_events WHERE created_at >= ?
+            GROUP BY format ORDER BY COUNT(*) DESC
+            """,
+            (since,),
+        )
+        formats = await cursor.fetchall()
+
+        await cursor.execute(
+            """
+            SELECT chat_id, COUNT(*) FROM download_events
+            WHERE created_at >= ? AND chat_id IS NOT NULL
+            GROUP BY chat_id ORDER BY COUNT(*) DESC LIMIT ?
+            """,
+            (since, top_chats),
+        )
+        chats = await cursor.fetchall()
+
+        await cursor.execute(
+            "SELECT COUNT(*) FROM download_events WHERE created_at >= ? AND chat_id IS NULL",
+            (since,),
+        )
+        anonymous = (await cursor.fetchone())[0]
+
+    return {"totals": totals, "platforms": platforms, "formats": formats, "chats": chats, "anonymous": anonymous}
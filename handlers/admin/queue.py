@@ -0,0 +1,85 @@
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message
+from aiogram.utils.i18n import gettext as _
+
+from config.secrets import ADMIN_ID
+from config.settings import DOWNLOAD_MODE
+from loader import dp
+from utils.download_scheduler import download_scheduler
+from utils.job_queue import job_queue
+from utils.locale_cache import locale_cache
+from utils.media_cache import media_cache
+from utils.metadata_cache import metadata_cache
+from utils.outbound import outbound_throttle
+
+
+@dp.message(Command("queue"))
+async def queue_handler(message: Message, state: FSMContext) -> None:
+    if message.from_user.id != ADMIN_ID:
+        return
+
+    stats = download_scheduler.stats()
+    platforms = ", ".join(f"{platform}: {count}" for platform, count in stats["running_by_platform"].items()) or "-"
+
+    await message.answer(
+        _("Download queue\n"
+        "Workers: {running}/{workers}\n"
+        "Queued: {queued}\n"
+        "Running by platform: {platforms}\n"
+        "Submitted: {submitted}, completed: {completed}\n"
+        "Wait avg: {wait_avg:.2f}s, p95: {wait_p95:.2f}s, max: {wait_max:.2f}s").format(platforms=platforms, **stats)
+    )
+
+    if DOWNLOAD_MODE == "queue":
+        await message.answer(job_queue_text(await job_queue.stats()))
+
+    outbound = outbound_throttle.stats()
+    await message.answer(
+        _("Outbound flood control\n"
+        "Chats: {chats}\n"
+        "Coalesced chat actions: {coalesced}\n"
+        "Retried after flood wait: {retried}").format(**outbound)
+    )
+
+    locales = locale_cache.stats()
+    await message.answer(
+        _("Locale cache\n"
+        "Entries: {entries}\n"
+        "Hits: {hits}, misses: {misses} ({hit_rate:.0%} hit rate)").format(**locales)
+    )
+
+    metadata = metadata_cache.stats()
+    await message.answer(
+        _("Metadata cache\n"
+        "Entries: {entries}\n"
+        "Hits: {hits}, misses: {misses} ({hit_rate:.0%} hit rate)").format(**metadata)
+    )
+
+    if media_cache.enabled:
+        cache = media_cache.stats()
+        await message.answer(
+            _("Media cache\n"
+            "Entries: {entries}\n"
+            "Size: {size_mb:.1f}/{max_mb:.0f} MB\n"
+            "Hits: {hits}, misses: {misses}").format(
+                size_mb=cache["size"] / 1024 / 1024, max_mb=cache["max_bytes"] / 1024 / 1024, **cache
+            )
+        )
+
+
+def job_queue_text(jobs: dict) -> str:
+    """
+    Formats the job journal block of /queue.
+
+    Args:
+        jobs (dict): Jobs per status, as returned by `job_queue.stats()`.
+
+    Returns:
+        str: The block, with downloading and uploading jobs counted as running.
+    """
+    return _("Job queue\n"
+             "Queued: {queued}, running: {running} ({downloading} downloading, {uploading} uploading)\n"
+             "Done: {done}, failed: {failed}, cancelled: {cancelled}").format(
+        running=jobs["downloading"] + jobs["uploading"], **jobs
+    )
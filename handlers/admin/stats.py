@@ -0,0 +1,77 @@
+import time
+from typing import Optional
+
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from aiogram.utils.i18n import gettext as _
+
+from config.secrets import ADMIN_ID
+from functions.db import db_get_download_stats
+from loader import dp
+from utils.download_events import download_events
+
+# Windows the totals are counted over, as (label, seconds)
+WINDOWS = (("1h", 60 * 60), ("24h", 24 * 60 * 60), ("7d", 7 * 24 * 60 * 60), ("30d", 30 * 24 * 60 * 60))
+
+
+@dp.message(Command("stats"))
+async def stats_handler(message: Message, command: CommandObject) -> None:
+    if message.from_user.id != ADMIN_ID:
+        return
+
+    # /stats 7d breaks the last 7 days down, 24h by default
+    window = parse_window(command.args or "24h")
+    if window is None:
+        await message.answer(_("Usage: /stats [window], such as: /stats 12h or /stats 7d"))
+        return
+
+    # Events still in the buffer count too
+    await download_events.flush()
+
+    now = int(time.time())
+    stats = await db_get_download_stats([now - seconds for label, seconds in WINDOWS], since=now - window)
+
+    totals = ", ".join(f"{label}: {count}" for (label, seconds), count in zip(WINDOWS, stats["totals"]))
+    platforms = "\n".join(
+        f"{platform}: {count} ({failed} failed), {(size or 0) / 1024 / 1024:.1f} MB, "
+        f"queue {queue_ms / 1000:.1f}s, download {download_ms / 1000:.1f}s, upload {upload_ms / 1000:.1f}s"
+        for platform, count, failed, size, queue_ms, download_ms, upload_ms in stats["platforms"]
+    ) or "-"
+    formats = "\n".join(
+        f"{format}: {count} ({cached} cached, {failed} failed)" for format, count, cached, failed in stats["formats"]
+    ) or "-"
+    chats = "\n".join(f"{chat_id}: {count}" for chat_id, count in stats["chats"]) or "-"
+
+    await message.answer(
+        _("Downloads\n"
+        "{totals}\n\n"
+        "Platforms, last {window}:\n{platforms}\n\n"
+        "Formats, last {window}:\n{formats}\n\n"
+        "Busiest chats, last {window}:\n{chats}\n"
+        "Anonymous: {anonymous}").format(
+            totals=totals,
+            window=command.args or "24h",
+            platforms=platforms,
+            formats=formats,
+            chats=chats,
+            anonymous=stats["anonymous"],
+        ),
+        parse_mode=None,
+    )
+
+
+def parse_window(text: str) -> Optional[int]:
+    """
+    Parses a time window such as 30m, 12h or 7d.
+
+    Args:
+        text (str): Number followed by m, h or d.
+
+    Returns:
+        Optional[int]: Window in seconds, None if the text is not a window.
+    """
+    units = {"m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+    text = text.strip().lower()
+    if len(text) < 2 or text[-1] not in units or not text[:-1].isdigit():
+        return None
+    return int(text[:-1]) * units[text[-1]]
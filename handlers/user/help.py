@@ -6,7 +6,9 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.i18n import gettext as _
 
+from config.settings import JOB_WORKER_NAME
 from loader import dp
+from utils.job_queue import job_queue
 
 
 @dp.message(Command("help"))
@@ -34,20 +36,34 @@ async def help_command(message: types.Message, state: FSMContext) -> None:
     )
 
 
+# user_id -> download tasks of that user
 user_tasks = {}
 
+
+def track_user_task(user_id: int, task: asyncio.Task) -> None:
+    """Remember a download task of the user until it finishes, so /cancel can stop it."""
+    tasks = user_tasks.setdefault(user_id, set())
+    tasks.add(task)
+
+    def forget(task: asyncio.Task) -> None:
+        tasks.discard(task)
+        if not tasks and user_tasks.get(user_id) is tasks:
+            del user_tasks[user_id]
+
+    task.add_done_callback(forget)
+
+
 @dp.message(Command("cancel"))
 async def cancel_command(message: types.Message, state: FSMContext) -> None:
     user_id = message.from_user.id
-    if user_id in user_tasks:
-        task = user_tasks[user_id]
-        task.cancel()
-        try:
-            await task
-            await message.answer(_("Your download has been cancelled."))
-        except asyncio.CancelledError:
-            await message.answer(_("Download task was successfully cancelled."))
-        finally:
-            del user_tasks[user_id]
+    tasks = list(user_tasks.get(user_id, ()))
+    # Jobs still waiting are cancelled in the journal too, so they are not resumed after a restart.
+    # Jobs already taken by a worker process, or accepted by another bot process, cannot be stopped from here
+    queued = await job_queue.cancel(user_id, JOB_WORKER_NAME)
+    if tasks or queued:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await message.answer(_("Download task was successfully cancelled."))
     else:
         await message.answer(_("No active download task found to cancel."))
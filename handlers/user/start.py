@@ -16,6 +16,7 @@ async def start_command(message: Message, state: FSMContext):
     try:
         await db_add_chat(chat_id=message.chat.id, locale="en", anonime_statistic=0)
 
+        # Also warms the locale cache for the chat's next messages
         locale = await CustomMiddleware(i18n=i18n).get_locale(chat_id=message.chat.id)
         await CustomMiddleware(i18n=i18n).set_local(state=state, locale=locale)
 
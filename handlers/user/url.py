@@ -1,108 +1,442 @@
-import logging
-import re
 import asyncio
+import logging
+import os
+import time
+from typing import Optional
 
 from aiogram import exceptions, types
 from aiogram.utils.i18n import gettext as _
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from config.secrets import ADMIN_ID
-from .help import user_tasks
-
-from downloaders import (
-    YouTubeDownloader,
-    AppleMusicDownloader,
-    BilibiliDownloader,
-    InstagramDownloader,
-    PinterestDownloader,
-    SoundCloudDownloader,
-    SpotifyDownloader,
-    TikTokDownloader,
-    TwitterDownloader,
-)
+from aiogram.utils.media_group import MediaGroupBuilder
+from config.settings import DOWNLOAD_MODE, JOB_MAX_ATTEMPTS, JOB_WORKER_NAME
+from .help import track_user_task
+
+from downloaders import get_downloader
 from filters.url_filter import UrlFilter
-from loader import dp
+from functions.db import db_delete_cached_media, db_get_cached_media, db_store_cached_media
+from loader import bot, dp
 from utils import (
     delete_files,
 )
+from utils.download_events import DownloadEvent, download_events
+from utils.download_scheduler import PRIORITY_DEFAULT, PRIORITY_PLAYLIST, download_scheduler
+from utils.job_queue import QueuedJob, job_queue
+from utils.job_workspace import JobWorkspace
+from utils.language_middleware import i18n
+from utils.local_file import upload_file
+from utils.metrics import (
+    current_platform, downloads_total, entity_too_large_total, errors_total, observe_stage, uploaded_bytes_total
+)
+from utils.outbound import admin_digest
+from utils.single_flight import download_flights
+from utils.tracing import finish_trace, start_trace
+from utils.url_router import UrlMatch, classify_url
 
 @dp.message(UrlFilter())
-async def url_handler(message: types.Message):
-    youtube_match = re.match(r'https?://(?:www\.)?(?:m\.)?(?:youtu\.be/|youtube\.com/(?:shorts/|watch\?v=))([\w-]+)', message.text)
-    if youtube_match:
+async def url_handler(message: types.Message, url_match: UrlMatch):
+    if url_match.platform == "youtube":
         markup = InlineKeyboardBuilder()
         markup.add(types.InlineKeyboardButton(text=_("Video"), callback_data="media"))
         markup.add(types.InlineKeyboardButton(text=_("Audio"), callback_data="audio"))
         await message.answer(message.text, reply_markup=markup.as_markup())
     else:
-        await download_handler(message, format="media")
+        await download_handler(message, url_match, format="media")
 
 @dp.callback_query()
 async def handle_format_choice(callback_query: types.CallbackQuery):
     await callback_query.message.delete()
-    await download_handler(callback_query.message, format=callback_query.data)
+    url_match = classify_url(callback_query.message.text)
+    if url_match is not None:
+        await download_handler(
+            callback_query.message, url_match, format=callback_query.data, user_id=callback_query.from_user.id
+        )
 
 
-async def process_download(message: types.Message, download_func, format: str = "media", **kwargs):
+async def process_download(
+    message: types.Message, url_match: UrlMatch, format: str = "media", job_id: int = None, queued_at: float = None
+):
+    event = DownloadEvent(
+        chat_id=message.chat.id,
+        platform=url_match.platform,
+        format=format,
+        outcome="done",
+        queue_ms=int((time.time() - queued_at) * 1000) if queued_at else 0,
+    )
+    # Label of the stages measured inside the downloaders; this task runs a single download
+    current_platform.set(url_match.platform)
+    start_trace(job_id, url_match.platform, format)
+
+    downloader = get_downloader(url_match.platform)
+    url = message.text
+    delivered = []
+    # Only used if this call starts the download; joiners share the starter's workspace
+    workspace = JobWorkspace(job_id=job_id)
+    status, error = "done", None
+    cached = False
+
     try:
-        if format == "media":
-            await message.bot.send_chat_action(message.chat.id, "record_video")
-            async for media_group, temp_medias in download_func(url=message.text, format="media", **kwargs):
-                if media_group is None or temp_medias is None:
-                    raise SomethingWrong()
+        sending_at = time.perf_counter()
+        if await send_cached_media(message, url_match, format):
+            cached, event.upload_ms = True, elapsed_ms(sending_at)
+            return
 
-                await message.bot.send_chat_action(message.chat.id, "upload_video")
-                await message.answer_media_group(media=media_group.build())
-                await delete_files(temp_medias)
-
-        elif format == "audio":
-            await message.bot.send_chat_action(message.chat.id, "record_voice")
-            async for audio_filename, cover_filename in download_func(url=message.text, format="audio", **kwargs):
-                if audio_filename is None or cover_filename is None:
-                    raise SomethingWrong()
-
-                await message.bot.send_chat_action(message.chat.id, "upload_voice")
-                await message.answer_audio(
-                    audio=types.FSInputFile(audio_filename),
-                    thumbnail=types.FSInputFile(cover_filename),
-                    disable_notification=True
-                )
-                await delete_files([audio_filename, cover_filename])
+        await journal(job_id, "downloading")
+        async with download_flights.join(
+            f"{url_match.key}:{format}",
+            lambda: workspace.run(downloader.download(url=url, format=format)),
+            on_release=lambda results: release_download(workspace, results),
+        ) as results:
+            # Time waiting for the downloader counts as download, time in answer_* as upload
+            waiting_at = time.perf_counter()
+            if format == "media":
+                await message.bot.send_chat_action(message.chat.id, "record_video")
+                async for media_group, temp_medias in results:
+                    event.download_ms += elapsed_ms(waiting_at)
+                    if media_group is None or temp_medias is None:
+                        raise SomethingWrong()
 
+                    sending_at = time.perf_counter()
+                    if not delivered:
+                        await journal(job_id, "uploading")
+                    await message.bot.send_chat_action(message.chat.id, "upload_video")
+                    sent = await message.answer_media_group(media=media_group.build())
+                    delivered.append(media_group_payload(sent))
+                    record_upload(event, sending_at, sent)
+                    waiting_at = time.perf_counter()
+
+            elif format == "audio":
+                await message.bot.send_chat_action(message.chat.id, "record_voice")
+                async for audio_filename, cover_filename in results:
+                    event.download_ms += elapsed_ms(waiting_at)
+                    # A missing cover is not an error, the audio is sent without a thumbnail
+                    if audio_filename is None:
+                        raise SomethingWrong()
+
+                    sending_at = time.perf_counter()
+                    if not delivered:
+                        await journal(job_id, "uploading")
+                    await message.bot.send_chat_action(message.chat.id, "upload_voice")
+                    sent = await message.answer_audio(
+                        audio=upload_file(audio_filename),
+                        thumbnail=types.FSInputFile(cover_filename) if cover_filename else None,
+                        disable_notification=True
+                    )
+                    delivered.append({"type": "audio", "file_id": sent.audio.file_id})
+                    record_upload(event, sending_at, [sent])
+                    waiting_at = time.perf_counter()
+
+        # A playlist's tracks change, its file_ids would keep serving the old track list
+        if delivered and not url_match.is_playlist:
+            await db_store_cached_media(message.bot.id, url_match.key, format, delivered)
+
+    except asyncio.CancelledError:
+        # Interrupted by a shutdown, the job stays unfinished and is resumed on the next start
+        status = None if download_scheduler.closed else "cancelled"
+        raise
     except exceptions.TelegramEntityTooLarge:
+        status, error = "failed", "media file is too large"
+        entity_too_large_total.inc(platform=url_match.platform)
         await message.answer(_("Critical error #022 - media file is too large"))
     except SomethingWrong:
+        status, error = "failed", "downloader returned no media"
+        errors_total.inc(platform=url_match.platform, error="SomethingWrong")
         await message.answer(_("Critical error #013 - something's wrong, I'm gonna go eat some cookies"))
-        await message.bot.send_message(ADMIN_ID, f"Sorry, there was an error:\n {message.text}")
+        admin_digest.report(message.bot, f"Sorry, there was an error:\n {message.text}")
     except Exception as e:
+        status, error = "failed", str(e)
+        errors_total.inc(platform=url_match.platform, error=type(e).__name__)
         logging.error(f"{e}")
         await message.answer(_("Sorry, there was an error. Try again later 🧡"))
-        await message.bot.send_message(ADMIN_ID, f"Sorry, there was an error:\n {message.text}\n\n{e}")
+        admin_digest.report(message.bot, f"Sorry, there was an error:\n {message.text}\n\n{e}")
+    finally:
+        if status is not None:
+            await journal(job_id, status, error)
+            event.outcome = "cached" if cached else status
+            record_download(event)
+            finish_trace(event.outcome, queue_ms=event.queue_ms, bytes=event.bytes, error=error)
 
 
-@dp.message(UrlFilter())
-async def download_handler(message: types.Message, format: str = "media"):
-    url_patterns = {
-        r'https?://(?:www\.)?(?:m\.)?(?:youtu\.be/|youtube\.com/(?:shorts/|watch\?v=))([\w-]+)': (YouTubeDownloader().download, None),
-        r"https:\/\/music\.youtube\.com\/(?:watch\?v=|playlist\?list=)([a-zA-Z0-9\-_]+)": (YouTubeDownloader().download, "audio"),
-        r"https?://vm.tiktok.com/": (TikTokDownloader().download, "media"),
-        r"https?://vt.tiktok.com/": (TikTokDownloader().download, "media"),
-        r"https?://(?:www\.)?tiktok\.com/.*": (TikTokDownloader().download, "media"),
-        r'https?://soundcloud\.com/([\w-]+)/([\w-]+)': (SoundCloudDownloader().download, "audio"),
-        r"https?://open\.spotify\.com/(track|playlist)/([\w-]+)": (SpotifyDownloader().download, "audio"),
-        r'https?://music\.apple\.com/.*/album/.+/\d+(\?.*)?$': (AppleMusicDownloader().download, "audio"),
-        r'https?://(?:\w{2,3}\.)?pinterest\.com/[\w/\-]+|https://pin\.it/[A-Za-z0-9]+': (PinterestDownloader().download, "media"),
-        r"https?://(?:www\.)?bilibili\.(?:com|tv)/[\w/?=&]+": (BilibiliDownloader().download, "media"),
-        r"https://(?:twitter|x)\.com/\w+/status/\d+": (TwitterDownloader().download, "media"),
-        r'https://www\.instagram\.com/(?:p|reel|tv|stories)/([A-Za-z0-9_-]+)/': (InstagramDownloader().download, "media"),
+async def journal(job_id: Optional[int], status: str, error: Optional[str] = None) -> None:
+    """
+    Records the state of a journaled download job.
+
+    Args:
+        job_id (Optional[int]): Job id in the journal, None for a download that is not journaled.
+        status (str): New state, such as: downloading, uploading, done.
+        error (Optional[str]): Why the job failed.
+    """
+    if job_id is None:
+        return
+    try:
+        await job_queue.update(job_id, status, error)
+    except Exception as e:
+        logging.error(f"Error journaling job {job_id} as {status}: {e}")
+
+
+async def send_cached_media(message: types.Message, url_match: UrlMatch, format: str) -> bool:
+    """
+    Resends a previously delivered media by its Telegram file_ids instead of downloading it again.
+    Playlists are never cached, they are downloaded every time.
+
+    Args:
+        message (types.Message): Message with the link.
+        url_match (UrlMatch): Classified link.
+        format (str): "media" or "audio".
+
+    Returns:
+        bool: True if the media was sent from the cache, False if it has to be downloaded.
+
+    Raises:
+        exceptions.TelegramBadRequest: If a file_id after the first one was rejected. The items
+            before it were already sent, so a download would send them again.
+    """
+    if url_match.is_playlist:
+        return False
+
+    payload = await db_get_cached_media(message.bot.id, url_match.key, format)
+    if payload is None:
+        return False
+
+    for index, item in enumerate(payload):
+        try:
+            if item["type"] == "audio":
+                await message.answer_audio(audio=item["file_id"], disable_notification=True)
+            else:
+                media_group = MediaGroupBuilder(caption=item.get("caption"))
+                for media in item["media"]:
+                    media_group.add(type=media["type"], media=media["file_id"])
+                await message.answer_media_group(media=media_group.build())
+        except exceptions.TelegramBadRequest as e:
+            # file_ids can expire or be revoked; the next request downloads the media again
+            logging.info(f"Cached file_id rejected for {url_match.key}: {e}")
+            await db_delete_cached_media(message.bot.id, url_match.key, format)
+            if index > 0:
+                raise
+            return False
+
+    logging.info(f"Sent {url_match.key} ({format}) from file_id cache")
+    return True
+
+
+def media_group_payload(messages: list[types.Message]) -> dict:
+    """
+    Collects the file_ids of a sent media group.
+
+    Args:
+        messages (list[types.Message]): Messages returned by answer_media_group.
+
+    Returns:
+        dict: {"type": "media_group", "caption": str, "media": [{"type": str, "file_id": str}]}.
+    """
+    media = []
+    for sent in messages:
+        if sent.video:
+            media.append({"type": "video", "file_id": sent.video.file_id})
+        elif sent.photo:
+            media.append({"type": "photo", "file_id": sent.photo[-1].file_id})
+        elif sent.audio:
+            media.append({"type": "audio", "file_id": sent.audio.file_id})
+        elif sent.document:
+            media.append({"type": "document", "file_id": sent.document.file_id})
+
+    caption = next((sent.html_text for sent in messages if sent.caption), None)
+    return {"type": "media_group", "caption": caption, "media": media}
+
+
+def record_upload(event: DownloadEvent, sending_at: float, messages: list[types.Message]) -> None:
+    """
+    Adds sent media to the download's event and to the upload metrics.
+
+    Args:
+        event (DownloadEvent): Event of the download.
+        sending_at (float): time.perf_counter() when sending started.
+        messages (list[types.Message]): Sent messages.
+    """
+    seconds = time.perf_counter() - sending_at
+    size = sent_bytes(messages)
+    event.upload_ms += int(seconds * 1000)
+    event.bytes += size
+    observe_stage("upload", seconds)
+    uploaded_bytes_total.inc(size, platform=event.platform)
+
+
+def record_download(event: DownloadEvent) -> None:
+    """
+    Logs a finished download for /stats and counts it in the metrics.
+
+    Args:
+        event (DownloadEvent): Event of the download, with its outcome.
+    """
+    download_events.record(event)
+    downloads_total.inc(platform=event.platform, format=event.format, outcome=event.outcome)
+
+
+def sent_bytes(messages: list[types.Message]) -> int:
+    """
+    Adds up the sizes Telegram reports for sent media.
+
+    Args:
+        messages (list[types.Message]): Sent messages.
+
+    Returns:
+        int: Size in bytes, 0 for media without a reported size.
+    """
+    size = 0
+    for sent in messages:
+        media = sent.video or sent.audio or sent.document or (sent.photo[-1] if sent.photo else None)
+        if media is not None and media.file_size:
+            size += media.file_size
+    return size
+
+
+def elapsed_ms(since: float) -> int:
+    """Milliseconds since a time.perf_counter() reading."""
+    return int((time.perf_counter() - since) * 1000)
+
+
+async def release_download(workspace: JobWorkspace, results: list) -> None:
+    """
+    Deletes all files of a download once nobody is sending them anymore.
+
+    A download interrupted by a shutdown keeps its workspace, so the resumed
+    job continues from the partial files.
+
+    Args:
+        workspace (JobWorkspace): Scratch directory of the download.
+        results (list): Items yielded by the downloader, for files written outside the workspace.
+    """
+    if download_scheduler.closed and asyncio.current_task().cancelling():
+        workspace.checkpoint()
+        return
+
+    outside = [path for path in result_files(results) if not path.startswith(workspace.path + os.sep)]
+    if outside:
+        await delete_files(outside)
+    await workspace.remove()
+
+
+def result_files(results: list) -> list[str]:
+    """
+    Collects the file paths of downloader results.
+
+    Args:
+        results (list): Items yielded by a downloader, such as: (media_group, [files]) or (audio, cover).
+
+    Returns:
+        list[str]: Absolute paths of the files.
+    """
+    files = []
+    for result in results:
+        for part in result or ():
+            if isinstance(part, str):
+                files.append(part)
+            elif isinstance(part, (list, tuple)):
+                files.extend(path for path in part if isinstance(path, str))
+    return [os.path.abspath(path) for path in files]
+
+
+async def download_handler(message: types.Message, url_match: UrlMatch, format: str = "media", user_id: int = None):
+    format = url_match.default_format or format
+    user_id = user_id or message.from_user.id
+    job = {
+        "message": message.model_dump(mode="json", exclude_none=True, by_alias=True),
+        "format": format,
+        "user_id": user_id,
+        "locale": i18n.current_locale,
+        "queued_at": time.time(),
     }
 
-    for pattern, (download_func, media_format) in url_patterns.items():
-        if media_format is not None:
-            format = media_format
-        if re.match(pattern, message.text):
-            task = asyncio.create_task(process_download(message, download_func, format))
-            user_tasks[message.from_user.id] = task
-            return
+    # In queue mode any worker may claim the job; inline, this process owns it
+    job_id = await job_queue.put(
+        job,
+        user_id=user_id,
+        priority=PRIORITY_PLAYLIST if url_match.is_playlist else PRIORITY_DEFAULT,
+        worker=None if DOWNLOAD_MODE == "queue" else JOB_WORKER_NAME,
+    )
+    # A worker process replies, or the bot is shutting down and runs the job on the next start
+    if DOWNLOAD_MODE == "queue" or download_scheduler.closed:
+        return
+
+    task = schedule_download(QueuedJob(id=job_id, payload=job, attempts=1), message)
+    track_user_task(user_id, task)
+
+
+def schedule_download(job: QueuedJob, message: Optional[types.Message] = None) -> asyncio.Task:
+    """
+    Submits a journaled download job to the download scheduler.
+
+    Args:
+        job (QueuedJob): Job written by `download_handler`.
+        message (Optional[types.Message]): Message with the link, rebuilt from the job if not given.
+
+    Returns:
+        asyncio.Task: The scheduler task running the job.
+
+    Raises:
+        ValueError: If the job's link is not supported anymore.
+    """
+    if message is None:
+        message = types.Message.model_validate(job.payload["message"], context={"bot": bot})
+    url_match = classify_url(message.text)
+    if url_match is None:
+        raise ValueError(f"Unsupported link in job {job.id}: {message.text}")
+
+    # Replies are sent in the language of the chat the job came from
+    with i18n.context(), i18n.use_locale(job.payload["locale"]):
+        return download_scheduler.submit(
+            process_download(message, url_match, job.payload["format"], job.id, job.payload.get("queued_at")),
+            user_id=job.payload["user_id"],
+            chat_id=message.chat.id,
+            platform=url_match.platform,
+            priority=PRIORITY_PLAYLIST if url_match.is_playlist else PRIORITY_DEFAULT,
+        )
+
+
+async def run_queued_download(job: QueuedJob) -> None:
+    """
+    Runs a download job taken from the job queue, in a worker process.
+
+    Args:
+        job (QueuedJob): Job enqueued by `download_handler`.
+    """
+    await schedule_download(job)
+
+
+async def resumable_jobs() -> list[QueuedJob]:
+    """
+    Returns the unfinished jobs of this process, failing those that already used up JOB_MAX_ATTEMPTS.
+
+    Returns:
+        list[QueuedJob]: Jobs to run again, oldest first.
+    """
+    jobs = []
+    for job in await job_queue.unfinished(JOB_WORKER_NAME):
+        if job.attempts > JOB_MAX_ATTEMPTS:
+            logging.error(f"Giving up download job {job.id} after {JOB_MAX_ATTEMPTS} attempts")
+            await job_queue.update(job.id, "failed", "too many attempts")
+        else:
+            jobs.append(job)
+    return jobs
+
+
+async def resume_downloads() -> int:
+    """
+    Runs again the jobs this bot process accepted but did not finish before it stopped.
+
+    Returns:
+        int: Number of resumed jobs.
+    """
+    jobs = await resumable_jobs()
+    for job in jobs:
+        try:
+            track_user_task(job.payload["user_id"], schedule_download(job))
+        except ValueError as e:
+            logging.error(f"{e}")
+            await job_queue.update(job.id, "failed", str(e))
+
+    if jobs:
+        logging.info(f"Resumed {len(jobs)} unfinished download jobs")
+    return len(jobs)
 
 
 class SomethingWrong(Exception):
@@ -1,14 +1,32 @@
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from config.secrets import BOT_TOKEN
+from config.settings import (
+    FSM_CACHE_MAX_ENTRIES, FSM_FLUSH_INTERVAL, FSM_STORAGE_PATH, FSM_SYNC_INTERVAL, TELEGRAM_API_LOCAL, TELEGRAM_API_URL
+)
+from database.fsm_storage import SQLiteStorage
+from utils.outbound import outbound_throttle
+
+# Point the session at a self-hosted Bot API server if one is configured
+session = None
+if TELEGRAM_API_URL:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL, is_local=TELEGRAM_API_LOCAL))
 
 # Initialize the Telegram bot with the given token and parse mode set to HTML
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+bot = Bot(token=BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+# Per-chat and global flood control of every outgoing request
+bot.session.middleware(outbound_throttle)
 
-# Initialize memory storage for the dispatcher
-storage = MemoryStorage()
+# Initialize SQLite storage for the dispatcher, so FSM states survive restarts
+storage = SQLiteStorage(
+    path=FSM_STORAGE_PATH,
+    flush_interval=FSM_FLUSH_INTERVAL,
+    sync_interval=FSM_SYNC_INTERVAL,
+    max_entries=FSM_CACHE_MAX_ENTRIES,
+)
 
-# Initialize the dispatcher with the memory storage
+# Initialize the dispatcher with the SQLite storage
 dp = Dispatcher(storage=storage)
@@ -1,25 +1,71 @@
+import time
+
+# Taken before the heavy imports below, to log the time to the first start_polling
+STARTED_AT = time.perf_counter()
+
 import asyncio
 import importlib
 import logging
 import os
 import pkgutil
+import signal
 from logging.handlers import TimedRotatingFileHandler
 
-from database.database_manager import create_table_settings
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config.settings import (
+    DOWNLOAD_MODE, DRAIN_TIMEOUT, DROP_PENDING_UPDATES, JOB_RETENTION, JOB_WORKER_LEASE, JOB_WORKER_NAME,
+    WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL
+)
+from database.database_manager import (
+    close_pools, create_table_broadcasts, create_table_download_events, create_table_media_cache, create_table_settings
+)
 from loader import bot, dp
+from utils.broadcast import broadcaster
+from utils.download_events import download_events
+from utils.download_scheduler import download_scheduler
+from utils.job_queue import INSTANCE, hold_worker_name, job_queue, prune_jobs
+from utils.job_workspace import temp_janitor
 from utils.language_middleware import CustomMiddleware, i18n
+from utils.media_cache import media_cache
+from utils.metrics import metrics_server
+from utils.outbound import admin_digest
 from utils.set_bot_commands import set_default_commands
+from utils.tracing import trace_logger
+from utils.ytdlp_pool import ytdlp_pool
 
 # Initialize CustomMiddleware and connect it to dispatcher
 CustomMiddleware(i18n=i18n).setup_dp(dp)
 
+# Background tasks started with the bot, kept referenced while they run
+warm_task = None
+janitor_task = None
+resume_task = None
+prune_task = None
+
 
 @dp.startup()
 async def on_ready():
     """
     This function is called when the bot is ready.
     """
-    logging.info("Bot is ready")
+    logging.info(f"Bot is ready, startup took {time.perf_counter() - STARTED_AT:.3f}s")
+
+    global warm_task, janitor_task, resume_task, prune_task
+    # Start yt-dlp workers in the background, so the first downloads do not pay for it
+    if DOWNLOAD_MODE == "inline":
+        warm_task = asyncio.create_task(ytdlp_pool.warm())
+        # Imported here, after load_modules registered the handlers in their order
+        from handlers.user.url import resume_downloads
+        # Run the jobs accepted before the last stop again
+        resume_task = asyncio.create_task(resume_downloads())
+    # Sweep files of crashed jobs out of the temp directory
+    janitor_task = asyncio.create_task(temp_janitor.run())
+    # Delete old finished jobs from the journal, once an hour
+    prune_task = asyncio.create_task(prune_jobs(job_queue, JOB_RETENTION, 60 * 60))
+    # Continue /news_spam campaigns interrupted by the last stop
+    await broadcaster.resume(bot)
 
 
 async def main():
@@ -27,15 +73,80 @@ async def main():
     The main asynchronous function to start the bot and perform initial setup.
     """
     await create_table_settings()
+    await create_table_media_cache()
+    await create_table_download_events()
+    await create_table_broadcasts()
+    await job_queue.setup()
+    # Jobs and broadcasts are resumed by JOB_WORKER_NAME, so two processes must not share it
+    try:
+        heartbeat_task = await hold_worker_name(job_queue, JOB_WORKER_NAME, JOB_WORKER_LEASE)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
     await set_default_commands()
 
     load_modules(["handlers.user", "handlers.admin"], ignore_files=["__init__.py", "help.py"])
+    await metrics_server.start()
 
     try:
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot, on_startup=on_ready)
+        if WEBHOOK_URL:
+            await start_webhook()
+        else:
+            await bot.delete_webhook(drop_pending_updates=DROP_PENDING_UPDATES)
+            # The session stays open, so drained jobs can still send their media
+            await dp.start_polling(bot, close_bot_session=False, on_startup=on_ready)
     except Exception as e:
         logging.error(f"An error occurred while starting the bot: {e}")
+    finally:
+        await download_scheduler.drain(DRAIN_TIMEOUT)
+        await broadcaster.stop()
+        # Errors of the drained jobs are still reported
+        await admin_digest.close()
+        await download_events.close()
+        await metrics_server.close()
+        await bot.session.close()
+        await dp.storage.close()
+        heartbeat_task.cancel()
+        await job_queue.unregister(JOB_WORKER_NAME, INSTANCE)
+        await close_pools()
+        ytdlp_pool.close()
+        media_cache.save()
+
+async def start_webhook():
+    """
+    Serves updates pushed by Telegram on an aiohttp server instead of polling.
+
+    Requests without the WEBHOOK_SECRET header are rejected. The webhook is
+    (re)registered without dropping the queued updates and is never deleted on
+    shutdown, so other instances behind the same proxy keep receiving updates.
+    On SIGTERM, downloads are drained before the server stops; links received
+    meanwhile are journaled and run on the next start.
+    """
+    if not WEBHOOK_SECRET:
+        logging.warning("WEBHOOK_SECRET is not set, webhook requests are not authenticated")
+
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET or None).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        await bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=DROP_PENDING_UPDATES,
+        )
+        logging.info(f"Listening for webhook updates on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+        stop = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+        await stop.wait()
+    finally:
+        await download_scheduler.drain(DRAIN_TIMEOUT)
+        await runner.cleanup()
 
 def load_modules(plugin_packages, ignore_files=[]):
     ignore_files.append("__init__")
@@ -66,4 +177,14 @@ if __name__ == "__main__":
     logger.setLevel(logging.ERROR)
     logger.addHandler(handler)
 
+    # Job traces as JSON lines, apart from the errors
+    trace_handler = TimedRotatingFileHandler(
+        os.path.join(log_dir, 'traces.log'),
+        when="midnight",
+        interval=1,
+        backupCount=7,
+        encoding='utf-8'
+    )
+    trace_logger.addHandler(trace_handler)
+
     asyncio.run(main())
@@ -0,0 +1,14 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Settings the bot modules read on import; the tests never reach Telegram
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("ADMIN_ID", "1")
+os.environ.setdefault("SPOTIFY_CLIENT_ID", "test")
+os.environ.setdefault("SPOTIFY_SECRET", "test")
+
+# i18n loads the catalogs from ./locales
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
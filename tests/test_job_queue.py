@@ -0,0 +1,25 @@
+import asyncio
+
+from database.database_manager import close_pools
+from utils.job_queue import SQLiteJobQueue
+
+
+def test_cancel_leaves_jobs_of_other_workers(tmp_path):
+    async def cancel():
+        queue = SQLiteJobQueue(str(tmp_path / "jobs.sql"))
+        await queue.setup()
+        try:
+            await queue.put({}, user_id=1, priority=0, worker="a")
+            await queue.put({}, user_id=1, priority=0, worker="b")
+            await queue.put({}, user_id=1, priority=0)
+            await queue.put({}, user_id=2, priority=0, worker="a")
+            cancelled = await queue.cancel(1, "a")
+            return cancelled, await queue.stats()
+        finally:
+            await close_pools()
+
+    cancelled, jobs = asyncio.run(cancel())
+
+    assert cancelled == 2
+    assert jobs["cancelled"] == 2
+    assert jobs["queued"] == 2
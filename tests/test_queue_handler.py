@@ -0,0 +1,28 @@
+import asyncio
+
+from database.database_manager import close_pools
+from handlers.admin.queue import job_queue_text
+from utils.job_queue import SQLiteJobQueue
+from utils.language_middleware import i18n
+
+
+def test_job_queue_text_renders_real_stats(tmp_path):
+    async def stats():
+        queue = SQLiteJobQueue(str(tmp_path / "jobs.sql"))
+        await queue.setup()
+        try:
+            downloading = await queue.put({}, user_id=1, priority=0, worker="w")
+            await queue.update(downloading, "downloading")
+            uploading = await queue.put({}, user_id=1, priority=0, worker="w")
+            await queue.update(uploading, "uploading")
+            await queue.put({}, user_id=1, priority=0)
+            return await queue.stats()
+        finally:
+            await close_pools()
+
+    jobs = asyncio.run(stats())
+    with i18n.context(), i18n.use_locale("en"):
+        text = job_queue_text(jobs)
+
+    assert "Queued: 1, running: 2 (1 downloading, 1 uploading)" in text
+    assert "Done: 0, failed: 0, cancelled: 0" in text
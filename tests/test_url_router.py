@@ -0,0 +1,14 @@
+from utils.url_router import classify_url
+
+
+def test_instagram_stories_of_one_account_get_their_own_keys():
+    first = classify_url("https://www.instagram.com/stories/some.user/3301234567890123456/")
+    second = classify_url("https://www.instagram.com/stories/some.user/3301234567890999999/?igsh=abc")
+
+    assert first.key == "instagram:some.user/3301234567890123456"
+    assert second.key == "instagram:some.user/3301234567890999999"
+
+
+def test_instagram_posts_are_keyed_by_shortcode():
+    assert classify_url("https://www.instagram.com/reel/C1a2B3c4D5e/").key == "instagram:C1a2B3c4D5e"
+    assert classify_url("https://www.instagram.com/p/C1a2B3c4D5e/?img_index=1").key == "instagram:C1a2B3c4D5e"
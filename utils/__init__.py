@@ -1,29 +1,45 @@
-# Working with files
-from .delete_files import delete_files
-from .update_metadata import update_metadata
-from .is_image_or_video import is_image_or_video
+import importlib
 
-# Utils for downloaders
-from .music_search_engine import search_music
-from .get_all_soundcloud_playlist import get_all_tracks_from_playlist_soundcloud
-from .get_all_spotify_playlist import get_all_tracks_from_playlist_spotify
-from .get_applemusic_author import get_applemusic_author
-from .get_spotify_author import get_spotify_author
+# Submodules are imported on first attribute access (PEP 562), so importing
+# `utils` does not pull in yt-dlp, spotipy, mutagen or deep_translator until a
+# handler actually needs them.
+_LAZY_IMPORTS = {
+    # Working with files
+    "delete_files": ".delete_files",
+    "update_metadata": ".update_metadata",
+    "is_image_or_video": ".is_image_or_video",
 
+    # Utils for downloaders
+    "search_music": ".music_search_engine",
+    "get_all_tracks_from_playlist_soundcloud": ".get_all_soundcloud_playlist",
+    "get_all_tracks_from_playlist_spotify": ".get_all_spotify_playlist",
+    "get_applemusic_author": ".get_applemusic_author",
+    "get_spotify_author": ".get_spotify_author",
 
-#  Work with language
-from .google_translate import translate_text
-from .language_middleware import get_chat_language
+    #  Work with language
+    "translate_text": ".google_translate",
+    "get_chat_language": ".language_middleware",
 
-#  Bot utils
-from .set_bot_commands import set_default_commands
+    #  Bot utils
+    "set_default_commands": ".set_bot_commands",
 
-#  Utils
-from .random_emoji import random_emoji
-from .truncate_string import truncate_string
+    #  Utils
+    "random_emoji": ".random_emoji",
+    "truncate_string": ".truncate_string",
+}
 
 __all__ =[
     "delete_files", "get_all_tracks_from_playlist_spotify", "get_all_tracks_from_playlist_soundcloud",
     "get_applemusic_author", "get_spotify_author", "translate_text", "is_image_or_video", "search_music",
     "get_chat_language", "set_default_commands", "update_metadata", "random_emoji", "truncate_string"
 ]
+
+
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,248 @@
+import asyncio
+import datetime
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.utils.i18n import gettext as _
+
+from config.settings import BROADCAST_BATCH_SIZE, BROADCAST_PROGRESS_INTERVAL, BROADCAST_RATE, JOB_WORKER_NAME
+from functions.db import (
+    db_checkpoint_broadcast, db_count_broadcast_recipients, db_create_broadcast, db_get_broadcast_recipients,
+    db_get_lang, db_get_running_broadcasts, db_mark_chats_blocked
+)
+from utils.language_middleware import i18n
+from utils.rate_limiter import TokenBucket
+
+
+@dataclass
+class Broadcast:
+    """
+    A /news_spam campaign and its progress, as checkpointed in the 'broadcasts' table.
+
+    Attributes:
+        id (int): Broadcast id.
+        text (str): MarkdownV2 message sent to the chats.
+        admin_chat_id (int): Chat of the admin who started it, skipped as a recipient.
+        progress_message_id (Optional[int]): Message in the admin chat edited with the progress.
+        last_chat_id (Optional[int]): Last recipient tried, None before the first one.
+        total (int): Number of recipients when the campaign started.
+        sent, failed, blocked (int): Recipient counts so far.
+        started_at (int): Unix timestamp.
+    """
+    id: int
+    text: str
+    admin_chat_id: int
+    progress_message_id: Optional[int]
+    last_chat_id: Optional[int] = None
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+    started_at: int = 0
+
+
+class Broadcaster:
+    """
+    Sends /news_spam campaigns to every chat, as fast as Telegram allows.
+
+    Recipients are read in chat_id order, `batch_size` at a time, with a
+    keyset cursor, and the chats of a batch are sent to concurrently through
+    a token bucket of `rate` messages per second. A RetryAfter answer pauses
+    the whole bucket and the message is retried. Chats that blocked or removed
+    the bot are marked and skipped by later campaigns. After each batch the
+    progress is checkpointed, so a campaign interrupted by a restart resumes
+    after the last finished batch: at most one batch of chats gets the
+    message twice. One campaign runs at a time.
+
+    Attributes:
+        rate (float): Messages per second.
+        batch_size (int): Recipients read and checkpointed at once.
+        progress_interval (int): Seconds between edits of the progress message.
+
+    Methods:
+        start(bot, text, admin_chat_id) -> bool
+            Starts a campaign, False if one is already running.
+        resume(bot) -> int
+            Resumes the campaigns this bot process did not finish.
+        stop()
+            Interrupts the running campaign, to be resumed on the next start.
+    """
+
+    def __init__(self, rate: float, batch_size: int, progress_interval: int):
+        self.rate = rate
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self.bucket = TokenBucket(rate, capacity=max(1, int(rate)))
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, bot: Bot, text: str, admin_chat_id: int) -> bool:
+        """
+        Starts sending a message to every chat.
+
+        Args:
+            bot (Bot): Bot to send with.
+            text (str): MarkdownV2 message.
+            admin_chat_id (int): Chat of the admin, receives the progress and the summary.
+
+        Returns:
+            bool: False if a campaign is already running.
+        """
+        if self.running:
+            return False
+
+        broadcast = Broadcast(
+            id=0, text=text, admin_chat_id=admin_chat_id, progress_message_id=None,
+            total=await db_count_broadcast_recipients(), started_at=int(time.time()),
+        )
+        progress = await bot.send_message(admin_chat_id, self._progress_text(broadcast, _("Mailing list in progress")))
+        broadcast.progress_message_id = progress.message_id
+        broadcast.id = await db_create_broadcast(
+            text, JOB_WORKER_NAME, admin_chat_id, broadcast.progress_message_id, broadcast.total
+        )
+
+        self._task = asyncio.create_task(self._run(bot, [broadcast]))
+        return True
+
+    async def resume(self, bot: Bot) -> int:
+        """
+        Resumes the campaigns of this bot process (JOB_WORKER_NAME) interrupted by the last stop.
+
+        Args:
+            bot (Bot): Bot to send with.
+
+        Returns:
+            int: Number of resumed campaigns.
+        """
+        broadcasts = [Broadcast(*row) for row in await db_get_running_broadcasts(JOB_WORKER_NAME)]
+        if not broadcasts or self.running:
+            return 0
+
+        logging.info(f"Resuming {len(broadcasts)} broadcast(s)")
+        # Progress and summary in the language of the admin, as when started from the handler
+        with i18n.context(), i18n.use_locale(await db_get_lang(broadcasts[0].admin_chat_id)):
+            self._task = asyncio.create_task(self._run(bot, broadcasts))
+        return len(broadcasts)
+
+    async def stop(self) -> None:
+        """Interrupts the running campaign; it stays 'running' and resumes after the last checkpoint."""
+        if self.running:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self, bot: Bot, broadcasts: list[Broadcast]) -> None:
+        for broadcast in broadcasts:
+            try:
+                await self._send_all(bot, broadcast)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Stays 'running', the next start retries it from the last checkpoint
+                logging.error(f"Broadcast {broadcast.id} stopped: {e}")
+
+    async def _send_all(self, bot: Bot, broadcast: Broadcast) -> None:
+        edited_at = time.monotonic()
+
+        while True:
+            chat_ids = await db_get_broadcast_recipients(broadcast.last_chat_id, self.batch_size)
+            if not chat_ids:
+                break
+
+            outcomes = await asyncio.gather(*(
+                self._send(bot, broadcast, chat_id) for chat_id in chat_ids if chat_id != broadcast.admin_chat_id
+            ))
+            blocked = [chat_id for chat_id, outcome in outcomes if outcome == "blocked"]
+            if blocked:
+                await db_mark_chats_blocked(blocked)
+
+            broadcast.sent += sum(outcome == "sent" for chat_id, outcome in outcomes)
+            broadcast.failed += sum(outcome == "failed" for chat_id, outcome in outcomes)
+            broadcast.blocked += len(blocked)
+            broadcast.last_chat_id = chat_ids[-1]
+            await db_checkpoint_broadcast(
+                broadcast.id, broadcast.last_chat_id, broadcast.sent, broadcast.failed, broadcast.blocked
+            )
+
+            if time.monotonic() - edited_at >= self.progress_interval:
+                edited_at = time.monotonic()
+                await self._edit_progress(bot, broadcast, _("Mailing list in progress"))
+
+        await db_checkpoint_broadcast(
+            broadcast.id, broadcast.last_chat_id, broadcast.sent, broadcast.failed, broadcast.blocked, done=True
+        )
+        await self._edit_progress(bot, broadcast, _("Mailing list finished"))
+
+        await bot.send_message(
+            chat_id=broadcast.admin_chat_id,
+            text=_("The mailing has been completed\n"
+                   "Beginning at {start_time}\n"
+                   "Ended at {end_time}\n"
+                   "Number of chats: {total_chat}\n"
+                   "Successfully sent: {sucсess_send}\n"
+                   "erros: {error_send}").format(
+                start_time=datetime.datetime.fromtimestamp(broadcast.started_at).strftime("%Y-%m-%d %H:%M:%S"),
+                end_time=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                total_chat=broadcast.total,
+                sucсess_send=broadcast.sent,
+                error_send=broadcast.failed + broadcast.blocked,
+            ),
+        )
+
+    async def _send(self, bot: Bot, broadcast: Broadcast, chat_id: int) -> tuple[int, str]:
+        """Sends the message to one chat and returns "sent", "blocked" or "failed"."""
+        while True:
+            await self.bucket.acquire()
+            try:
+                await bot.send_message(chat_id, broadcast.text, parse_mode=ParseMode.MARKDOWN_V2)
+                return chat_id, "sent"
+            except TelegramRetryAfter as e:
+                # Flood control applies to the whole bot, so every sender waits
+                self.bucket.pause(e.retry_after)
+            except TelegramForbiddenError:
+                return chat_id, "blocked"
+            except TelegramBadRequest as e:
+                if "chat not found" in e.message.lower():
+                    return chat_id, "blocked"
+                logging.error(f"Broadcast {broadcast.id} to {chat_id} failed: {e}")
+                return chat_id, "failed"
+            except Exception as e:
+                logging.error(f"Broadcast {broadcast.id} to {chat_id} failed: {e}")
+                return chat_id, "failed"
+
+    async def _edit_progress(self, bot: Bot, broadcast: Broadcast, title: str) -> None:
+        if broadcast.progress_message_id is None:
+            return
+
+        await self.bucket.acquire()
+        try:
+            await bot.edit_message_text(
+                self._progress_text(broadcast, title),
+                chat_id=broadcast.admin_chat_id,
+                message_id=broadcast.progress_message_id,
+            )
+        except Exception as e:
+            logging.warning(f"Could not edit the progress of broadcast {broadcast.id}: {e}")
+
+    @staticmethod
+    def _progress_text(broadcast: Broadcast, title: str) -> str:
+        return _("{title}\n"
+                 "Number of chats: {total_chat}\n"
+                 "Successfully sent: {sent}\n"
+                 "Blocked: {blocked}\n"
+                 "Errors: {failed}").format(
+            title=title, total_chat=broadcast.total, sent=broadcast.sent,
+            blocked=broadcast.blocked, failed=broadcast.failed,
+        )
+
+
+broadcaster = Broadcaster(
+    rate=BROADCAST_RATE, batch_size=BROADCAST_BATCH_SIZE, progress_interval=BROADCAST_PROGRESS_INTERVAL
+)
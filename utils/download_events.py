@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+from dataclasses import astuple, dataclass, field
+from typing import Optional
+
+from config.settings import EVENT_LOG_FLUSH_EVENTS, EVENT_LOG_FLUSH_INTERVAL, EVENT_LOG_MAX_PENDING
+from functions.db import db_insert_download_events
+
+
+@dataclass
+class DownloadEvent:
+    """
+    A finished download, as stored in the 'download_events' table.
+
+    Attributes:
+        chat_id (int): Chat of the download, dropped when written if the chat has anonymous statistics.
+        platform (str): Such as: youtube, tiktok.
+        format (str): "media" or "audio".
+        outcome (str): "done", "cached", "failed" or "cancelled".
+        bytes (int): Size of the delivered media.
+        queue_ms, download_ms, upload_ms (int): Time spent waiting for a worker, downloading and sending.
+        created_at (int): Unix timestamp.
+    """
+    chat_id: int
+    platform: str
+    format: str
+    outcome: str
+    bytes: int = 0
+    queue_ms: int = 0
+    download_ms: int = 0
+    upload_ms: int = 0
+    created_at: int = field(default_factory=lambda: int(time.time()))
+
+    def row(self) -> tuple:
+        return (self.created_at, *astuple(self)[:-1])
+
+
+class DownloadEventLog:
+    """
+    Batched writer of download events.
+
+    `record` only appends to a buffer, so a download never waits on SQLite.
+    The buffer is written in one transaction once it holds `flush_events`
+    events, or `flush_interval` seconds after the first event in it. If
+    writes keep failing, at most `max_pending` events are kept and the oldest
+    are dropped.
+
+    Attributes:
+        flush_events (int): Events that trigger a write.
+        flush_interval (float): Seconds an event waits at most before it is written.
+        max_pending (int): Events kept while the database is unavailable.
+
+    Methods:
+        record(event)
+            Adds an event to the next batch.
+        flush()
+            Writes the buffered events now.
+        close()
+            Writes what is left, on shutdown.
+    """
+
+    def __init__(self, flush_events: int, flush_interval: float, max_pending: int):
+        self.flush_events = flush_events
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: list[DownloadEvent] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._full = asyncio.Event()
+
+    def record(self, event: DownloadEvent) -> None:
+        self._pending.append(event)
+        if len(self._pending) > self.max_pending:
+            dropped = len(self._pending) - self.max_pending
+            del self._pending[:dropped]
+            logging.warning(f"Download event log is behind, dropped {dropped} event(s)")
+
+        if len(self._pending) >= self.flush_events:
+            self._full.set()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def flush(self) -> None:
+        """Writes the buffered events in one transaction."""
+        self._full.clear()
+        if not self._pending:
+            return
+
+        events, self._pending = self._pending, []
+        try:
+            await db_insert_download_events([event.row() for event in events])
+        except Exception as e:
+            logging.error(f"Error writing download events: {e}")
+            # Kept for the next flush, ahead of the newer events
+            self._pending[:0] = events
+        except asyncio.CancelledError:
+            self._pending[:0] = events
+            raise
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+
+    async def _flush_later(self) -> None:
+        # Also picks up events recorded while a flush was running
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+
+download_events = DownloadEventLog(
+    flush_events=EVENT_LOG_FLUSH_EVENTS, flush_interval=EVENT_LOG_FLUSH_INTERVAL, max_pending=EVENT_LOG_MAX_PENDING
+)
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict, deque
+
+from config.settings import (
+    DOWNLOAD_CHAT_LIMIT,
+    DOWNLOAD_PLATFORM_LIMITS,
+    DOWNLOAD_USER_LIMIT,
+    DOWNLOAD_WORKERS,
+)
+
+PRIORITY_DEFAULT = 0
+PRIORITY_PLAYLIST = 10
+
+
+class _Job:
+    __slots__ = ("user_id", "chat_id", "platform", "priority", "submitted_at", "admitted", "running", "task")
+
+    def __init__(self, user_id: int, chat_id: int, platform: str, priority: int):
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.platform = platform
+        self.priority = priority
+        self.submitted_at = time.monotonic()
+        self.admitted = asyncio.get_running_loop().create_future()
+        self.running = False
+        self.task = None
+
+
+class DownloadScheduler:
+    """
+    Runs download jobs with a bounded number of concurrent workers.
+
+    Jobs wait in per-priority queues (lower value is served first). Inside one
+    priority, users are served round-robin, so a burst of links from one user
+    or group does not starve everybody else. A job only starts when the global
+    worker cap and the per-user, per-chat and per-platform caps all allow it.
+
+    Attributes:
+        workers (int): Maximum number of jobs running at once.
+        closed (bool): True once draining started; no job is admitted anymore.
+        user_limit (int): Maximum number of running jobs per user.
+        chat_limit (int): Maximum number of running jobs per chat.
+        platform_limits (dict[str, int]): Maximum number of running jobs per platform.
+
+    Methods:
+        submit(coro, user_id, chat_id, platform, priority) -> asyncio.Task:
+            Queues a job and returns the task that runs it.
+        drain(timeout):
+            Stops admitting jobs and waits for the running ones.
+        stats() -> dict:
+            Returns queue depth, running jobs and wait time statistics.
+    """
+
+    def __init__(self, workers: int, user_limit: int, chat_limit: int, platform_limits: dict[str, int]):
+        self.workers = workers
+        self.user_limit = user_limit
+        self.chat_limit = chat_limit
+        self.platform_limits = platform_limits
+        self.closed = False
+        self._jobs: set[_Job] = set()
+
+        # priority -> user_id -> queued jobs of that user
+        self._queues: dict[int, OrderedDict[int, deque[_Job]]] = {}
+        self._queued = 0
+        self._running = 0
+        self._running_by_user = Counter()
+        self._running_by_chat = Counter()
+        self._running_by_platform = Counter()
+
+        self._waits = deque(maxlen=1000)
+        self._submitted = 0
+        self._completed = 0
+
+    def submit(self, coro, user_id: int, chat_id: int, platform: str, priority: int = PRIORITY_DEFAULT) -> asyncio.Task:
+        """
+        Queues a download job.
+
+        Args:
+            coro (Coroutine): The job. It is not started until the scheduler admits it.
+            user_id (int): User who requested the download.
+            chat_id (int): Chat the download was requested in.
+            platform (str): Platform name, such as: youtube, tiktok, spotify, etc.
+            priority (int): Lower values are served first.
+
+        Returns:
+            asyncio.Task: Task that waits for a free slot and then runs the job.
+                Cancelling it removes a queued job or cancels a running one.
+        """
+        job = _Job(user_id, chat_id, platform, priority)
+        self._queues.setdefault(priority, OrderedDict()).setdefault(user_id, deque()).append(job)
+        self._queued += 1
+        self._submitted += 1
+
+        job.task = task = asyncio.create_task(self._run(job, coro))
+        self._jobs.add(job)
+        task.add_done_callback(lambda _: self._finish(job, coro))
+        self._dispatch()
+        return task
+
+    async def _run(self, job: _Job, coro):
+        await job.admitted
+        return await coro
+
+    def _finish(self, job: _Job, coro) -> None:
+        # Closes the job if it was cancelled before it had a chance to start
+        coro.close()
+        self._jobs.discard(job)
+        if job.running:
+            self._release(job)
+        else:
+            self._remove(job)
+
+    def _can_start(self, job: _Job) -> bool:
+        platform_limit = self.platform_limits.get(job.platform)
+        return (
+            self._running_by_user[job.user_id] < self.user_limit
+            and self._running_by_chat[job.chat_id] < self.chat_limit
+            and (platform_limit is None or self._running_by_platform[job.platform] < platform_limit)
+        )
+
+    def _next_job(self):
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            for user_id, jobs in users.items():
+                for job in jobs:
+                    if self._can_start(job):
+                        jobs.remove(job)
+                        if jobs:
+                            users.move_to_end(user_id)
+                        else:
+                            del users[user_id]
+                        if not users:
+                            del self._queues[priority]
+                        return job
+        return None
+
+    def _dispatch(self) -> None:
+        while not self.closed and self._running < self.workers:
+            job = self._next_job()
+            if job is None:
+                return
+
+            self._queued -= 1
+            self._running += 1
+            self._running_by_user[job.user_id] += 1
+            self._running_by_chat[job.chat_id] += 1
+            self._running_by_platform[job.platform] += 1
+
+            wait = time.monotonic() - job.submitted_at
+            self._waits.append(wait)
+            logging.info(f"Starting {job.platform} job for user {job.user_id} after {wait:.2f}s in queue")
+
+            job.running = True
+            job.admitted.set_result(None)
+
+    def _remove(self, job: _Job) -> None:
+        users = self._queues.get(job.priority, {})
+        jobs = users.get(job.user_id)
+        if jobs is None or job not in jobs:
+            return
+
+        jobs.remove(job)
+        if not jobs:
+            del users[job.user_id]
+        if not users:
+            self._queues.pop(job.priority, None)
+        self._queued -= 1
+
+    def _release(self, job: _Job) -> None:
+        self._running -= 1
+        for counter, key in (
+            (self._running_by_user, job.user_id),
+            (self._running_by_chat, job.chat_id),
+            (self._running_by_platform, job.platform),
+        ):
+            counter[key] -= 1
+            if counter[key] <= 0:
+                del counter[key]
+        self._completed += 1
+        self._dispatch()
+
+    async def drain(self, timeout: float) -> None:
+        """
+        Stops admitting jobs, waits up to `timeout` seconds for the running ones and cancels the rest.
+
+        Queued jobs are cancelled right away. Callers that journal their jobs
+        resume the cancelled ones after a restart.
+
+        Args:
+            timeout (float): Seconds the running jobs get to finish.
+        """
+        self.closed = True
+        for job in self._jobs:
+            if not job.running:
+                job.task.cancel()
+
+        running = [job.task for job in self._jobs if job.running]
+        if running:
+            logging.info(f"Draining {len(running)} running download jobs")
+            _, pending = await asyncio.wait(running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    def stats(self) -> dict:
+        """
+        Returns scheduler statistics.
+
+        Returns:
+            dict: queued and running job counts, running jobs per platform, and
+                average / 95th percentile / maximum queue wait in seconds over
+                the last 1000 started jobs.
+        """
+        waits = sorted(self._waits)
+        return {
+            "workers": self.workers,
+            "queued": self._queued,
+            "running": self._running,
+            "running_by_platform": dict(self._running_by_platform),
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "wait_avg": sum(waits) / len(waits) if waits else 0.0,
+            "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0,
+        }
+
+
+download_scheduler = DownloadScheduler(
+    workers=DOWNLOAD_WORKERS,
+    user_limit=DOWNLOAD_USER_LIMIT,
+    chat_limit=DOWNLOAD_CHAT_LIMIT,
+    platform_limits=DOWNLOAD_PLATFORM_LIMITS,
+)
@@ -1,16 +1,7 @@
 import logging
 import re
 
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
-
-from config.secrets import SPOTIFY_CLIENT_ID, SPOTIFY_SECRET
-
-
-auth_manager = SpotifyClientCredentials(
-    client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_SECRET
-)
-spotify = spotipy.Spotify(auth_manager=auth_manager)
+from .spotify_client import get_spotify_client
 
 
 def get_all_tracks_from_playlist_spotify(url: str) -> list[str]:
@@ -28,6 +19,7 @@ def get_all_tracks_from_playlist_spotify(url: str) -> list[str]:
     playlist_id = match.group(1)
     all_tracks = []
     offset = 0
+    spotify = get_spotify_client()
     limit = 100
 
     while True:
@@ -2,7 +2,10 @@ import aiohttp
 import logging
 from bs4 import BeautifulSoup
 
+from utils.tracing import span
 
+
+@span("lookup")
 async def get_applemusic_author(url: str):
     """Getting artist and title of music from Apple Music
 
@@ -1,20 +1,15 @@
 import logging
 import re
 
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
-from config.secrets import SPOTIFY_CLIENT_ID, SPOTIFY_SECRET
+from .spotify_client import get_spotify_client
+from .tracing import span
 
 
-auth_manager = SpotifyClientCredentials(
-    client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_SECRET
-)
-spotify = spotipy.Spotify(auth_manager=auth_manager)
-
 def extract_track_id(url: str) -> str:
     match = re.search(r'track/(\w+)', url)
     return match.group(1) if match else None
 
+@span("lookup")
 async def get_spotify_author(url: str):
     track_id = extract_track_id(url)
     if not track_id:
@@ -22,7 +17,7 @@ async def get_spotify_author(url: str):
         return None, None, None
 
     try:
-        result = spotify.track(track_id)
+        result = get_spotify_client().track(track_id)
         artist = ", ".join([artist["name"] for artist in result["artists"]])
         title = result["name"]
         cover_url = result['album']['images'][0]['url']
@@ -0,0 +1,399 @@
+import asyncio
+import importlib
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Optional
+
+from config.settings import JOB_QUEUE_BACKEND, JOB_QUEUE_PATH
+from database.database_manager import SQLiteDatabaseManager
+
+
+# Journal states of a job; the first three are unfinished and resumed after a restart
+UNFINISHED = ("queued", "downloading", "uploading")
+FINISHED = ("done", "failed", "cancelled")
+STATUSES = UNFINISHED + FINISHED
+
+
+@dataclass
+class QueuedJob:
+    """
+    A download job from the journal.
+
+    Attributes:
+        id (int): Job id in the queue.
+        payload (dict): What the producer enqueued, see `handlers.user.url.download_handler`.
+        attempts (int): How many times the job was claimed, this time included.
+    """
+    id: int
+    payload: dict
+    attempts: int
+
+
+class JobQueue(ABC):
+    """
+    Durable journal of download jobs, also the queue between the bot front-end and the download workers.
+
+    Every accepted job is written here before it runs, and moves through the
+    states queued -> downloading -> uploading -> done (or failed / cancelled).
+    A job is owned by a worker: the bot process itself in inline mode, or the
+    worker that claimed it in queue mode. After a restart, a worker resumes
+    its unfinished jobs. A backend is picked with JOB_QUEUE_BACKEND, either a
+    name from `BACKENDS` or "package.module:ClassName" for a custom one.
+
+    Methods:
+        put(payload, user_id, priority, worker) -> int
+            Writes a job and returns its id. Without a worker, any worker may claim it.
+        claim(worker) -> Optional[QueuedJob]
+            Takes the next unowned queued job, None if there is none.
+        update(job_id, status, error)
+            Records the state of a job.
+        unfinished(worker) -> list[QueuedJob]
+            Returns the jobs of a worker that were not finished, oldest first.
+        cancel(user_id, worker) -> int
+            Cancels the jobs of a user that did not start yet, of a worker or not claimed by any.
+        prune(max_age) -> int
+            Deletes finished jobs older than `max_age` seconds.
+        register(worker, instance, lease) -> bool
+            Takes a worker name for a process, False if another live process holds it.
+        unregister(worker, instance)
+            Gives a worker name up.
+        stats() -> dict
+            Returns the number of jobs per status.
+    """
+
+    async def setup(self) -> None:
+        """Prepares the backend, called once by the producer and by every worker."""
+
+    @abstractmethod
+    async def put(self, payload: dict, user_id: int, priority: int, worker: Optional[str] = None) -> int: ...
+
+    @abstractmethod
+    async def claim(self, worker: str) -> Optional[QueuedJob]: ...
+
+    @abstractmethod
+    async def update(self, job_id: int, status: str, error: Optional[str] = None) -> None: ...
+
+    @abstractmethod
+    async def unfinished(self, worker: str) -> list[QueuedJob]: ...
+
+    @abstractmethod
+    async def cancel(self, user_id: int, worker: str) -> int: ...
+
+    @abstractmethod
+    async def stats(self) -> dict: ...
+
+    async def prune(self, max_age: int) -> int:
+        """Deletes finished jobs older than `max_age` seconds; backends that keep no history need not implement it."""
+        return 0
+
+    async def register(self, worker: str, instance: str, lease: int) -> bool:
+        """
+        Takes the name `worker` for the process `instance`, or renews it, for `lease` seconds.
+
+        Backends without a registry accept every name, and duplicate names are up to the operator.
+        """
+        return True
+
+    async def unregister(self, worker: str, instance: str) -> None:
+        """Gives the name up, so a restarted process does not wait for the lease to expire."""
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Job journal in a SQLite database file shared by the front-end and the workers of one host.
+
+    A job is claimed with a single UPDATE ... RETURNING, so two workers never
+    take the same job. WAL journaling lets the front-end enqueue while workers
+    claim, and a state is durable once `update` returns.
+
+    Attributes:
+        path (str): Path of the database file.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH):
+        self.path = path
+
+    async def setup(self) -> None:
+        async with SQLiteDatabaseManager(path=self.path) as cursor:
+            await cursor.execute("PRAGMA journal_mode=WAL")
+            await cursor.execute(
+                """CREATE TABLE IF NOT EXISTS download_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    priority INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    worker TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    error TEXT,
+                    created_at INTEGER NOT NULL,
+                    updated_at INTEGER NOT NULL
+                );
+            """
+            )
+            await cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_download_jobs_queued ON download_jobs (status, priority, id)"
+            )
+            await cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_download_jobs_worker ON download_jobs (worker, status)"
+            )
+            await cursor.execute(
+                """CREATE TABLE IF NOT EXISTS job_workers (
+                    name TEXT PRIMARY KEY,
+                    instance TEXT NOT NULL,
+                    heartbeat_at INTEGER NOT NULL
+                );
+            """
+            )
+
+    async def put(self, payload: dict, user_id: int, priority: int, worker: Optional[str] = None) -> int:
+        now = int(time.time())
+        async with SQLiteDatabaseManager(path=self.path) as cursor:
+            await cursor.execute(
+                """
+                INSERT INTO download_jobs (user_id, priority, payload, worker, attempts, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (user_id, priority, json.dumps(payload), worker, 1 if worker else 0, now, now),
+            )
+            return cursor.lastrowid
+
+    async def claim(self, worker: str) -> Optional[QueuedJob]:
+        async with SQLiteDatabaseManager(path=self.path) as cursor:
+            await cursor.execute(
+                """
+                UPDATE download_jobs
+                SET status = 'downloading', worker = ?, attempts = attempts + 1, updated_at = ?
+                WHERE id = (
+                    SELECT id FROM download_jobs
+                    WHERE status = 'queued' AND worker IS NULL
+                    ORDER BY priority, id LIMIT 1
+                )
+                RETURNING id, payload, attempts
+                """,
+                (worker, int(time.time())),
+            )
+            row = await cursor.fetchone()
+
+        if row is None:
+            return None
+        return QueuedJob(id=row[0], payload=json.loads(row[1]), attempts=row[2])
+
+    async def update(self, job_id: int, status: str, error: Optional[str] = None) -> None:
+        async with SQLiteDatabaseManager(path=self.path) as cursor:
+            await cursor.execute(
+                "UPDATE download_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, int(time.time()), job_id),
+            )
+
+    async def unfinished(self, worker: str) -> list[QueuedJob]:
+        async with SQLiteDatabaseManager(path=self.path) as cursor:
+            await cursor.execute(
+                f"""
+                UPDATE download_jobs SET attempts = attempts + 1, updated_at = ?
+                WHERE worker = ? AND status IN ({", ".join("?" * len(UNFINISHED))})
+                RETURNING id, payload, attempts
+                """,
+                (int(time.time()), worker, *UNFINISHED),
+            )
+            rows = await cursor.fetchall()
+
+        return sorted((QueuedJob(id=row[0], payload=json.loads(row[1]), attempts=row[2]) for row in rows),
+                      key=lambda job: job.id)
+
+    async def cancel(self, user_id: int, worker: str) -> int:
+        async with SQLiteDatabaseManager(path=self.path) as cursor:
+            # Jobs of other bot processes are left to them; jobs waiting for a queue worker belong to none
+            await cursor.execute(
+                """
+                UPDATE download_jobs SET status = 'cancelled', updated_at = ?
+                WHERE user_id = ? AND status = 'queued' AND (worker = ? OR worker IS NULL)
+                """,
+                (int(time.time()), user_id, worker),
+            )
+            return cursor.rowcount
+
+    async def prune(self, max_age: int) -> int:
+        async with SQLiteDatabaseManager(path=self.path) as cursor:
+            await cursor.execute(
+                f"DELETE FROM download_jobs WHERE status IN ({', '.join('?' * len(FINISHED))}) AND updated_at < ?",
+                (*FINISHED, int(time.time()) - max_age),
+            )
+            return cursor.rowcount
+
+    async def register(self, worker: str, instance: str, lease: int) -> bool:
+        now = int(time.time())
+        async with SQLiteDatabaseManager(path=self.path) as cursor:
+            # Taken over only from the same process or from one whose heartbeat stopped
+            await cursor.execute(
+                """
+                INSERT INTO job_workers (name, instance, heartbeat_at) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET instance = excluded.instance, heartbeat_at = excluded.heartbeat_at
+                WHERE job_workers.instance = excluded.instance OR job_workers.heartbeat_at < ?
+                """,
+                (worker, instance, now, now - lease),
+            )
+            return cursor.rowcount == 1
+
+    async def unregister(self, worker: str, instance: str) -> None:
+        async with SQLiteDatabaseManager(path=self.path) as cursor:
+            await cursor.execute("DELETE FROM job_workers WHERE name = ? AND instance = ?", (worker, instance))
+
+    async def stats(self) -> dict:
+        async with SQLiteDatabaseManager(path=self.path, readonly=True) as cursor:
+            await cursor.execute("SELECT status, COUNT(*) FROM download_jobs GROUP BY status")
+            counts = dict(await cursor.fetchall())
+        return {status: counts.get(status, 0) for status in STATUSES}
+
+
+BACKENDS = {
+    "sqlite": SQLiteJobQueue,
+}
+
+
+def load_job_queue(backend: str) -> JobQueue:
+    """
+    Creates the configured job queue.
+
+    Args:
+        backend (str): A name from BACKENDS, or "package.module:ClassName" of a JobQueue subclass.
+
+    Returns:
+        JobQueue: The queue, not set up yet.
+    """
+    if backend in BACKENDS:
+        return BACKENDS[backend]()
+
+    module_name, _, class_name = backend.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+async def consume(
+    queue: JobQueue,
+    handle: Callable[[QueuedJob], Awaitable[None]],
+    worker: str,
+    concurrency: int,
+    poll_interval: float,
+    stop: asyncio.Event,
+    resumed: Iterable[QueuedJob] = (),
+) -> None:
+    """
+    Claims and runs jobs until `stop` is set, at most `concurrency` at a time.
+
+    Jobs are only claimed while there is a free slot, so jobs a busy worker
+    could not start yet stay in the queue for the other workers. Jobs still
+    running when `stop` is set are left to the caller to drain.
+
+    Args:
+        queue (JobQueue): Queue to consume.
+        handle (Callable): Runs one job and records its outcome; an exception marks the job as failed.
+        worker (str): Name of this worker, recorded on the claimed jobs.
+        concurrency (int): Maximum number of jobs running at once.
+        poll_interval (float): Seconds to wait when the queue is empty.
+        stop (asyncio.Event): Set to stop claiming jobs.
+        resumed (Iterable[QueuedJob]): Unfinished jobs of this worker, run before new ones are claimed.
+    """
+    running = set()
+    resumed = list(resumed)
+
+    async def run(job: QueuedJob) -> None:
+        try:
+            await handle(job)
+        except Exception as e:
+            logging.error(f"Download job {job.id} failed: {e}")
+            await queue.update(job.id, "failed", str(e))
+
+    while not stop.is_set():
+        if len(running) >= concurrency:
+            await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            continue
+
+        if resumed:
+            job = resumed.pop(0)
+        else:
+            try:
+                job = await queue.claim(worker)
+            except Exception as e:
+                logging.error(f"Error claiming a download job: {e}")
+                job = None
+
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        task = asyncio.create_task(run(job))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+
+# Identifies this process in the registry of worker names
+INSTANCE = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def hold_worker_name(queue: JobQueue, worker: str, lease: int) -> asyncio.Task:
+    """
+    Registers this process under a worker name and keeps the name with a heartbeat.
+
+    Two processes with one name would resume each other's running jobs, so a
+    name held by another live process is refused. A name left by a crashed
+    process is free once its lease expired; this waits for that at most once.
+
+    Args:
+        queue (JobQueue): Queue holding the registry.
+        worker (str): JOB_WORKER_NAME of this process.
+        lease (int): Seconds the name stays held without a heartbeat.
+
+    Returns:
+        asyncio.Task: The heartbeat; cancel it and call `queue.unregister(worker, INSTANCE)` on shutdown.
+
+    Raises:
+        RuntimeError: If another live process holds the name.
+    """
+    deadline = time.monotonic() + lease + 1
+    while not await queue.register(worker, INSTANCE, lease):
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"Worker name {worker} is used by another running process, set a unique JOB_WORKER_NAME")
+        logging.warning(f"Worker name {worker} is held by another process, waiting for its lease to expire")
+        await asyncio.sleep(min(5, lease))
+
+    async def heartbeat() -> None:
+        while True:
+            await asyncio.sleep(lease / 3)
+            try:
+                if not await queue.register(worker, INSTANCE, lease):
+                    logging.error(f"Worker name {worker} was taken over by another process")
+            except Exception as e:
+                logging.error(f"Error renewing worker name {worker}: {e}")
+
+    return asyncio.create_task(heartbeat())
+
+
+async def prune_jobs(queue: JobQueue, max_age: int, interval: int) -> None:
+    """
+    Deletes finished jobs older than `max_age` seconds every `interval` seconds, so the journal does not grow forever.
+
+    Args:
+        queue (JobQueue): Queue to prune.
+        max_age (int): Seconds a finished job is kept.
+        interval (int): Seconds between prunes.
+    """
+    while True:
+        try:
+            deleted = await queue.prune(max_age)
+            if deleted:
+                logging.info(f"Pruned {deleted} finished download jobs")
+        except Exception as e:
+            logging.error(f"Error pruning download jobs: {e}")
+        await asyncio.sleep(interval)
+
+
+job_queue = load_job_queue(JOB_QUEUE_BACKEND)
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+from config.settings import JOB_WORKER_NAME, TEMP_DIR, TEMP_JANITOR_INTERVAL, TEMP_MAX_AGE, TEMP_MAX_BYTES
+
+# Temp directory of this process. `JobWorkspace.active` only knows the jobs of this process, so the bot and
+# every worker keep their workspaces, and their janitor, in a directory of their own
+PROCESS_TEMP_DIR = os.path.join(TEMP_DIR, JOB_WORKER_NAME)
+_current_workspace: ContextVar[Optional[str]] = ContextVar("job_workspace", default=None)
+
+
+def current_workspace() -> Optional[str]:
+    """Returns the scratch directory of the download job running in this task, None outside of a job."""
+    return _current_workspace.get()
+
+
+def workspace_dir(default: str) -> str:
+    """
+    Returns the directory a downloader should write to.
+
+    Args:
+        default (str): Directory used outside of a job, usually the downloader's output_path.
+
+    Returns:
+        str: The job's scratch directory, or `default`.
+    """
+    return _current_workspace.get() or default
+
+
+class JobWorkspace:
+    """
+    A scratch directory of one download job.
+
+    Every job writes into its own `job-<id>` directory under TEMP_DIR/JOB_WORKER_NAME,
+    so two jobs downloading media with the same title cannot overwrite each other,
+    and all files of a job are removed with one call, whatever the downloader
+    yielded. The directory is only created when the job actually starts.
+    A journaled job gets the same directory every time it runs, so a job
+    resumed after a restart finds the partial files of its previous run.
+
+    Attributes:
+        path (str): Absolute path of the scratch directory.
+
+    Methods:
+        run(results: AsyncIterator) -> AsyncIterator
+            Runs a downloader generator with this workspace as the current one.
+        remove()
+            Deletes the directory and everything in it.
+    """
+
+    # Directories of running jobs; the janitor never touches them
+    active: set[str] = set()
+
+    def __init__(self, root: str = PROCESS_TEMP_DIR, job_id: Optional[int] = None):
+        name = f"job-{job_id}" if job_id is not None else f"job-{uuid.uuid4().hex}"
+        self.path = os.path.abspath(os.path.join(root, name))
+
+    async def run(self, results):
+        """
+        Creates the directory and makes it current while the downloader generator runs.
+
+        Args:
+            results (AsyncIterator): Items yielded by a downloader.
+
+        Yields:
+            The items of `results`.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        JobWorkspace.active.add(self.path)
+        _current_workspace.set(self.path)
+
+        async for item in results:
+            yield item
+
+    def checkpoint(self) -> None:
+        """Keeps the directory of an interrupted job for its resumption, releasing it to the janitor's age limit."""
+        JobWorkspace.active.discard(self.path)
+        logging.info(f"Kept job workspace for resumption: {self.path}")
+
+    async def remove(self) -> None:
+        JobWorkspace.active.discard(self.path)
+        if os.path.exists(self.path):
+            await asyncio.to_thread(shutil.rmtree, self.path, ignore_errors=True)
+            logging.info(f"Deleted job workspace: {self.path}")
+
+
+class TempJanitor:
+    """
+    Periodically cleans the shared temp directory.
+
+    Entries (files and job workspaces) that are not used by a running job are
+    deleted once they are older than `max_age`. If the directory still takes
+    more than `max_bytes`, the oldest unused entries are deleted until it fits.
+
+    Attributes:
+        path (str): Temp directory to clean.
+        max_age (int): Seconds after which an unused entry is an orphan.
+        max_bytes (int): Disk budget of the directory, 0 for none.
+        interval (int): Seconds between sweeps.
+
+    Methods:
+        run()
+            Sweeps forever, every `interval` seconds.
+        sweep() -> int
+            Cleans the directory once and returns the number of deleted entries.
+    """
+
+    def __init__(self, path: str, max_age: int, max_bytes: int, interval: int):
+        self.path = path
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.interval = interval
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logging.error(f"Error cleaning temp directory {self.path}: {e}")
+            await asyncio.sleep(self.interval)
+
+    def sweep(self) -> int:
+        if not os.path.isdir(self.path):
+            return 0
+
+        entries = []
+        total = 0
+        for entry in os.scandir(self.path):
+            size, mtime = self._usage(entry)
+            total += size
+            if os.path.abspath(entry.path) not in JobWorkspace.active:
+                entries.append((mtime, size, entry.path))
+        entries.sort()
+
+        deleted = 0
+        now = time.time()
+        for mtime, size, path in entries:
+            orphan = now - mtime > self.max_age
+            over_budget = self.max_bytes and total > self.max_bytes
+            if not orphan and not over_budget:
+                continue
+            if self._delete(path):
+                total -= size
+                deleted += 1
+
+        if self.max_bytes and total > self.max_bytes:
+            logging.warning(f"Temp directory uses {total} bytes, over its budget of {self.max_bytes}, in running jobs")
+        if deleted:
+            logging.info(f"Temp janitor deleted {deleted} entries from {self.path}")
+        return deleted
+
+    @staticmethod
+    def _usage(entry: os.DirEntry) -> tuple[int, float]:
+        """Returns the size and the newest modification time of a file or directory tree."""
+        try:
+            if not entry.is_dir(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                return stat.st_size, stat.st_mtime
+
+            size, mtime = 0, entry.stat(follow_symlinks=False).st_mtime
+            for root, _, names in os.walk(entry.path):
+                for name in names:
+                    try:
+                        stat = os.stat(os.path.join(root, name), follow_symlinks=False)
+                    except OSError:
+                        continue
+                    size += stat.st_size
+                    mtime = max(mtime, stat.st_mtime)
+            return size, mtime
+        except OSError:
+            return 0, time.time()
+
+    @staticmethod
+    def _delete(path: str) -> bool:
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logging.error(f"Error deleting temp entry {path}: {e}")
+            return False
+
+
+temp_janitor = TempJanitor(path=PROCESS_TEMP_DIR, max_age=TEMP_MAX_AGE, max_bytes=TEMP_MAX_BYTES, interval=TEMP_JANITOR_INTERVAL)
@@ -1,7 +1,7 @@
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.i18n import FSMI18nMiddleware, I18n, I18nMiddleware
 
-from database.database_manager import SQLiteDatabaseManager
+from functions.db import db_get_lang
 
 
 i18n = I18n(path="locales", default_locale="en", domain="messages")
@@ -46,7 +46,7 @@ class CustomMiddleware(I18nMiddleware):
 
 
 async def get_chat_language(chat_id: int):
-    """Get chat language from database
+    """Get chat language, from the locale cache or the database
 
     Args:
         chat_id (int): Chat ID
@@ -54,13 +54,4 @@ async def get_chat_language(chat_id: int):
     Returns:
         str: Localisation, such as: en, ru, etc. Default is 'en'
     """
-    async with SQLiteDatabaseManager() as cursor:
-        await cursor.execute(
-            "SELECT lang FROM chat_settings WHERE chat_id = ?", (chat_id,)
-        )
-        result = await cursor.fetchone()
-
-        if result:
-            return result[0]
-        else:
-            return "en"
+    return await db_get_lang(chat_id)
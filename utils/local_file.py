@@ -0,0 +1,25 @@
+import os
+from typing import Union
+
+from aiogram.types import FSInputFile
+
+from config.settings import TELEGRAM_API_LOCAL
+
+
+def upload_file(path: str) -> Union[str, FSInputFile]:
+    """
+    Returns what to send to Telegram for a downloaded file.
+
+    Against a local Bot API server that shares the filesystem, the server reads
+    the file itself from a `file://` URI, so the bot does not stream the body.
+    Otherwise the file is uploaded as multipart.
+
+    Args:
+        path (str): Path of the downloaded file.
+
+    Returns:
+        str | FSInputFile: A `file://` URI in local mode, an FSInputFile otherwise.
+    """
+    if TELEGRAM_API_LOCAL:
+        return f"file://{os.path.abspath(path)}"
+    return FSInputFile(path)
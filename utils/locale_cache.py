@@ -0,0 +1,74 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config.settings import LOCALE_CACHE_MAX_ENTRIES, LOCALE_CACHE_TTL
+
+
+class LocaleCache:
+    """
+    An in-process LRU cache of chat languages in front of the chat_settings table.
+
+    Entries are filled on the first lookup of a chat and written through by
+    `db_change_lang`, so resolving the language of a message costs no query.
+    Other bot processes sharing the database only learn about a change when
+    their entry expires after `ttl` seconds.
+
+    Attributes:
+        max_entries (int): Maximum number of chats, least recently used are dropped first.
+        ttl (int): Seconds an entry stays valid, 0 to keep entries until they are dropped.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that needed a query.
+
+    Methods:
+        get(chat_id: int) -> str | None
+            Returns the cached language of a chat.
+        put(chat_id: int, lang: str)
+            Stores the language of a chat.
+        stats() -> dict
+            Returns entry count and hit/miss counters.
+    """
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[int, tuple[float, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chat_id: int) -> Optional[str]:
+        entry = self._entries.get(chat_id)
+        if entry is None or (self.ttl and entry[0] < time.monotonic()):
+            self._entries.pop(chat_id, None)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(chat_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, chat_id: int, lang: str) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[chat_id] = (time.monotonic() + self.ttl, lang)
+        self._entries.move_to_end(chat_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Returns cache statistics.
+
+        Returns:
+            dict: entries, hits, misses and hit_rate (0..1) since start.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+locale_cache = LocaleCache(max_entries=LOCALE_CACHE_MAX_ENTRIES, ttl=LOCALE_CACHE_TTL)
@@ -0,0 +1,272 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from collections import Counter
+
+from config.settings import JOB_WORKER_NAME, MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_BYTES
+from utils.metadata_cache import trim_info
+
+
+def cache_key(url: str, options: dict) -> str:
+    """
+    Returns the cache key of a yt-dlp call.
+
+    Args:
+        url (str): Link to the media.
+        options (dict): YoutubeDL options the media is extracted with.
+
+    Returns:
+        str: Platform-qualified media id and options fingerprint, such as: "youtube:dQw4w9WgXcQ:3f2a9c0d1b7e".
+    """
+    from utils.url_router import classify_url
+
+    url_match = classify_url(url)
+    media_key = url_match.key if url_match is not None else url
+    fingerprint = hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode()).hexdigest()[:12]
+    return f"{media_key}:{fingerprint}"
+
+
+def _relative(path: str, root: str = None) -> str:
+    if root and path and os.path.commonpath([os.path.abspath(path), root]) == root:
+        return os.path.relpath(path, root)
+    return path
+
+
+def _absolute(path: str, root: str = None) -> str:
+    return os.path.join(root, path) if root and path and not os.path.isabs(path) else path
+
+
+def _map_paths(info: dict, convert) -> dict:
+    """Returns a copy of an info dict with the output paths passed through `convert`."""
+    info = dict(info)
+    for name in ("_filename", "_filepath", "_thumbnail"):
+        if info.get(name):
+            info[name] = convert(info[name])
+    if info.get("_files"):
+        info["_files"] = [convert(path) for path in info["_files"]]
+    return info
+
+
+class MediaCache:
+    """
+    A size-capped, content-addressed on-disk cache of downloaded media.
+
+    Entries are keyed by the platform-qualified media id of the link and a
+    fingerprint of the yt-dlp options, so the same video downloaded as video
+    and as audio are separate entries, and two videos with the same title do
+    not collide. File contents are stored once per sha256 in `blobs/`, and
+    `index.json` maps entries to the paths the files were downloaded to.
+
+    Blobs and the index are written to a temporary file and renamed, so a crash
+    never leaves a truncated file behind. When the cache grows over its byte
+    budget, the least recently used entries are evicted.
+
+    The index and the lock only exist in one process, so every process needs a
+    directory of its own; see `media_cache` below.
+
+    Attributes:
+        path (str): Cache directory.
+        max_bytes (int): Byte budget. 0 disables the cache.
+
+    Methods:
+        restore(key: str) -> dict | None
+            Copies cached files back to their download paths and returns the trimmed info dict.
+        store(key: str, info: dict)
+            Adds the files of a finished download.
+        stats() -> dict
+            Returns entry count, size and hit/miss counters.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(path, "index.json")
+        self._entries: dict[str, dict] = None
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    async def restore(self, key: str, root: str = None):
+        """
+        Copies the cached files of `key` back to the paths they were downloaded to.
+
+        Files are copied rather than linked, because downloaders edit them in
+        place (e.g. mp3 tags) and delete them after sending.
+
+        Args:
+            key (str): Cache key.
+            root (str): Workspace of the current job. Files stored from a workspace are
+                restored relative to it.
+
+        Returns:
+            dict | None: The trimmed info dict of the download, with paths in the workspace,
+                or None on a miss.
+        """
+        async with self._lock:
+            await self._load()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            try:
+                await asyncio.to_thread(self._copy_out, entry["files"], root)
+            except OSError as e:
+                logging.error(f"Error restoring {key} from media cache: {e}")
+                del self._entries[key]
+                await asyncio.to_thread(self._collect_garbage)
+                self.misses += 1
+                return None
+
+            entry["last_used"] = time.time()
+            self.hits += 1
+            logging.info(f"Restored {key} from media cache")
+            return _map_paths(entry["info"], lambda path: _absolute(path, root))
+
+    async def store(self, key: str, info: dict, root: str = None) -> None:
+        """
+        Adds the files of a finished download to the cache and evicts least recently used entries.
+
+        Args:
+            key (str): Cache key.
+            info (dict): Info dict returned by the yt-dlp worker, with the produced files in "_files".
+            root (str): Workspace the files were downloaded to. Paths are stored relative to it.
+        """
+        files = [path for path in info.get("_files", []) if os.path.isfile(path)]
+        if not files:
+            return
+
+        async with self._lock:
+            await self._load()
+            try:
+                stored = await asyncio.to_thread(self._copy_in, files, root)
+            except OSError as e:
+                logging.error(f"Error storing {key} in media cache: {e}")
+                return
+
+            self._entries[key] = {
+                "files": stored,
+                "info": _map_paths(trim_info(info), lambda path: _relative(path, root)),
+                "last_used": time.time(),
+            }
+            await asyncio.to_thread(self._evict)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.path, "blobs", digest[:2], digest)
+
+    def _copy_in(self, files: list[str], root: str = None) -> list[list]:
+        stored = []
+        for path in files:
+            sha256 = hashlib.sha256()
+            with open(path, "rb") as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    sha256.update(chunk)
+            digest = sha256.hexdigest()
+
+            blob = self._blob_path(digest)
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                temp = f"{blob}.tmp"
+                shutil.copyfile(path, temp)
+                os.replace(temp, blob)
+            stored.append([_relative(path, root), digest, os.path.getsize(blob)])
+        return stored
+
+    def _copy_out(self, files: list[list], root: str = None) -> None:
+        for path, digest, _ in files:
+            path = _absolute(path, root)
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            temp = f"{path}.cache.tmp"
+            shutil.copyfile(self._blob_path(digest), temp)
+            os.replace(temp, path)
+
+    def _size(self) -> int:
+        blobs = {digest: size for entry in self._entries.values() for _, digest, size in entry["files"]}
+        return sum(blobs.values())
+
+    def _evict(self) -> None:
+        # Blobs are shared by entries with the same content, and only free space once no entry uses them
+        references = Counter(digest for entry in self._entries.values() for _, digest, _ in entry["files"])
+        sizes = {digest: size for entry in self._entries.values() for _, digest, size in entry["files"]}
+        size = sum(sizes.values())
+        for key in sorted(self._entries, key=lambda key: self._entries[key]["last_used"]):
+            if size <= self.max_bytes:
+                break
+            for _, digest, _ in self._entries.pop(key)["files"]:
+                references[digest] -= 1
+                if references[digest] == 0:
+                    size -= sizes[digest]
+            logging.info(f"Evicted {key} from media cache")
+
+        self._collect_garbage()
+
+    def _collect_garbage(self) -> None:
+        used = {digest for entry in self._entries.values() for _, digest, _ in entry["files"]}
+        blobs_dir = os.path.join(self.path, "blobs")
+        for root, _, names in os.walk(blobs_dir):
+            for name in names:
+                if name not in used:
+                    try:
+                        os.remove(os.path.join(root, name))
+                    except OSError as e:
+                        logging.error(f"Error deleting media cache blob {name}: {e}")
+        self._save()
+
+    async def _load(self) -> None:
+        if self._entries is None:
+            self._entries = await asyncio.to_thread(self._read_index)
+
+    def _read_index(self) -> dict:
+        os.makedirs(self.path, exist_ok=True)
+        try:
+            with open(self._index_path, encoding="utf-8") as file:
+                entries = json.load(file)["entries"]
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Media cache index is unreadable, starting empty: {e}")
+            return {}
+
+        # Drop entries whose blobs were removed behind our back
+        return {
+            key: entry for key, entry in entries.items()
+            if all(os.path.exists(self._blob_path(digest)) for _, digest, _ in entry["files"])
+        }
+
+    def _save(self) -> None:
+        temp = f"{self._index_path}.tmp"
+        with open(temp, "w", encoding="utf-8") as file:
+            json.dump({"entries": self._entries}, file)
+        os.replace(temp, self._index_path)
+
+    def save(self) -> None:
+        """Writes the index, so the LRU order of cache hits survives a restart."""
+        if self._entries is not None:
+            self._save()
+
+    def stats(self) -> dict:
+        """
+        Returns cache statistics.
+
+        Returns:
+            dict: entries, size and max_bytes in bytes, hits and misses since start.
+        """
+        return {
+            "entries": len(self._entries or {}),
+            "size": self._size() if self._entries else 0,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# One cache per process: worker processes sharing MEDIA_CACHE_DIR would otherwise collect each other's blobs
+media_cache = MediaCache(path=os.path.join(MEDIA_CACHE_DIR, JOB_WORKER_NAME), max_bytes=MEDIA_CACHE_MAX_BYTES)
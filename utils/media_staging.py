@@ -0,0 +1,130 @@
+import logging
+import os
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Optional, Union
+
+import aiofiles
+import aiohttp
+import yarl
+from aiogram.types import BufferedInputFile, InputFile
+
+from config.settings import STAGING_MEMORY_CAP, STAGING_MEMORY_THRESHOLD, STREAM_CHUNK_SIZE
+from utils.local_file import upload_file
+from utils.metrics import current_platform, downloaded_bytes_total, observe_stage
+
+
+@dataclass
+class StagedMedia:
+    """
+    A downloaded media, ready to be sent.
+
+    Attributes:
+        file (InputFile | str): BufferedInputFile for media kept in memory, see `upload_file` otherwise.
+        path (Optional[str]): File on disk to delete after sending, None for media kept in memory.
+        size (int): Size in bytes.
+    """
+    file: Union[InputFile, str]
+    path: Optional[str]
+    size: int
+
+
+class MediaStaging:
+    """
+    Size-aware staging of downloaded media.
+
+    Media up to `threshold` bytes is kept in memory and sent as a
+    `BufferedInputFile`, so small photos and clips never touch the disk.
+    Larger media, and any media while the buffers of all jobs would exceed
+    `memory_cap`, is written to disk. A buffer's share of the cap is returned
+    when the buffer is garbage collected, i.e. once its job is done with it.
+
+    Attributes:
+        threshold (int): Largest media kept in memory, in bytes.
+        memory_cap (int): Memory all buffers may take together, in bytes.
+        in_memory (int): Bytes currently held in buffers.
+
+    Methods:
+        fetch(url, filename, directory, headers) -> StagedMedia
+            Downloads a media to memory or disk.
+    """
+
+    def __init__(self, threshold: int, memory_cap: int):
+        self.threshold = threshold
+        self.memory_cap = memory_cap
+        self.in_memory = 0
+
+    async def fetch(
+        self, url: Union[str, yarl.URL], filename: str, directory: str, headers: Optional[dict] = None
+    ) -> StagedMedia:
+        """
+        Downloads a media to a memory buffer if it is small enough, or to a file otherwise.
+
+        Args:
+            url (str | yarl.URL): Direct link to the media.
+            filename (str): Name of the media, used for the file on disk and in Telegram.
+            directory (str): Directory for media written to disk, usually the job's workspace.
+            headers (dict): Headers the media host requires.
+
+        Returns:
+            StagedMedia: The media and, if written to disk, its path.
+
+        Raises:
+            aiohttp.ClientResponseError: If the host does not serve the media.
+        """
+        started = time.perf_counter()
+        staged = await self._fetch(url, filename, directory, headers)
+        observe_stage("download", time.perf_counter() - started)
+        downloaded_bytes_total.inc(staged.size, platform=current_platform.get())
+        return staged
+
+    async def _fetch(
+        self, url: Union[str, yarl.URL], filename: str, directory: str, headers: Optional[dict]
+    ) -> StagedMedia:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, headers=headers or {}, raise_for_status=True) as response:
+                length = response.content_length
+                reserved = self._reserve(length if length is not None else self.threshold)
+                if not reserved:
+                    return await self._to_disk(response, b"", filename, directory)
+
+                chunks = []
+                size = 0
+                async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size > self.threshold:
+                        # No or wrong Content-Length: spill what was read so far
+                        self._release(reserved)
+                        return await self._to_disk(response, b"".join(chunks), filename, directory)
+
+        self.in_memory += size - reserved
+        file = BufferedInputFile(b"".join(chunks), filename=filename)
+        weakref.finalize(file, self._release, size)
+        return StagedMedia(file=file, path=None, size=size)
+
+    def _reserve(self, size: int) -> int:
+        if size > self.threshold or self.in_memory + size > self.memory_cap:
+            if size <= self.threshold:
+                logging.info(f"Staging memory is full ({self.in_memory} bytes), writing media to disk")
+            return 0
+        self.in_memory += size
+        return size
+
+    def _release(self, size: int) -> None:
+        self.in_memory -= size
+
+    @staticmethod
+    async def _to_disk(response: aiohttp.ClientResponse, head: bytes, filename: str, directory: str) -> StagedMedia:
+        path = os.path.join(directory, filename)
+        size = len(head)
+        async with aiofiles.open(path, "wb") as file:
+            await file.write(head)
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                await file.write(chunk)
+                size += len(chunk)
+        return StagedMedia(file=upload_file(path), path=path, size=size)
+
+
+media_staging = MediaStaging(threshold=STAGING_MEMORY_THRESHOLD, memory_cap=STAGING_MEMORY_CAP)
@@ -0,0 +1,116 @@
+import copy
+import time
+from collections import OrderedDict
+
+from config.settings import METADATA_CACHE_MAX_ENTRIES, METADATA_CACHE_TTL
+
+# Top-level info dict keys downloaders use; formats and thumbnails are trimmed separately
+_INFO_KEYS = (
+    "id", "title", "uploader", "artist", "duration", "ext", "webpage_url", "extractor_key", "format_id",
+    "_filename", "_filepath", "_thumbnail", "_files",
+)
+_FORMAT_KEYS = (
+    "format_id", "ext", "vcodec", "acodec", "width", "height", "filesize", "filesize_approx", "url", "http_headers",
+    "cookies",
+)
+_THUMBNAIL_KEYS = ("id", "url", "width", "height")
+
+
+def trim_info(info: dict) -> dict:
+    """
+    Keeps the parts of a yt-dlp info dict the downloaders use.
+
+    Args:
+        info (dict): Sanitized info dict, often hundreds of KB because of the format list.
+
+    Returns:
+        dict: Basic fields, the chosen formats in "requested_formats" and the thumbnails.
+    """
+    trimmed = {name: info[name] for name in _INFO_KEYS if name in info}
+
+    requested = info.get("requested_formats") or [info]
+    trimmed["requested_formats"] = [
+        {name: fmt[name] for name in _FORMAT_KEYS if fmt.get(name) is not None} for fmt in requested
+    ]
+    trimmed["thumbnails"] = [
+        {name: thumbnail[name] for name in _THUMBNAIL_KEYS if name in thumbnail}
+        for thumbnail in info.get("thumbnails") or []
+    ]
+    return trimmed
+
+
+class MetadataCache:
+    """
+    An in-process TTL and size bounded cache of yt-dlp metadata extraction results.
+
+    Keys are built by `utils.media_cache.cache_key`, so links to the same media
+    share an entry, and different option profiles (e.g. YouTube video and
+    audio) get their own entry with their own chosen formats and filename.
+    Only extractions without download go through it, which since the
+    downloaders download in one call is the TikTok streaming probe. Downloads
+    never read it: an entry keeps the chosen formats only, and yt-dlp needs the
+    full format list to download from an info dict, so a YouTube lookup
+    followed by a download, or a video/audio round trip, extracts again.
+
+    Attributes:
+        ttl (int): Seconds an entry stays valid.
+        max_entries (int): Maximum number of entries, least recently used are dropped first.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that needed an extraction.
+
+    Methods:
+        get(key: str) -> dict | None
+            Returns a deep copy of a fresh entry, callers may change it.
+        put(key: str, info: dict) -> dict
+            Stores and returns the trimmed info dict.
+        stats() -> dict
+            Returns entry count and hit/miss counters.
+    """
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(entry[1])
+
+    def put(self, key: str, info: dict) -> dict:
+        trimmed = trim_info(info)
+        self._entries[key] = (time.monotonic() + self.ttl, trimmed)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return copy.deepcopy(trimmed)
+
+    def stats(self) -> dict:
+        """
+        Returns cache statistics.
+
+        Returns:
+            dict: entries, hits, misses and hit_rate (0..1) since start.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+metadata_cache = MetadataCache(ttl=METADATA_CACHE_TTL, max_entries=METADATA_CACHE_MAX_ENTRIES)
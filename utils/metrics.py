@@ -0,0 +1,283 @@
+import asyncio
+import bisect
+import functools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from aiohttp import web
+
+from config.settings import LOOP_LAG_INTERVAL, METRICS_HOST, METRICS_PORT
+from utils.download_scheduler import download_scheduler
+from utils.tracing import add_span
+
+# Platform of the download the current task works on, used as label by the stages measured deep in the pipeline
+current_platform: ContextVar[str] = ContextVar("current_platform", default="unknown")
+
+# Stage durations range from milliseconds (tagging) to many minutes (long videos)
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Metric:
+    """
+    A named metric with label values, rendered in the Prometheus text format.
+
+    Attributes:
+        name (str): Metric name.
+        help (str): One line description.
+        labels (tuple[str]): Label names, given as keyword arguments when updating.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: dict[tuple, float] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def samples(self) -> Iterable[tuple[str, tuple, tuple, float]]:
+        for key, value in self._values.items():
+            yield self.name, self.labels, key, value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{name}{_format_labels(names, values)} {value}" for name, names, values, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A value that only goes up, such as a number of requests or bytes."""
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down. With `function`, it is read when rendered instead of being set.
+    """
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), function: Optional[Callable] = None):
+        super().__init__(name, help, labels)
+        self.function = function
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.function is not None:
+            yield self.name, (), (), self.function()
+            return
+        yield from super().samples()
+
+
+class Histogram(Metric):
+    """Observations counted in cumulative buckets, with their sum and count."""
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = STAGE_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket..., +Inf count, sum]
+        self._observations: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        observations = self._observations.get(key)
+        if observations is None:
+            observations = self._observations[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        observations[bisect.bisect_left(self.buckets, value)] += 1
+        observations[-1] += value
+
+    def samples(self):
+        for key, observations in self._observations.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), observations):
+                cumulative += count
+                yield f"{self.name}_bucket", self.labels + ("le",), key + (bound,), cumulative
+            yield f"{self.name}_sum", self.labels, key, observations[-1]
+            yield f"{self.name}_count", self.labels, key, cumulative
+
+
+class Registry:
+    """
+    The metrics of the process, rendered together for a scrape.
+
+    Methods:
+        register(metric) -> Metric
+            Adds a metric and returns it.
+        render() -> str
+            Returns all metrics in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.register(Histogram(
+    "charlotte_stage_duration_seconds",
+    "Time spent in a stage of the download pipeline (extract, download, transcode, tag, upload).",
+    labels=("platform", "stage"),
+))
+downloads_total = registry.register(Counter(
+    "charlotte_downloads_total", "Finished downloads by outcome.", labels=("platform", "format", "outcome"),
+))
+downloader_results_total = registry.register(Counter(
+    "charlotte_downloader_results_total",
+    "Items yielded by the downloaders; failed ones are the None results.",
+    labels=("downloader", "result"),
+))
+downloaded_bytes_total = registry.register(Counter(
+    "charlotte_downloaded_bytes_total", "Bytes fetched from the media platforms.", labels=("platform",),
+))
+uploaded_bytes_total = registry.register(Counter(
+    "charlotte_uploaded_bytes_total", "Bytes of media delivered to Telegram.", labels=("platform",),
+))
+entity_too_large_total = registry.register(Counter(
+    "charlotte_entity_too_large_total", "Uploads Telegram rejected with TelegramEntityTooLarge.", labels=("platform",),
+))
+errors_total = registry.register(Counter(
+    "charlotte_download_errors_total", "Failed downloads by exception type.", labels=("platform", "error"),
+))
+jobs_running = registry.register(Gauge(
+    "charlotte_jobs_in_flight", "Download jobs running in this process.",
+    function=lambda: download_scheduler.stats()["running"],
+))
+jobs_queued = registry.register(Gauge(
+    "charlotte_jobs_queued", "Download jobs waiting for a worker slot in this process.",
+    function=lambda: download_scheduler.stats()["queued"],
+))
+loop_lag_seconds = registry.register(Histogram(
+    "charlotte_event_loop_lag_seconds", "Delay of a timer on the event loop beyond its deadline.", buckets=LAG_BUCKETS,
+))
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """
+    Records the duration of a stage of the current task's download, in the histogram and in the job's trace.
+
+    Args:
+        stage (str): extract, download, transcode, tag or upload.
+        seconds (float): Duration.
+    """
+    stage_seconds.observe(seconds, platform=current_platform.get(), stage=stage)
+    add_span(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Measures the block as a stage of the current task's download."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def instrument_download(download):
+    """
+    Decorates a downloader's `download(url, format)` generator to count the items it yields.
+
+    Args:
+        download: The async generator method.
+
+    Returns:
+        The wrapped method.
+    """
+    @functools.wraps(download)
+    async def wrapper(self, *args, **kwargs):
+        downloader = type(self).__name__
+        async for result in download(self, *args, **kwargs):
+            failed = result is None or (isinstance(result, tuple) and result[0] is None)
+            downloader_results_total.inc(downloader=downloader, result="failed" if failed else "ok")
+            yield result
+
+    return wrapper
+
+
+class MetricsServer:
+    """
+    Serves the registry on http://host:port/metrics and measures the event loop lag meanwhile.
+
+    Attributes:
+        host (str): Interface to listen on; keep it local, the metrics are not authenticated.
+        port (int): Port, 0 disables the server.
+        lag_interval (float): Seconds between event loop lag measurements.
+
+    Methods:
+        start()
+            Starts the server and the lag monitor, if a port is set.
+        close()
+            Stops both.
+    """
+
+    def __init__(self, host: str, port: int, lag_interval: float):
+        self.host = host
+        self.port = port
+        self.lag_interval = lag_interval
+        self._runner: Optional[web.AppRunner] = None
+        self._lag_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if not self.port:
+            return
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._lag_task = asyncio.create_task(self._monitor_loop_lag())
+        logging.info(f"Serving metrics on {self.host}:{self.port}/metrics")
+
+    async def close(self) -> None:
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    @staticmethod
+    async def _handle(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    async def _monitor_loop_lag(self) -> None:
+        # A timer that fires late means callbacks are blocking the loop
+        while True:
+            deadline = time.perf_counter() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            loop_lag_seconds.observe(max(0.0, time.perf_counter() - deadline))
+
+
+metrics_server = MetricsServer(host=METRICS_HOST, port=METRICS_PORT, lag_interval=LOOP_LAG_INTERVAL)
@@ -2,6 +2,9 @@ import asyncio
 
 from youtubesearchpython import VideosSearch
 
+from utils.tracing import span
+
+@span("search")
 async def search_music(artist: str, title: str):
     videos_search = VideosSearch(f"{artist} - {title}", limit=10)
     video_results = await asyncio.to_thread(videos_search.result)
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, SendChatAction, SendMediaGroup, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from config.secrets import ADMIN_ID
+from config.settings import (
+    ADMIN_DIGEST_INTERVAL, CHAT_ACTION_INTERVAL, OUTBOUND_CHAT_BURST, OUTBOUND_CHAT_RATE, OUTBOUND_GLOBAL_RATE,
+    OUTBOUND_GROUP_RATE, OUTBOUND_MAX_RETRIES, OUTBOUND_MAX_RETRY_AFTER
+)
+from utils.rate_limiter import TokenBucket
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+
+# Methods that post or change a message in a chat, and count against Telegram's flood limits
+THROTTLED_PREFIXES = ("Send", "Copy", "Forward", "Edit")
+
+
+class OutboundThrottle(BaseRequestMiddleware):
+    """
+    Flood control for every request the bot makes, as a middleware of the bot session.
+
+    A message to a chat first takes a token from that chat's bucket (`chat_rate`
+    per second for private chats, `group_rate` for groups, bursts of
+    `chat_burst`), then from the global bucket of `global_rate` per second, so a
+    playlist delivered to one chat waits on its own and does not hold back the
+    other chats. A media group takes one token per item. After a RetryAfter the
+    chat's bucket (the global one for requests without a chat) is paused for
+    the requested time and the request is sent again, up to `max_retries` times;
+    waits longer than `max_retry_after` are raised to the caller at once.
+    send_chat_action is sent at most once per chat and action every
+    `chat_action_interval` seconds, the others are answered locally.
+
+    Attributes:
+        global_rate (float): Messages per second to all chats.
+        chat_rate (float): Messages per second to one private chat.
+        group_rate (float): Messages per second to one group.
+        chat_burst (int): Messages a chat may get at once.
+        max_retries (int): Retries of a request after RetryAfter.
+        max_retry_after (int): Longest RetryAfter waited for, in seconds.
+        chat_action_interval (float): Seconds a chat action is not repeated for.
+        max_chats (int): Chats whose buckets are remembered.
+    """
+
+    def __init__(
+        self,
+        global_rate: float,
+        chat_rate: float,
+        group_rate: float,
+        chat_burst: int,
+        max_retries: int,
+        max_retry_after: int,
+        chat_action_interval: float,
+        max_chats: int = 10000,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.chat_action_interval = chat_action_interval
+        self.max_chats = max_chats
+
+        self.bucket = TokenBucket(global_rate, capacity=max(1, int(global_rate)))
+        self._chat_buckets: OrderedDict[int, TokenBucket] = OrderedDict()
+        # (chat_id, message_thread_id, action) -> monotonic time it was sent
+        self._chat_actions: OrderedDict[tuple, float] = OrderedDict()
+        self._coalesced = 0
+        self._retried = 0
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if isinstance(method, SendChatAction):
+            if not self._chat_action_due(method):
+                self._coalesced += 1
+                return Response[bool](ok=True, result=True)
+            return await make_request(bot, method)
+
+        if not type(method).__name__.startswith(THROTTLED_PREFIXES):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        chat_bucket = self._chat_bucket(chat_id) if isinstance(chat_id, int) else None
+        tokens = len(method.media) if isinstance(method, SendMediaGroup) else 1
+
+        attempt = 0
+        while True:
+            if chat_bucket is not None:
+                await chat_bucket.acquire(tokens)
+            await self.bucket.acquire(tokens)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries or e.retry_after > self.max_retry_after:
+                    raise
+                attempt += 1
+                self._retried += 1
+                logging.warning(
+                    f"Flood control on {type(method).__name__} to {chat_id}, retrying in {e.retry_after}s"
+                )
+                (chat_bucket or self.bucket).pause(e.retry_after)
+
+    def stats(self) -> dict:
+        """
+        Returns counters for /queue.
+
+        Returns:
+            dict: Chats with a bucket, coalesced chat actions and requests retried after RetryAfter.
+        """
+        return {"chats": len(self._chat_buckets), "coalesced": self._coalesced, "retried": self._retried}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Group and channel ids are negative
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, capacity=self.chat_burst)
+            while len(self._chat_buckets) > self.max_chats:
+                self._chat_buckets.popitem(last=False)
+        self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    def _chat_action_due(self, method: SendChatAction) -> bool:
+        now = time.monotonic()
+        while self._chat_actions and now - next(iter(self._chat_actions.values())) >= self.chat_action_interval:
+            self._chat_actions.popitem(last=False)
+
+        key = (method.chat_id, method.message_thread_id, method.action)
+        if key in self._chat_actions:
+            return False
+        self._chat_actions[key] = now
+        return True
+
+
+class AdminDigest:
+    """
+    Collects error notifications for the admin and sends them as one message every `interval` seconds.
+
+    Identical notifications are collapsed into one line with a count, so an
+    error storm costs one message per interval instead of one per error.
+
+    Attributes:
+        chat_id (int): Chat the digests are sent to.
+        interval (float): Seconds notifications are collected for.
+
+    Methods:
+        report(bot, text)
+            Adds a notification to the next digest.
+        flush()
+            Sends the collected notifications now.
+        close()
+            Sends what is left, on shutdown.
+    """
+
+    # Telegram's message length limit
+    MAX_LENGTH = 4096
+
+    def __init__(self, chat_id: int, interval: float):
+        self.chat_id = chat_id
+        self.interval = interval
+        self._bot: Optional["Bot"] = None
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._collecting_since = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def report(self, bot: "Bot", text: str) -> None:
+        self._bot = bot
+        if not self._entries:
+            self._collecting_since = time.monotonic()
+        self._entries[text] = self._entries.get(text, 0) + 1
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def flush(self) -> None:
+        if not self._entries or self._bot is None:
+            return
+
+        entries, self._entries = self._entries, OrderedDict()
+        seconds = int(time.monotonic() - self._collecting_since)
+        lines = [f"{sum(entries.values())} error(s) in the last {seconds}s:"]
+        lines += [f"×{count} {text}" if count > 1 else text for text, count in entries.items()]
+        digest = "\n\n".join(lines)
+        if len(digest) > self.MAX_LENGTH:
+            digest = digest[:self.MAX_LENGTH - 1] + "…"
+
+        try:
+            # Plain text: notifications carry user links and exception messages
+            await self._bot.send_message(self.chat_id, digest, parse_mode=None)
+        except Exception as e:
+            logging.error(f"Could not send the admin digest: {e}")
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.interval)
+        await self.flush()
+
+
+outbound_throttle = OutboundThrottle(
+    global_rate=OUTBOUND_GLOBAL_RATE,
+    chat_rate=OUTBOUND_CHAT_RATE,
+    group_rate=OUTBOUND_GROUP_RATE,
+    chat_burst=OUTBOUND_CHAT_BURST,
+    max_retries=OUTBOUND_MAX_RETRIES,
+    max_retry_after=OUTBOUND_MAX_RETRY_AFTER,
+    chat_action_interval=CHAT_ACTION_INTERVAL,
+)
+admin_digest = AdminDigest(chat_id=ADMIN_ID, interval=ADMIN_DIGEST_INTERVAL)
@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    An asyncio token bucket limiting how often an action may run.
+
+    Tokens refill continuously at `rate` per second up to `capacity`; every
+    `acquire` takes its tokens, waiting for them if the bucket is short. `pause`
+    stops handing out tokens for a while, for when Telegram answers with
+    RetryAfter for the whole bot.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        capacity (int): Largest burst.
+
+    Methods:
+        acquire(tokens)
+            Waits for tokens and takes them.
+        pause(seconds)
+            Hands out no tokens for `seconds`.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int = 1) -> None:
+        # More than a full bucket would never be available
+        tokens = min(tokens, self.capacity)
+        # Waiters are served one at a time, in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
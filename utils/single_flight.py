@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+
+class _Flight:
+    __slots__ = ("items", "error", "done", "consumers", "updated", "producer", "on_release")
+
+    def __init__(self, on_release):
+        self.items = []
+        self.error = None
+        self.done = False
+        self.consumers = 0
+        self.updated = asyncio.Event()
+        self.producer = None
+        self.on_release = on_release
+
+    def notify(self) -> None:
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent async generator calls.
+
+    The first caller for a key starts the generator in a background task; every
+    caller that joins while the flight is alive gets all items produced so far
+    and then the new ones as they arrive. When the last caller leaves, the
+    producer is cancelled if it is still running and, once it has stopped,
+    `on_release` is awaited with all produced items, so shared files are
+    cleaned up exactly once.
+
+    Methods:
+        join(key, factory, on_release):
+            Async context manager yielding an async iterator over the flight's items.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, _Flight] = {}
+
+    @asynccontextmanager
+    async def join(self, key: str, factory, on_release):
+        """
+        Joins the flight for `key`, starting it if there is none.
+
+        Args:
+            key (str): Identifies identical requests, such as: "youtube:dQw4w9WgXcQ:media".
+            factory (Callable[[], AsyncIterator]): Creates the generator. Only called by the first caller.
+            on_release (Callable[[list], Awaitable]): Called with all items after the last caller left.
+
+        Yields:
+            AsyncIterator: Items produced by the flight. Errors of the producer are re-raised.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(on_release)
+            flight.producer = asyncio.create_task(self._produce(flight, factory))
+        else:
+            logging.info(f"Joining in-flight download: {key}")
+
+        flight.consumers += 1
+        try:
+            yield self._iterate(flight)
+        finally:
+            flight.consumers -= 1
+            if flight.consumers == 0:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                try:
+                    if not flight.producer.done():
+                        flight.producer.cancel()
+                        # The producer stops its yt-dlp worker while handling the cancellation;
+                        # the files are only released once nothing writes them anymore
+                        await asyncio.wait([flight.producer])
+                finally:
+                    await flight.on_release(flight.items)
+
+    @staticmethod
+    async def _produce(flight: _Flight, factory) -> None:
+        try:
+            async for item in factory():
+                flight.items.append(item)
+                flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            flight.notify()
+
+    @staticmethod
+    async def _iterate(flight: _Flight):
+        index = 0
+        while True:
+            if index < len(flight.items):
+                yield flight.items[index]
+                index += 1
+            elif flight.done:
+                if flight.error is not None:
+                    raise flight.error
+                return
+            else:
+                await flight.updated.wait()
+
+
+download_flights = SingleFlight()
@@ -0,0 +1,23 @@
+from functools import lru_cache
+
+from config.secrets import SPOTIFY_CLIENT_ID, SPOTIFY_SECRET
+
+
+@lru_cache(maxsize=1)
+def get_spotify_client():
+    """
+    Returns the shared Spotify client, creating it on first use.
+
+    spotipy is imported here rather than at module level, so bots that never
+    receive a Spotify link never load it or build its credentials manager.
+
+    Returns:
+        spotipy.Spotify: Spotify API client.
+    """
+    import spotipy
+    from spotipy.oauth2 import SpotifyClientCredentials
+
+    auth_manager = SpotifyClientCredentials(
+        client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_SECRET
+    )
+    return spotipy.Spotify(auth_manager=auth_manager)
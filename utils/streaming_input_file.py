@@ -0,0 +1,101 @@
+import logging
+from http.cookies import CookieError, SimpleCookie
+from typing import AsyncGenerator, Optional, Union
+
+import aiohttp
+import yarl
+from aiogram import Bot
+from aiogram.types import URLInputFile
+
+from config.settings import STREAM_CHUNK_SIZE, STREAM_READ_TIMEOUT
+from utils.metrics import current_platform, downloaded_bytes_total
+
+
+class StreamingInputFile(URLInputFile):
+    """
+    A remote file piped straight into the Telegram upload.
+
+    The HTTP response body is read chunk by chunk while the multipart request
+    to Telegram is being sent, so the file never touches the disk and memory
+    stays at a few chunks. Unlike `URLInputFile`, the timeout applies to each
+    read instead of the whole transfer, so long videos are not cut off.
+
+    Attributes:
+        url (str | yarl.URL): Direct link to the media. Pass an encoded `yarl.URL` for signed CDN links.
+        headers (dict): Headers the media host requires, such as: Referer, User-Agent, Cookie.
+
+    Methods:
+        probe(url, headers) -> bool
+            Checks that the media host answers before the upload is started.
+    """
+
+    def __init__(
+        self,
+        url: Union[str, yarl.URL],
+        headers: Optional[dict] = None,
+        filename: Optional[str] = None,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        timeout: int = STREAM_READ_TIMEOUT,
+        bot: Optional[Bot] = None,
+    ):
+        super().__init__(url=url, headers=headers, filename=filename, chunk_size=chunk_size, timeout=timeout, bot=bot)
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        bot = self.bot or bot
+        stream = bot.session.stream_content(
+            url=self.url,
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout),
+            chunk_size=self.chunk_size,
+            raise_for_status=True,
+        )
+
+        # Read while the upload is sent, so the download time is part of the upload stage
+        platform = current_platform.get()
+        async for chunk in stream:
+            downloaded_bytes_total.inc(len(chunk), platform=platform)
+            yield chunk
+
+    @staticmethod
+    async def probe(url: Union[str, yarl.URL], headers: Optional[dict] = None) -> bool:
+        """
+        Requests the first byte of a media, so a dead link falls back to a download before anything is sent.
+
+        Args:
+            url (str | yarl.URL): Direct link to the media.
+            headers (dict): Headers the media host requires.
+
+        Returns:
+            bool: True if the host serves the media.
+        """
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(
+                    url,
+                    headers={**(headers or {}), "Range": "bytes=0-0"},
+                    timeout=aiohttp.ClientTimeout(total=STREAM_READ_TIMEOUT),
+                ) as response:
+                    return response.status in (200, 206)
+        except (aiohttp.ClientError, TimeoutError) as e:
+            logging.info(f"Streaming probe failed for {url}: {e}")
+            return False
+
+
+def stream_headers(format: dict) -> dict:
+    """
+    Builds the request headers of a yt-dlp format, including the cookies of the extraction.
+
+    Args:
+        format (dict): Format of a yt-dlp info dict, with "http_headers" and "cookies".
+
+    Returns:
+        dict: Headers to request the format's URL with.
+    """
+    headers = dict(format.get("http_headers") or {})
+    if format.get("cookies"):
+        try:
+            cookies = SimpleCookie(format["cookies"])
+            headers["Cookie"] = "; ".join(f"{name}={morsel.value}" for name, morsel in cookies.items())
+        except CookieError as e:
+            logging.warning(f"Could not parse format cookies: {e}")
+    return headers
@@ -0,0 +1,161 @@
+import asyncio
+import functools
+import json
+import logging
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional, Union
+
+from config.settings import TRACE_JOBS
+
+# One JSON line per job; main.py and worker.py give it its own file, apart from the error log
+trace_logger = logging.getLogger("trace")
+trace_logger.setLevel(logging.INFO)
+trace_logger.propagate = False
+
+
+class Trace:
+    """
+    The spans of one download job.
+
+    Attributes:
+        job_id (str): Job id in the journal, a random id for jobs that are not journaled.
+        platform (str): Such as: spotify, youtube.
+        format (str): "media" or "audio".
+        started (float): time.perf_counter() when the job started.
+        spans (list[tuple[str, float, float]]): (name, time.perf_counter() at the start, seconds) in order of ending.
+    """
+    __slots__ = ("job_id", "platform", "format", "started", "spans")
+
+    def __init__(self, job_id: str, platform: str, format: str):
+        self.job_id = job_id
+        self.platform = platform
+        self.format = format
+        self.started = time.perf_counter()
+        self.spans: list[tuple[str, float, float]] = []
+
+    def add(self, name: str, started: float, seconds: float) -> None:
+        self.spans.append((name, started, seconds))
+
+    def record(self, outcome: str, **fields) -> dict:
+        """
+        Returns the trace as logged.
+
+        Args:
+            outcome (str): Outcome of the job, as in the download events.
+            **fields: Added to the record, such as the error.
+
+        Returns:
+            dict: Job, totals and the spans with their start offset and duration in milliseconds.
+        """
+        return {
+            "job": self.job_id,
+            "platform": self.platform,
+            "format": self.format,
+            "outcome": outcome,
+            "total_ms": round((time.perf_counter() - self.started) * 1000),
+            **fields,
+            "spans": [
+                {"name": name, "start_ms": round((started - self.started) * 1000), "ms": round(seconds * 1000)}
+                for name, started, seconds in self.spans
+            ],
+        }
+
+
+# Trace of the job the current task works on. Tasks started by it (the single-flight producer,
+# asyncio.to_thread) copy the context, so their spans land in the same trace
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def start_trace(job_id: Optional[Union[int, str]], platform: str, format: str) -> Optional[Trace]:
+    """
+    Starts the trace of the download job the current task runs.
+
+    Args:
+        job_id (Optional[Union[int, str]]): Job id in the journal.
+        platform (str): Platform of the download.
+        format (str): "media" or "audio".
+
+    Returns:
+        Optional[Trace]: The trace, None if TRACE_JOBS is off.
+    """
+    if not TRACE_JOBS:
+        return None
+    trace = Trace(str(job_id) if job_id is not None else uuid.uuid4().hex[:12], platform, format)
+    current_trace.set(trace)
+    return trace
+
+
+def finish_trace(outcome: str, **fields) -> None:
+    """
+    Logs the trace of the current task's job as one JSON line and ends it.
+
+    Args:
+        outcome (str): Outcome of the job.
+        **fields: Added to the record, such as the error.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        return
+    current_trace.set(None)
+    trace_logger.info(json.dumps(trace.record(outcome, **fields), ensure_ascii=False))
+
+
+def add_span(name: str, seconds: float) -> None:
+    """
+    Adds a span that ends now, for durations measured elsewhere (such as in a yt-dlp worker process).
+
+    Args:
+        name (str): Span name.
+        seconds (float): Duration.
+    """
+    trace = current_trace.get()
+    if trace is not None:
+        now = time.perf_counter()
+        trace.add(name, now - seconds, seconds)
+
+
+class _Span:
+    __slots__ = ("name", "_trace", "_started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._trace = current_trace.get()
+        if self._trace is not None:
+            self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._trace is not None:
+            self._trace.add(self.name, self._started, time.perf_counter() - self._started)
+
+    def __call__(self, function):
+        name = self.name
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with _Span(name):
+                    return await function(*args, **kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with _Span(name):
+                    return function(*args, **kwargs)
+        return wrapper
+
+
+def span(name: str) -> _Span:
+    """
+    Times a block (`with span("cover"):`) or a sync or async function (`@span("search")`)
+    as a span of the current task's job. Outside of a traced job it only reads a context variable.
+
+    Args:
+        name (str): Span name.
+
+    Returns:
+        _Span: Context manager and decorator.
+    """
+    return _Span(name)
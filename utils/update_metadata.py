@@ -2,6 +2,9 @@ import logging
 from mutagen.mp3 import MP3
 from mutagen.id3 import ID3, APIC, TIT2, TPE1
 
+from utils.metrics import stage_timer
+
+@stage_timer("tag")
 def update_metadata(audio_file: str, title: str, artist: str, cover_file: str = None) -> None:
     """
     Updates the MP3 file metadata and adds a cover art.
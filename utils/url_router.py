@@ -0,0 +1,153 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class UrlMatch:
+    """
+    Result of classifying a message URL.
+
+    Attributes:
+        platform (str): Platform name, such as: youtube, tiktok, spotify, etc.
+        url (str): The URL as it was sent in the message.
+        media_id (str): Canonical media identifier on the platform (video id, track path, etc.).
+        default_format (Optional[str]): Format forced by the platform ("media" or "audio"),
+            None if the user has to choose.
+        ie_keys (tuple[str, ...]): yt-dlp extractors that handle the URL, tried in order.
+            Empty if the platform is not downloaded with yt-dlp.
+    """
+    platform: str
+    url: str
+    media_id: str
+    default_format: Optional[str]
+    ie_keys: tuple[str, ...] = ()
+
+    @property
+    def key(self) -> str:
+        """Platform-qualified media identifier, suitable as a cache key."""
+        return f"{self.platform}:{self.media_id}"
+
+    @property
+    def is_playlist(self) -> bool:
+        """True if the URL points to a playlist or a SoundCloud set."""
+        return _PLAYLIST_RE.search(self.url) is not None
+
+
+class _Rule:
+    __slots__ = ("platform", "pattern", "default_format", "ie_keys")
+
+    def __init__(self, platform: str, pattern: str, default_format: Optional[str], ie_keys: tuple[str, ...] = ()):
+        self.platform = platform
+        self.pattern = re.compile(pattern)
+        self.default_format = default_format
+        self.ie_keys = ie_keys
+
+
+_YOUTUBE = _Rule(
+    "youtube", r"https?://(?:www\.)?(?:m\.)?(?:youtu\.be/|youtube\.com/(?:shorts/|watch\?v=))([\w-]+)", None,
+    ("Youtube",),
+)
+_YOUTUBE_MUSIC = _Rule(
+    "youtube_music", r"https://music\.youtube\.com/(?:watch\?v=|playlist\?list=)([a-zA-Z0-9\-_]+)", "audio",
+    ("Youtube", "YoutubeTab"),
+)
+_TIKTOK_SHORT = _Rule("tiktok", r"https?://v[mt]\.tiktok\.com/([\w-]*)", "media", ("TikTokVM",))
+_TIKTOK = _Rule("tiktok", r"https?://(?:www\.)?tiktok\.com/(?:@[\w.-]+/video/(\d+))?", "media", ("TikTok", "TikTokVM"))
+_SOUNDCLOUD = _Rule(
+    "soundcloud", r"https?://soundcloud\.com/([\w-]+/(?:sets/)?[\w-]+)", "audio", ("Soundcloud", "SoundcloudSet")
+)
+_SPOTIFY = _Rule("spotify", r"https?://open\.spotify\.com/((?:track|playlist)/[\w-]+)", "audio")
+_APPLE_MUSIC = _Rule("apple_music", r"https?://music\.apple\.com/.*/album/.+/(\d+)(?:\?(?:[^#]*&)?i=(\d+)[^#]*|\?.*)?$", "audio")
+_PINTEREST = _Rule("pinterest", r"https?://(?:\w{2,3}\.)?pinterest\.com/([\w/\-]+)", "media", ("Pinterest",))
+_PINTEREST_SHORT = _Rule("pinterest", r"https://pin\.it/([A-Za-z0-9]+)", "media", ("Pinterest",))
+_BILIBILI = _Rule("bilibili", r"https?://(?:www\.)?bilibili\.(?:com|tv)/([\w/?=&]+)", "media", ("BiliBili", "BiliIntl"))
+_TWITTER = _Rule("twitter", r"https://(?:twitter|x)\.com/\w+/status/(\d+)", "media", ("Twitter",))
+# A story is only identified by its account and its id together
+_INSTAGRAM = _Rule(
+    "instagram", r"https://www\.instagram\.com/(?:(?:p|reel|tv)/([A-Za-z0-9_-]+)/|stories/([\w.-]+)/(\d+))", "media"
+)
+
+# Host -> rules to try. Hosts prefixed with "*." match any single-label subdomain.
+_HOST_RULES = {
+    "youtu.be": (_YOUTUBE,),
+    "www.youtu.be": (_YOUTUBE,),
+    "m.youtu.be": (_YOUTUBE,),
+    "youtube.com": (_YOUTUBE,),
+    "www.youtube.com": (_YOUTUBE,),
+    "m.youtube.com": (_YOUTUBE,),
+    "music.youtube.com": (_YOUTUBE_MUSIC,),
+    "vm.tiktok.com": (_TIKTOK_SHORT,),
+    "vt.tiktok.com": (_TIKTOK_SHORT,),
+    "tiktok.com": (_TIKTOK,),
+    "www.tiktok.com": (_TIKTOK,),
+    "soundcloud.com": (_SOUNDCLOUD,),
+    "open.spotify.com": (_SPOTIFY,),
+    "music.apple.com": (_APPLE_MUSIC,),
+    "pinterest.com": (_PINTEREST,),
+    "*.pinterest.com": (_PINTEREST,),
+    "pin.it": (_PINTEREST_SHORT,),
+    "bilibili.com": (_BILIBILI,),
+    "www.bilibili.com": (_BILIBILI,),
+    "bilibili.tv": (_BILIBILI,),
+    "www.bilibili.tv": (_BILIBILI,),
+    "twitter.com": (_TWITTER,),
+    "x.com": (_TWITTER,),
+    "www.instagram.com": (_INSTAGRAM,),
+}
+
+# Every extractor the router can pin, loaded by the yt-dlp workers at startup
+ROUTER_IE_KEYS = tuple(dict.fromkeys(
+    ie_key for rules in _HOST_RULES.values() for rule in rules for ie_key in rule.ie_keys
+))
+
+_HOST_RE = re.compile(r"https?://([^/?#\s]+)")
+_PLAYLIST_RE = re.compile(r"/(?:playlist|sets)\b")
+
+
+def classify_url(text: str) -> Optional[UrlMatch]:
+    """
+    Classifies the URL at the beginning of a message.
+
+    The host is looked up in a dict first, so only the patterns of a single
+    platform are ever run against the text.
+
+    Args:
+        text (str): Message text.
+
+    Returns:
+        Optional[UrlMatch]: The match, or None if the text does not start with a supported URL.
+    """
+    if not text:
+        return None
+
+    host_match = _HOST_RE.match(text)
+    if host_match is None:
+        return None
+
+    host = host_match.group(1).lower()
+    rules = _HOST_RULES.get(host)
+    if rules is None:
+        _, _, parent = host.partition(".")
+        rules = _HOST_RULES.get(f"*.{parent}")
+        if rules is None:
+            return None
+
+    for rule in rules:
+        match = rule.pattern.match(text)
+        if match:
+            media_id = "/".join(group.strip("/") for group in match.groups() if group)
+            return UrlMatch(
+                platform=rule.platform,
+                url=text,
+                media_id=media_id or _canonical_path(text),
+                default_format=rule.default_format,
+                ie_keys=rule.ie_keys,
+            )
+    return None
+
+
+def _canonical_path(url: str) -> str:
+    """Returns the URL without scheme, query and fragment."""
+    url = url.split("://", 1)[-1]
+    return re.split(r"[?#\s]", url, maxsplit=1)[0].rstrip("/")
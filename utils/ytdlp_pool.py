@@ -0,0 +1,260 @@
+import asyncio
+import glob
+import logging
+import multiprocessing
+import multiprocessing.spawn
+import os
+import re
+import signal
+import time
+
+from config.settings import YTDLP_PROCESSES
+from utils.job_workspace import current_workspace
+from utils.media_cache import cache_key, media_cache
+from utils.metadata_cache import metadata_cache
+from utils.metrics import current_platform, downloaded_bytes_total, observe_stage
+from utils.tracing import span
+from utils.url_router import ROUTER_IE_KEYS, classify_url
+from utils.ytdlp_worker import MAIN_PATH_ENV, _worker_main
+
+
+async def _recv(conn):
+    """
+    Receives the next message of a worker, waiting for it on the event loop.
+
+    No thread is left blocked in `recv`, so a worker can be killed and its pipe
+    closed as soon as the waiting job is cancelled. A message is sent in one
+    piece by the worker, so reading it once the pipe is readable is quick.
+    """
+    loop = asyncio.get_running_loop()
+    while not conn.poll():
+        readable = loop.create_future()
+        loop.add_reader(conn.fileno(), lambda: readable.done() or readable.set_result(None))
+        try:
+            await readable
+        finally:
+            loop.remove_reader(conn.fileno())
+    return conn.recv()
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def _signal_kill(self) -> None:
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+                return
+            except (ProcessLookupError, PermissionError):
+                # A worker that has not called setpgrp yet has no group of its own
+                pass
+        self.process.kill()
+
+    async def kill(self) -> None:
+        """Kills the worker and reaps it in a thread, so the event loop is not held while it exits."""
+        self._signal_kill()
+        try:
+            await asyncio.to_thread(self.process.join, 1)
+        finally:
+            self.conn.close()
+
+    def close(self) -> None:
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self._signal_kill()
+            self.process.join(1)
+        self.conn.close()
+
+
+class YtDlpPool:
+    """
+    A pool of worker processes running yt-dlp.
+
+    Extraction and download run outside the bot process, so they do not hold
+    the GIL of the event loop, and a cancelled job is stopped for real: its
+    worker process group (including ffmpeg) is killed and its partial files
+    are removed. A replacement worker is started on demand.
+
+    Each worker keeps one YoutubeDL instance per options profile and reuses it
+    across jobs, and extraction is pinned to the extractors the URL router
+    names for the link, so yt-dlp does not test it against every extractor.
+
+    Attributes:
+        processes (int): Maximum number of worker processes.
+
+    Methods:
+        extract_info(url: str, options: dict, download: bool = True) -> dict
+            Runs `YoutubeDL(options).extract_info(url, download)` in a worker.
+        warm()
+            Starts all workers and loads the router's extractors in them.
+        close()
+            Stops all idle workers.
+    """
+
+    def __init__(self, processes: int):
+        self.processes = processes
+        methods = multiprocessing.get_all_start_methods()
+        self._context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        if "forkserver" in methods:
+            # Workers fork from a server that has already imported yt-dlp and the worker code, so starting
+            # a worker does not re-import them. Not the bot's main module: it would build a second bot in the server
+            self._context.set_forkserver_preload(["utils.ytdlp_worker", "yt_dlp"])
+            # Keeps the workers from running the bot's script either (see utils.ytdlp_worker)
+            main_path = multiprocessing.spawn.get_preparation_data("ytdlp").get("init_main_from_path")
+            if main_path:
+                os.environ[MAIN_PATH_ENV] = main_path
+        self._semaphore = asyncio.Semaphore(processes)
+        self._idle: list[_Worker] = []
+
+    @span("ytdlp")
+    async def extract_info(self, url: str, options: dict, download: bool = True) -> dict:
+        """
+        Runs yt-dlp in a worker process.
+
+        Parameters:
+        ----------
+        url : str
+            The URL to extract.
+        options : dict
+            YoutubeDL options. Must be picklable (no hooks or callables).
+        download : bool, optional
+            Whether to download the media (default is True). Files are written
+            to the workspace of the current job, if there is one.
+
+        Returns:
+        -------
+        dict
+            The sanitized info dict, with the output filename in "_filename" and,
+            after a download, the final media file in "_filepath", the written
+            thumbnail in "_thumbnail" and all produced files in "_files". Extractions
+            without download are served from the metadata cache and return a
+            trimmed info dict, as do downloads served from the media cache.
+
+        Raises:
+        ------
+        yt_dlp.utils.DownloadError
+            If yt-dlp failed to extract or download.
+        """
+        if not download and metadata_cache.enabled:
+            key = cache_key(url, options)
+            info = metadata_cache.get(key)
+            if info is None:
+                info = metadata_cache.put(key, await self._run(url, options, download))
+            return info
+
+        if download and media_cache.enabled:
+            key = cache_key(url, options)
+            info = await media_cache.restore(key, current_workspace())
+            if info is None:
+                info = await self._run(url, options, download)
+                await media_cache.store(key, info, current_workspace())
+            return info
+
+        return await self._run(url, options, download)
+
+    async def _run(self, url: str, options: dict, download: bool) -> dict:
+        url_match = classify_url(url)
+        ie_keys = url_match.ie_keys if url_match is not None else ()
+
+        async with self._semaphore:
+            worker = await self._get_worker()
+            files = set()
+            try:
+                worker.conn.send(("extract", url, options, download, ie_keys, current_workspace()))
+                while True:
+                    message = await _recv(worker.conn)
+                    if message[0] == "file":
+                        files.add(message[1])
+                        continue
+                    if message[0] == "stage":
+                        _, stage, seconds, size = message
+                        observe_stage(stage, seconds)
+                        if size:
+                            downloaded_bytes_total.inc(size, platform=current_platform.get())
+                        continue
+
+                    self._idle.append(worker)
+                    if message[0] == "done":
+                        return message[1]
+
+                    _, error_name, error_message = message
+                    if error_name == "DownloadError":
+                        from yt_dlp.utils import DownloadError
+                        raise DownloadError(error_message)
+                    raise RuntimeError(f"{error_name}: {error_message}")
+
+            except asyncio.CancelledError:
+                logging.info(f"Cancelling yt-dlp job: {url}")
+                await worker.kill()
+                self._remove_partial_files(files)
+                raise
+            except (EOFError, BrokenPipeError, OSError) as e:
+                await worker.kill()
+                self._remove_partial_files(files)
+                raise RuntimeError(f"yt-dlp worker died: {e}") from e
+
+    async def warm(self) -> None:
+        """
+        Starts all worker processes and builds a YoutubeDL instance with the
+        router's extractors loaded in each, so the first jobs do not pay for it.
+        """
+        async def warm_worker():
+            async with self._semaphore:
+                worker = await asyncio.to_thread(_Worker, self._context)
+                try:
+                    worker.conn.send(("warm", ROUTER_IE_KEYS))
+                    await _recv(worker.conn)
+                except (EOFError, BrokenPipeError, OSError) as e:
+                    logging.error(f"Error warming yt-dlp worker: {e}")
+                    await worker.kill()
+                    return
+                except asyncio.CancelledError:
+                    await worker.kill()
+                    raise
+                self._idle.append(worker)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(warm_worker() for _ in range(self.processes - len(self._idle))))
+        logging.info(f"Warmed {len(self._idle)} yt-dlp workers in {time.perf_counter() - started:.2f}s")
+
+    async def _get_worker(self) -> _Worker:
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.process.is_alive():
+                return worker
+            worker.conn.close()
+        return await asyncio.to_thread(_Worker, self._context)
+
+    @staticmethod
+    def _remove_partial_files(files: set[str]) -> None:
+        candidates = set()
+        for path in files:
+            candidates.update((path, f"{path}.part", f"{path}.ytdl"))
+            # Thumbnails and format-specific files share the stem: title.webp, title.f137.mp4
+            stem = re.sub(r"\.f[\w-]+$", "", os.path.splitext(path)[0])
+            candidates.update(glob.glob(f"{glob.escape(stem)}.*"))
+
+        for path in candidates:
+            try:
+                os.remove(path)
+                logging.info(f"Deleted partial file: {path}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.error(f"Error deleting partial file {path}: {e}")
+
+    def close(self) -> None:
+        """Stops idle workers. Busy workers are killed when their jobs are cancelled."""
+        while self._idle:
+            self._idle.pop().close()
+
+
+ytdlp_pool = YtDlpPool(processes=YTDLP_PROCESSES)
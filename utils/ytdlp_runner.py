@@ -0,0 +1,82 @@
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+from utils.ytdlp_pool import YtDlpPool, ytdlp_pool
+
+
+@dataclass
+class YtDlpResult:
+    """
+    Outcome of a yt-dlp download.
+
+    Attributes:
+        info (dict): Info dict of the downloaded media (trimmed when served from a cache).
+        filepath (str): Final media file, after post-processing such as audio extraction.
+        thumbnail (Optional[str]): Written thumbnail file, if "writethumbnail" was set.
+        files (list[str]): Every file the download produced, for cleanup.
+    """
+    info: dict
+    filepath: str
+    thumbnail: Optional[str] = None
+    files: list[str] = field(default_factory=list)
+
+    @property
+    def title(self) -> Optional[str]:
+        return self.info.get("title")
+
+
+class YtDlpRunner:
+    """
+    Runs yt-dlp downloads in a single pass.
+
+    A downloader used to call `extract_info(download=False)` to learn the title
+    and filename and then download, which resolved the page and formats twice.
+    The runner calls `extract_info(download=True)` once and takes the real output
+    paths from the "requested_downloads" and "thumbnails" of the result, so
+    downloaders no longer rebuild filenames from the title by hand.
+
+    Methods:
+        download(url: str, options: dict) -> YtDlpResult
+            Downloads the media and returns its info dict and output paths.
+    """
+
+    def __init__(self, pool: YtDlpPool):
+        self.pool = pool
+
+    async def download(self, url: str, options: dict) -> YtDlpResult:
+        """
+        Downloads a media with yt-dlp.
+
+        Parameters:
+        ----------
+        url : str
+            The URL to download.
+        options : dict
+            YoutubeDL options.
+
+        Returns:
+        -------
+        YtDlpResult
+            The info dict and the produced files.
+
+        Raises:
+        ------
+        yt_dlp.utils.DownloadError
+            If yt-dlp failed or did not produce a media file.
+        """
+        info = await self.pool.extract_info(url, options)
+        filepath = info.get("_filepath")
+        if not filepath or not os.path.exists(filepath):
+            from yt_dlp.utils import DownloadError
+            raise DownloadError(f"yt-dlp produced no file for {url}")
+
+        return YtDlpResult(
+            info=info,
+            filepath=filepath,
+            thumbnail=info.get("_thumbnail"),
+            files=info.get("_files") or [filepath],
+        )
+
+
+ytdlp_runner = YtDlpRunner(ytdlp_pool)
@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+
+# Runs in the yt-dlp worker processes: the forkserver preloads this module, so it
+# only imports the standard library here and yt-dlp on demand, never the bot.
+
+# Path of the bot's script, passed to the forkserver by the pool. multiprocessing runs the
+# parent's script again in every worker whose __main__ has another __file__, so the server's
+# own __main__ (a `python -c` module) takes the script's path without running it
+MAIN_PATH_ENV = "YTDLP_WORKER_MAIN_PATH"
+if os.environ.get(MAIN_PATH_ENV) and not hasattr(sys.modules["__main__"], "__file__"):
+    sys.modules["__main__"].__file__ = os.environ[MAIN_PATH_ENV]
+
+
+# Pre-built YoutubeDL instances of a worker process, per options profile
+_YDL_PROFILES = 8
+_instances = OrderedDict()
+# Connection, reported files and stage timing of the job the worker is running
+_job = {"conn": None, "reported": set(), "started": 0.0, "downloading": False, "postprocessing": {}}
+
+
+def _worker_main(conn) -> None:
+    """
+    Entry point of a yt-dlp worker process.
+
+    Receives ("extract", url, options, download, ie_keys, home) requests and answers
+    with ("file", path) messages while files are written and ("stage", name,
+    seconds, bytes) messages as stages finish, then ("done", info) or
+    ("error", exception name, message). A ("warm", ie_keys) request loads
+    the given extractors and answers ("done", None).
+    """
+    if hasattr(os, "setpgrp"):
+        # Own process group, so ffmpeg started by yt-dlp is killed together with the worker
+        os.setpgrp()
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+
+        try:
+            if request[0] == "warm":
+                _warm(request[1])
+                conn.send(("done", None))
+            else:
+                _, url, options, download, ie_keys, home = request
+                conn.send(("done", _extract_info(conn, url, options, download, ie_keys, home)))
+        except Exception as e:
+            conn.send(("error", type(e).__name__, str(e)))
+
+
+def _report(path) -> None:
+    if path and path not in _job["reported"]:
+        _job["reported"].add(path)
+        _job["conn"].send(("file", path))
+
+
+def _stage(name: str, seconds: float, size: int = 0) -> None:
+    _job["conn"].send(("stage", name, seconds, size))
+
+
+def _progress_hook(status) -> None:
+    _report(status.get("tmpfilename"))
+    _report(status.get("filename"))
+
+    if status.get("status") == "downloading" and not _job["downloading"]:
+        # Extraction ends when the first file starts downloading
+        _job["downloading"] = True
+        _stage("extract", time.perf_counter() - _job["started"])
+    elif status.get("status") == "finished" and status.get("elapsed") is not None:
+        # Files that already existed are reported finished without an elapsed time
+        _stage("download", status["elapsed"], status.get("total_bytes") or status.get("downloaded_bytes") or 0)
+
+
+def _postprocessor_hook(status) -> None:
+    _report(status.get("info_dict", {}).get("filepath"))
+
+    # Only ffmpeg post-processors (merging, audio extraction, remuxing) count as transcoding
+    name = status.get("postprocessor") or ""
+    if not name.startswith("FFmpeg"):
+        return
+    if status.get("status") == "started":
+        _job["postprocessing"][name] = time.perf_counter()
+    elif status.get("status") == "finished" and name in _job["postprocessing"]:
+        _stage("transcode", time.perf_counter() - _job["postprocessing"].pop(name))
+
+
+def _profile(options: dict) -> str:
+    return json.dumps(options, sort_keys=True, default=str)
+
+
+def _get_ydl(options: dict):
+    """Returns the YoutubeDL instance of an options profile, building it on first use."""
+    import yt_dlp
+
+    profile = _profile(options)
+    ydl = _instances.pop(profile, None)
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL(
+            dict(options, progress_hooks=[_progress_hook], postprocessor_hooks=[_postprocessor_hook])
+        )
+    _instances[profile] = ydl
+
+    while len(_instances) > _YDL_PROFILES:
+        _instances.popitem(last=False)[1].close()
+    return ydl
+
+
+def _warm(ie_keys) -> None:
+    # Imports the extractor modules and compiles their URL patterns
+    _pinned_ie_key(_get_ydl({}), "", ie_keys)
+
+
+def _pinned_ie_key(ydl, url: str, ie_keys):
+    """Returns the first of the router's extractors that accepts the URL, None to let yt-dlp search."""
+    for ie_key in ie_keys:
+        try:
+            if ydl.get_info_extractor(ie_key).suitable(url):
+                return ie_key
+        except Exception as e:
+            logging.warning(f"Unknown yt-dlp extractor {ie_key}: {e}")
+    return None
+
+
+def _extract_info(conn, url: str, options: dict, download: bool, ie_keys=(), home=None) -> dict:
+    _job["conn"] = conn
+    _job["reported"] = set()
+    _job["started"] = time.perf_counter()
+    _job["downloading"] = False
+    _job["postprocessing"] = {}
+
+    ydl = _get_ydl(options)
+    # The instance is shared by all jobs of the profile, only the output directory is per job
+    ydl.params["paths"] = dict(options.get("paths") or {}, **({"home": home} if home else {}))
+    try:
+        info = ydl.extract_info(url, download=download, ie_key=_pinned_ie_key(ydl, url, ie_keys))
+    except Exception:
+        # Do not reuse an instance a failed job may have left in a bad state
+        _instances.pop(_profile(options), None)
+        ydl.close()
+        raise
+    if not _job["downloading"]:
+        # Nothing was downloaded: metadata only, or the file was already there
+        _stage("extract", time.perf_counter() - _job["started"])
+    info = ydl.sanitize_info(info)
+    info["_filename"] = ydl.prepare_filename(info)
+
+    if download:
+        # Final paths after post-processing, plus written thumbnails
+        downloads = [item.get("filepath") for item in info.get("requested_downloads", [])]
+        thumbnails = [thumbnail.get("filepath") for thumbnail in info.get("thumbnails") or []]
+        downloads = [path for path in downloads if path and os.path.isfile(path)]
+        thumbnails = [path for path in thumbnails if path and os.path.isfile(path)]
+        info["_filepath"] = downloads[0] if downloads else None
+        info["_thumbnail"] = thumbnails[0] if thumbnails else None
+        info["_files"] = list(dict.fromkeys(downloads + thumbnails))
+    return info
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+import signal
+from logging.handlers import TimedRotatingFileHandler
+
+from config.settings import (
+    DOWNLOAD_WORKERS, DRAIN_TIMEOUT, JOB_QUEUE_POLL_INTERVAL, JOB_WORKER_LEASE, JOB_WORKER_NAME, JOB_WORKER_NAME_SET
+)
+from database.database_manager import (
+    close_pools, create_table_download_events, create_table_media_cache, create_table_settings
+)
+from handlers.user.url import resumable_jobs, run_queued_download
+from loader import bot
+from utils.download_events import download_events
+from utils.download_scheduler import download_scheduler
+from utils.job_queue import INSTANCE, consume, hold_worker_name, job_queue
+from utils.job_workspace import temp_janitor
+from utils.media_cache import media_cache
+from utils.metrics import metrics_server
+from utils.outbound import admin_digest
+from utils.tracing import trace_logger
+from utils.ytdlp_pool import ytdlp_pool
+
+
+async def main():
+    """
+    Download worker: takes the jobs the bot enqueues with DOWNLOAD_MODE=queue and runs them.
+
+    Start as many workers as the host has cores to spare, on this host or any
+    other that reaches the job queue; each runs up to DOWNLOAD_WORKERS jobs
+    and needs its own JOB_WORKER_NAME. On SIGTERM the worker stops claiming
+    jobs and drains the running ones; the interrupted ones are resumed when a
+    worker with the same name starts again.
+    """
+    if not JOB_WORKER_NAME_SET:
+        # The hostname default is shared by all workers of a host, which would resume each other's jobs
+        raise SystemExit("Set JOB_WORKER_NAME, one name per worker process")
+
+    await create_table_settings()
+    await create_table_media_cache()
+    await create_table_download_events()
+    await job_queue.setup()
+    try:
+        heartbeat_task = await hold_worker_name(job_queue, JOB_WORKER_NAME, JOB_WORKER_LEASE)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    await metrics_server.start()
+
+    stop = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+
+    resumed = await resumable_jobs()
+    logging.info(f"Download worker {JOB_WORKER_NAME} started, resuming {len(resumed)} jobs")
+
+    warm_task = asyncio.create_task(ytdlp_pool.warm())
+    janitor_task = asyncio.create_task(temp_janitor.run())
+    try:
+        await consume(
+            job_queue, run_queued_download, JOB_WORKER_NAME, DOWNLOAD_WORKERS, JOB_QUEUE_POLL_INTERVAL, stop, resumed
+        )
+    finally:
+        await download_scheduler.drain(DRAIN_TIMEOUT)
+        warm_task.cancel()
+        janitor_task.cancel()
+        ytdlp_pool.close()
+        media_cache.save()
+        # Errors of the drained jobs are still reported
+        await admin_digest.close()
+        await download_events.close()
+        await metrics_server.close()
+        await bot.session.close()
+        heartbeat_task.cancel()
+        await job_queue.unregister(JOB_WORKER_NAME, INSTANCE)
+        await close_pools()
+
+if __name__ == "__main__":
+    log_dir = 'other/logs'
+    os.makedirs(log_dir, exist_ok=True)
+
+    log_format = '%(asctime)s - %(filename)s - %(funcName)s - %(lineno)d - %(name)s - %(levelname)s - %(message)s'
+
+    handler = TimedRotatingFileHandler(
+        os.path.join(log_dir, 'worker.log'),
+        when="midnight",
+        interval=1,
+        backupCount=7,
+        encoding='utf-8'
+    )
+    handler.setFormatter(logging.Formatter(log_format))
+
+    logger = logging.getLogger()
+    logger.setLevel(logging.ERROR)
+    logger.addHandler(handler)
+
+    # Job traces as JSON lines, apart from the errors
+    trace_handler = TimedRotatingFileHandler(
+        os.path.join(log_dir, 'worker_traces.log'),
+        when="midnight",
+        interval=1,
+        backupCount=7,
+        encoding='utf-8'
+    )
+    trace_logger.addHandler(trace_handler)
+
+    asyncio.run(main())